@@ -1,7 +1,6 @@
 from langchain_openai import OpenAIEmbeddings
 from dotenv import load_dotenv
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
+from exact_search import ExactIndex
 
 load_dotenv()
 
@@ -20,9 +19,9 @@ query = 'tell me about bumrah'
 doc_embeddings = embedding.embed_documents(documents)
 query_embedding = embedding.embed_query(query)
 
-scores = cosine_similarity([query_embedding], doc_embeddings)[0]
+scores, ids = ExactIndex(doc_embeddings).search([query_embedding], k=1)
 
-index, score = sorted(list(enumerate(scores)),key=lambda x:x[1])[-1]
+index, score = ids[0][0], scores[0][0]
 
 print(query)
 print(documents[index])
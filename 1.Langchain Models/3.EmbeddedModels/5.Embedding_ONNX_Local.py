@@ -0,0 +1,13 @@
+from onnx_embeddings import OnnxEmbeddings
+
+embedding = OnnxEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2', quantize=True)
+
+documents = [
+    "Delhi is the capital of India",
+    "Kolkata is the capital of West Bengal",
+    "Paris is the capital of France"
+]
+
+vector = embedding.embed_documents(documents)
+
+print(str(vector))
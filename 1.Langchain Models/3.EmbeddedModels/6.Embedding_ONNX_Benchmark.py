@@ -0,0 +1,220 @@
+"""Benchmark the local embedders: PyTorch (HuggingFaceEmbeddings) vs ONNX Runtime fp32 / int8.
+
+Every backend runs in its own process so resident memory is measured
+separately. The report has load time, RSS, documents/sec for one big
+embed_documents call, embed_query latency (p50/p99), queries/sec with
+--concurrency threads calling embed_query at once, and the cosine drift of
+each backend's vectors against the reference (torch if it is installed,
+otherwise ONNX fp32).
+
+    python 6.Embedding_ONNX_Benchmark.py --docs 2000 --queries 200
+    python 6.Embedding_ONNX_Benchmark.py --backend onnx --backend onnx-int8 --threads 4
+    python 6.Embedding_ONNX_Benchmark.py --corpus my_docs.txt --out onnx_report.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import shutil
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from onnx_embeddings import DEFAULT_MODEL, OnnxEmbeddings
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+WORDS = (
+    "the capital city of india is delhi while kolkata is the capital of west bengal "
+    "and paris is the capital of france cricket players such as virat kohli ms dhoni "
+    "sachin tendulkar rohit sharma and jasprit bumrah are known for batting bowling "
+    "leadership records centuries yorkers calm finishing aggressive elegant action"
+).split()
+
+
+def make_corpus(n, seed=0):
+    # Lengths from a few words to past the 256 token limit, like real chunks
+    rng = random.Random(seed)
+    return [
+        " ".join(rng.choice(WORDS) for _ in range(int(rng.lognormvariate(3.5, 0.8)) + 3))
+        for _ in range(n)
+    ]
+
+
+def rss_mb():
+    import psutil
+
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def create(backend, args):
+    if backend == "torch":
+        from langchain_huggingface import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(
+            model_name=args.model_dir or args.model,
+            encode_kwargs={"normalize_embeddings": True, "batch_size": args.batch_size},
+        )
+    return OnnxEmbeddings(
+        model_name=args.model,
+        model_dir=args.model_dir,
+        quantize=backend == "onnx-int8",
+        intra_op_threads=args.threads,
+        batch_size=args.batch_size,
+    )
+
+
+def percentiles(latencies):
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def load_corpus(args):
+    if not args.corpus:
+        return make_corpus(args.docs, seed=0), make_corpus(args.queries, seed=1)
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    docs = lines[:args.docs]
+    return docs, random.Random(1).sample(docs, min(args.queries, len(docs)))
+
+
+def run_backend(backend, args, vectors_path):
+    """Runs in the child process; prints one JSON line."""
+
+    if backend == "torch" and args.threads:
+        import torch
+        torch.set_num_threads(args.threads)
+
+    docs, queries = load_corpus(args)
+
+    rss_start = rss_mb()
+    start = time.perf_counter()
+    embedding = create(backend, args)
+    embedding.embed_query("warm up")
+    load_seconds = time.perf_counter() - start
+    rss_loaded = rss_mb()
+
+    start = time.perf_counter()
+    vectors = np.asarray(embedding.embed_documents(docs), dtype=np.float32)
+    docs_seconds = time.perf_counter() - start
+    np.save(vectors_path, vectors)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        embedding.embed_query(query)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        list(pool.map(embedding.embed_query, queries))
+    concurrent_seconds = time.perf_counter() - start
+
+    return {
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "rss_model_mb": round(rss_loaded - rss_start, 1),
+        "rss_peak_mb": round(rss_mb(), 1),
+        "docs_per_second": round(len(docs) / docs_seconds, 1),
+        "query": percentiles(latencies),
+        "concurrent_queries_per_second": round(len(queries) / concurrent_seconds, 1),
+        "model_path": getattr(embedding, "model_path", None),
+    }
+
+
+def drift(vectors, reference):
+    cos = (vectors * reference).sum(axis=1) / (
+        np.linalg.norm(vectors, axis=1) * np.linalg.norm(reference, axis=1)
+    )
+    return {
+        "mean": round(float(cos.mean()), 6),
+        "min": round(float(cos.min()), 6),
+        "p01": round(float(np.percentile(cos, 1)), 6),
+    }
+
+
+def print_table(rows):
+    header = (
+        f"{'backend':<10} {'load s':>7} {'model MB':>9} {'docs/s':>9} {'q p50 ms':>9} "
+        f"{'q p99 ms':>9} {'conc q/s':>9} {'cos mean':>9} {'cos min':>9}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        if "error" in r:
+            print(f"{r['backend']:<10} {r['error']}")
+            continue
+        d = r.get("drift") or {}
+        print(
+            f"{r['backend']:<10} {r['load_seconds']:>7.2f} {r['rss_model_mb']:>9.1f} "
+            f"{r['docs_per_second']:>9.1f} {r['query']['p50_ms']:>9.2f} {r['query']['p99_ms']:>9.2f} "
+            f"{r['concurrent_queries_per_second']:>9.1f} {d.get('mean', float('nan')):>9.5f} "
+            f"{d.get('min', float('nan')):>9.5f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--backend", action="append", choices=BACKENDS, help="repeatable; default all")
+    parser.add_argument("--model", default=DEFAULT_MODEL)
+    parser.add_argument("--model-dir", help="local model directory instead of the Hub")
+    parser.add_argument("--corpus", help="text file, one document per line (default: synthetic)")
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--threads", type=int, help="intra-op threads (default: all cores)")
+    parser.add_argument("--concurrency", type=int, default=8, help="threads calling embed_query at once")
+    parser.add_argument("--out", default="onnx_embeddings_report.json")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--vectors", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_backend(args.child, args, args.vectors)))
+        return
+
+    work_dir = tempfile.mkdtemp(prefix="onnx-bench-")
+    forwarded = ["--model", args.model, "--docs", str(args.docs), "--queries", str(args.queries),
+                 "--batch-size", str(args.batch_size), "--concurrency", str(args.concurrency)]
+    for flag, value in (("--model-dir", args.model_dir), ("--corpus", args.corpus), ("--threads", args.threads)):
+        if value:
+            forwarded += [flag, str(value)]
+
+    rows, vectors = [], {}
+    for backend in args.backend or BACKENDS:
+        path = os.path.join(work_dir, backend + ".npy")
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), *forwarded, "--child", backend, "--vectors", path],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            rows.append({"backend": backend, "error": result.stderr.strip().splitlines()[-1]})
+            continue
+        rows.append(json.loads(result.stdout.strip().splitlines()[-1]))
+        vectors[backend] = np.load(path)
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    reference = "torch" if "torch" in vectors else "onnx" if "onnx" in vectors else None
+    for row in rows:
+        if row["backend"] in vectors and reference is not None:
+            row["drift"] = drift(vectors[row["backend"]], vectors[reference])
+
+    print(f"{args.docs} documents, {args.queries} queries, cosine vs {reference}\n")
+    print_table(rows)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"model": args.model_dir or args.model, "reference": reference,
+                   "docs": args.docs, "queries": args.queries, "results": rows}, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
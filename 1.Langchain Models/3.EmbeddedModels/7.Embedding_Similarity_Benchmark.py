@@ -0,0 +1,136 @@
+"""Benchmark exact top-k search: ExactIndex vs cosine_similarity + sorted().
+
+The baseline is what 4.Embedding_Similarity.py used to do for every query:
+sklearn ``cosine_similarity`` against the whole corpus, then a Python
+``sorted(enumerate(scores))`` to pick the best match. ExactIndex is timed
+with float32 and float16 matrices, in RAM and memory-mapped, one query at a
+time and in batches. Vectors are random unit vectors written to a scratch
+``.npy`` file, so no API calls are made.
+
+    python 7.Embedding_Similarity_Benchmark.py --docs 1000000 --dims 300
+    python 7.Embedding_Similarity_Benchmark.py --docs 200000 --batch 64 --block-size 32768 --out search.json
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from exact_search import DEFAULT_BLOCK_SIZE, ExactIndex
+
+CHUNK_ROWS = 100_000
+
+
+def write_corpus(path, n, dims, seed=0):
+    """Random vectors written chunk by chunk, so the corpus is never held twice."""
+
+    rng = np.random.default_rng(seed)
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, dims))
+    for start in range(0, n, CHUNK_ROWS):
+        out[start:start + CHUNK_ROWS] = rng.standard_normal((min(CHUNK_ROWS, n - start), dims))
+    out.flush()
+    del out
+
+
+def baseline(docs, queries):
+    """The old per-query path; returns (best index per query, ms per query)."""
+
+    from sklearn.metrics.pairwise import cosine_similarity
+
+    best = []
+    start = time.perf_counter()
+    for query in queries:
+        scores = cosine_similarity([query], docs)[0]
+        index, _ = sorted(list(enumerate(scores)), key=lambda x: x[1])[-1]
+        best.append(index)
+    return np.array(best), (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def time_search(index, queries, batch, k, block_size):
+    """ms per query and queries/sec, searching ``batch`` queries per call."""
+
+    # One untimed pass pages a memory-mapped matrix in
+    index.search(queries[:batch], k=k, block_size=block_size)
+
+    ids = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        ids.append(index.search(queries[i:i + batch], k=k, block_size=block_size)[1])
+    seconds = time.perf_counter() - start
+    return np.vstack(ids), {
+        "batch": batch,
+        "ms_per_query": round(seconds * 1000 / len(queries), 3),
+        "queries_per_second": round(len(queries) / seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=1_000_000)
+    parser.add_argument("--dims", type=int, default=300, help="4.Embedding_Similarity.py asks for 300")
+    parser.add_argument("--queries", type=int, default=256)
+    parser.add_argument("--baseline-queries", type=int, default=5, help="the baseline is slow; 0 skips it")
+    parser.add_argument("--batch", type=int, default=32, help="queries per search call in the batched runs")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    parser.add_argument("--out", default="similarity_report.json")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="similarity-bench-")
+    try:
+        raw_path = os.path.join(scratch, "raw.npy")
+        write_corpus(raw_path, args.docs, args.dims)
+        raw = np.load(raw_path, mmap_mode="r")
+        queries = np.random.default_rng(1).standard_normal((args.queries, args.dims)).astype(np.float32)
+
+        report = {"docs": args.docs, "dims": args.dims, "k": args.k, "block_size": args.block_size, "runs": []}
+
+        expected = None
+        if args.baseline_queries:
+            docs = np.asarray(raw)
+            expected, ms = baseline(docs, queries[:args.baseline_queries])
+            del docs
+            report["baseline"] = {"ms_per_query": round(ms, 3), "queries": args.baseline_queries}
+            print(f"cosine_similarity + sorted: {ms:>10.2f} ms/query")
+
+        for dtype in (np.float32, np.float16):
+            start = time.perf_counter()
+            index = ExactIndex(raw, dtype=dtype)
+            build = time.perf_counter() - start
+            path = os.path.join(scratch, f"{np.dtype(dtype).name}.npy")
+            index.save(path)
+
+            for storage, loaded in (("ram", index), ("mmap", ExactIndex.load(path, mmap=True))):
+                for batch in (1, args.batch):
+                    ids, timing = time_search(loaded, queries, batch, args.k, args.block_size)
+                    run = {
+                        "dtype": np.dtype(dtype).name,
+                        "storage": storage,
+                        "matrix_mb": round(loaded.matrix.nbytes / 1e6, 1),
+                        "build_seconds": round(build, 2),
+                        **timing,
+                    }
+                    if expected is not None:
+                        run["top1_agreement"] = float((ids[:len(expected), 0] == expected).mean())
+                        run["speedup"] = round(report["baseline"]["ms_per_query"] / timing["ms_per_query"], 1)
+                    report["runs"].append(run)
+                    print(
+                        f"ExactIndex {run['dtype']:<7} {storage:<4} batch {batch:>3}: "
+                        f"{timing['ms_per_query']:>10.2f} ms/query {timing['queries_per_second']:>9.1f} q/s"
+                        + (f"  x{run['speedup']:<7} top-1 agreement {run['top1_agreement']:.2f}" if expected is not None else "")
+                    )
+            del index, loaded
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Recall and latency of MatryoshkaIndex against full-dimension exact search.
+
+For every prefix width and candidate multiplier the report has recall@k
+(share of the exact full-dimension top k that the two-stage search finds),
+ms/query and the RAM the prefix takes, next to ``ExactIndex`` over the full
+vectors.
+
+The default corpus is synthetic: clustered vectors whose per-dimension
+spread falls off like the leading dimensions of a Matryoshka model, so the
+numbers show the trade-off, not the recall of a real model. For that, pass
+embeddings saved with ``np.save`` (e.g. text-embedding-3-large without
+``dimensions``); queries are then held-out rows unless ``--queries`` is given.
+
+    python 8.Embedding_Matryoshka_Benchmark.py --docs 100000 --dims 3072
+    python 8.Embedding_Matryoshka_Benchmark.py --vectors docs.npy --queries queries.npy --widths 256,512
+"""
+
+import os
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+from exact_search import ExactIndex, normalize
+from matryoshka_search import MatryoshkaIndex
+
+CHUNK_ROWS = 20_000
+
+
+def synthetic(n, dims, clusters=256, decay=0.5, seed=0):
+    """Rows as float32, built chunk by chunk: ``(centre + noise) * dims^-decay``."""
+
+    rng = np.random.default_rng(seed)
+    scale = np.arange(1, dims + 1, dtype=np.float32) ** -decay
+    centres = rng.standard_normal((clusters, dims)).astype(np.float32)
+    for start in range(0, n, CHUNK_ROWS):
+        size = min(CHUNK_ROWS, n - start)
+        rows = centres[rng.integers(clusters, size=size)] + rng.standard_normal((size, dims), dtype=np.float32)
+        yield rows * scale
+
+
+def write_rows(path, chunks, n, dims):
+    out = np.lib.format.open_memmap(path, mode="w+", dtype=np.float32, shape=(n, dims))
+    start = 0
+    for rows in chunks:
+        out[start:start + len(rows)] = normalize(rows)
+        start += len(rows)
+    out.flush()
+    del out
+
+
+def timed(search, queries, batch):
+    """(ids, ms per query) searching ``batch`` queries per call."""
+
+    search(queries[:batch])
+    ids = []
+    start = time.perf_counter()
+    for i in range(0, len(queries), batch):
+        ids.append(search(queries[i:i + batch]))
+    return np.vstack(ids), (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def recall(ids, expected):
+    return float(np.mean([len(set(a) & set(b)) / len(b) for a, b in zip(ids, expected)]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", help=".npy of real embeddings (default: synthetic)")
+    parser.add_argument("--queries", help=".npy of query embeddings (default: held-out or perturbed rows)")
+    parser.add_argument("--docs", type=int, default=100_000)
+    parser.add_argument("--dims", type=int, default=3072, help="text-embedding-3-large has 3072")
+    parser.add_argument("--num-queries", type=int, default=200)
+    parser.add_argument("--widths", default="64,128,256,512", help="prefix widths to try")
+    parser.add_argument("--candidates", default="1,2,4,8", help="candidate multipliers to try")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batch", type=int, default=32)
+    parser.add_argument("--out", default="matryoshka_report.json")
+    args = parser.parse_args()
+
+    scratch = tempfile.mkdtemp(prefix="matryoshka-bench-")
+    try:
+        path = os.path.join(scratch, "full.npy")
+        if args.vectors:
+            raw = np.load(args.vectors, mmap_mode="r")
+            if args.queries:
+                queries = normalize(np.load(args.queries))
+                docs = raw
+            else:
+                # The last rows become queries and are left out of the corpus
+                queries = normalize(raw[-args.num_queries:])
+                docs = raw[:-args.num_queries]
+            write_rows(path, (docs[i:i + CHUNK_ROWS] for i in range(0, len(docs), CHUNK_ROWS)), *docs.shape)
+        else:
+            write_rows(path, synthetic(args.docs, args.dims), args.docs, args.dims)
+            # Queries: new rows from the same distribution
+            queries = normalize(next(synthetic(args.num_queries, args.dims, seed=1)))
+
+        full = ExactIndex.load(path)
+        n, dims = full.matrix.shape
+        expected, full_ms = timed(lambda q: full.search(q, k=args.k)[1], queries, args.batch)
+        full_mb = full.matrix.nbytes / 1e6
+        del full
+
+        report = {
+            "corpus": args.vectors or "synthetic",
+            "docs": n,
+            "dims": dims,
+            "k": args.k,
+            "batch": args.batch,
+            "full": {"ms_per_query": round(full_ms, 3), "ram_mb": round(full_mb, 1)},
+            "runs": [],
+        }
+        print(f"{n} x {dims}, recall@{args.k} vs exact full-dimension search\n")
+        print(f"{'width':>6} {'cand':>5} {'recall':>7} {'ms/query':>9} {'speedup':>8} {'RAM MB':>8}")
+        print(f"{'full':>6} {'':>5} {1.0:>7.3f} {full_ms:>9.2f} {1.0:>8.1f} {full_mb:>8.1f}")
+
+        for width in (int(w) for w in args.widths.split(",")):
+            if width > dims:
+                continue
+            index = MatryoshkaIndex(path, prefix_dims=width)
+            for multiplier in (int(c) for c in args.candidates.split(",")):
+                ids, ms = timed(
+                    lambda q: index.search(q, k=args.k, candidates=multiplier)[1], queries, args.batch
+                )
+                run = {
+                    "prefix_dims": width,
+                    "candidates": multiplier,
+                    "recall": round(recall(ids, expected), 4),
+                    "ms_per_query": round(ms, 3),
+                    "speedup": round(full_ms / ms, 2),
+                    "ram_mb": round(index.prefix.matrix.nbytes / 1e6, 1),
+                }
+                report["runs"].append(run)
+                print(
+                    f"{width:>6} {multiplier:>5} {run['recall']:>7.3f} {ms:>9.2f} "
+                    f"{run['speedup']:>8.1f} {run['ram_mb']:>8.1f}"
+                )
+            del index
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""Exact (brute force) cosine top-k over an embedding matrix.
+
+    from exact_search import ExactIndex
+
+    index = ExactIndex(doc_embeddings)
+    scores, ids = index.search([query_embedding], k=3)
+
+    index.save("docs.npy")
+    index = ExactIndex.load("docs.npy", mmap=True)
+
+Rows are L2-normalised once when the index is built, so cosine similarity is
+a plain dot product and a batch of queries is one matrix product per block.
+The top k of each block comes from ``argpartition`` (linear, no full sort)
+and is merged with the running top k, so only k results are ever sorted.
+
+* ``dtype=np.float16`` halves the memory; blocks are cast back to float32
+  for the product, so the scores keep float32 accuracy apart from the
+  rounding of the stored vectors. The cast costs about as much as the
+  product of a 5-10 query batch, so float16 pays off for batched queries
+  or corpora that would not fit in RAM as float32.
+* ``save`` writes a plain ``.npy`` file; ``load(..., mmap=True)`` maps it
+  instead of reading it, so the OS pages blocks in as they are scanned.
+* ``block_size`` rows are scored at a time, so the score buffer is
+  ``len(queries) x block_size`` whatever the corpus size.
+"""
+
+import numpy as np
+
+DEFAULT_BLOCK_SIZE = 65536
+
+
+def normalize(vectors, dtype=np.float32):
+    """Rows scaled to unit length (zero rows stay zero)."""
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors[None, :]
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return (vectors / np.maximum(norms, 1e-12)).astype(dtype, copy=False)
+
+
+def top_k(scores, k):
+    """``(scores, indices)`` of the k best columns of each row, best first."""
+
+    k = min(k, scores.shape[1])
+    if k < scores.shape[1]:
+        part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    else:
+        part = np.broadcast_to(np.arange(scores.shape[1]), scores.shape)
+    best = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-best, axis=1, kind="stable")
+    return np.take_along_axis(best, order, axis=1), np.take_along_axis(part, order, axis=1)
+
+
+class ExactIndex:
+
+    def __init__(self, vectors, dtype=np.float32, normalized=False):
+        self.matrix = vectors if normalized else normalize(vectors, dtype)
+
+    @classmethod
+    def load(cls, path, mmap=False):
+        return cls(np.load(path, mmap_mode="r" if mmap else None), normalized=True)
+
+    def save(self, path):
+        np.save(path, self.matrix)
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dimensions(self):
+        return self.matrix.shape[1]
+
+    def search(self, queries, k=4, block_size=DEFAULT_BLOCK_SIZE):
+        """Top ``k`` rows per query: ``(scores, indices)``, each ``len(queries) x k``."""
+
+        queries = normalize(queries)
+        if queries.shape[1] != self.dimensions:
+            raise ValueError(f"queries have {queries.shape[1]} dimensions, the index has {self.dimensions}")
+
+        k = min(k, len(self))
+        best_scores = np.full((len(queries), 0), -np.inf, dtype=np.float32)
+        best_ids = np.zeros((len(queries), 0), dtype=np.int64)
+
+        # float16 blocks are converted into one reused float32 buffer
+        buffer = None
+        if self.matrix.dtype != np.float32:
+            buffer = np.empty((min(block_size, len(self)), self.dimensions), dtype=np.float32)
+
+        for start in range(0, len(self), block_size):
+            block = self.matrix[start:start + block_size]
+            if buffer is not None:
+                np.copyto(buffer[:len(block)], block)
+                block = buffer[:len(block)]
+            scores, ids = top_k(queries @ block.T, k)
+
+            # Merge with what the earlier blocks kept; still only 2k per row
+            best_scores, merged = top_k(np.hstack([best_scores, scores]), k)
+            best_ids = np.take_along_axis(np.hstack([best_ids, ids + start]), merged, axis=1)
+
+        return best_scores, best_ids
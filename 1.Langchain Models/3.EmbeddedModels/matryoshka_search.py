@@ -0,0 +1,73 @@
+"""Two-stage search over Matryoshka embeddings: short prefix scan, full rerank.
+
+    from matryoshka_search import MatryoshkaIndex
+
+    index = MatryoshkaIndex.build(doc_embeddings, "docs_3072.npy", prefix_dims=256)
+    scores, ids = index.search([query_embedding], k=3)
+
+    index = MatryoshkaIndex("docs_3072.npy", prefix_dims=256, candidates=4)
+
+OpenAI's text-embedding-3 models are trained so that the first dimensions
+carry most of the meaning: a re-normalised prefix is a usable embedding on
+its own, which is what ``dimensions=300`` returns. Asking the API for short
+vectors throws the rest away for good. This index keeps the full vectors in
+a ``.npy`` file on disk instead and only the prefix in RAM:
+
+1. the ``prefix_dims`` prefix (re-normalised) is scanned with ``ExactIndex``
+   for ``k * candidates`` candidates;
+2. the candidates' full vectors are read from the memory-mapped file and
+   rescored, and the best k by full-dimension cosine are returned.
+
+RAM is ``prefix_dims / dims`` of the full matrix and the scan is that much
+cheaper; a larger ``candidates`` buys back recall for a few more rows read.
+"""
+
+import numpy as np
+
+from exact_search import DEFAULT_BLOCK_SIZE, ExactIndex, normalize
+
+
+class MatryoshkaIndex:
+
+    def __init__(self, path, prefix_dims=256, candidates=4, dtype=np.float32):
+        # Full, normalised vectors, paged in only for the rerank
+        self.full = np.load(path, mmap_mode="r")
+        if not 0 < prefix_dims <= self.full.shape[1]:
+            raise ValueError(f"prefix_dims must be between 1 and {self.full.shape[1]}, got {prefix_dims}")
+
+        self.prefix_dims = prefix_dims
+        self.candidates = candidates
+        self.prefix = ExactIndex(self.full[:, :prefix_dims], dtype=dtype)
+
+    @classmethod
+    def build(cls, vectors, path, **kwargs):
+        """Save ``vectors`` (normalised) to ``path`` and open the index on it."""
+
+        ExactIndex(vectors).save(path)
+        return cls(path, **kwargs)
+
+    def __len__(self):
+        return self.full.shape[0]
+
+    @property
+    def dimensions(self):
+        return self.full.shape[1]
+
+    def search(self, queries, k=4, candidates=None, block_size=DEFAULT_BLOCK_SIZE):
+        """Top ``k`` rows per query by full-dimension cosine: ``(scores, indices)``."""
+
+        queries = normalize(queries)
+        if queries.shape[1] != self.dimensions:
+            raise ValueError(f"queries have {queries.shape[1]} dimensions, the index has {self.dimensions}")
+
+        k = min(k, len(self))
+        shortlist = min(k * (candidates or self.candidates), len(self))
+        _, ids = self.prefix.search(queries[:, :self.prefix_dims], k=shortlist, block_size=block_size)
+
+        # One sorted read of every candidate row, shared by all queries
+        rows, inverse = np.unique(ids, return_inverse=True)
+        full = np.asarray(self.full[rows], dtype=np.float32)
+        scores = np.einsum("qcd,qd->qc", full[inverse.reshape(ids.shape)], queries)
+
+        order = np.argsort(-scores, axis=1, kind="stable")[:, :k]
+        return np.take_along_axis(scores, order, axis=1), np.take_along_axis(ids, order, axis=1)
@@ -0,0 +1,240 @@
+"""Local sentence embeddings on ONNX Runtime, a drop-in for HuggingFaceEmbeddings.
+
+    from onnx_embeddings import OnnxEmbeddings
+
+    embedding = OnnxEmbeddings(model_name='sentence-transformers/all-MiniLM-L6-v2', quantize=True)
+    vectors = embedding.embed_documents(documents)
+
+The model is the ONNX export the sentence-transformers repos ship
+(``onnx/model.onnx``) plus ``tokenizer.json``, so neither PyTorch nor
+transformers is needed at runtime. Pooling and normalisation match the
+sentence-transformers pipeline of all-MiniLM-L6-v2 (mean pooling, L2 norm,
+256 tokens max).
+
+* ``quantize=True`` converts the weights to int8 once with ONNX Runtime's
+  dynamic quantization (needs the ``onnx`` package) and caches the result
+  next to the original model.
+* Texts are tokenized, sorted by length and cut into batches of similar
+  length (at most ``batch_size`` texts and ``max_batch_tokens`` padded
+  tokens), so short texts don't pay for the padding of long ones.
+* Calls from several threads go through one queue: a worker thread merges
+  the requests that arrive within ``max_wait_ms`` into shared batches and
+  runs them on a single session with ``intra_op_threads`` threads.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+DEFAULT_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+ONNX_FILE = "onnx/model.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+QUANTIZED_SUFFIX = "_int8.onnx"
+
+_STOP = object()
+
+
+def model_files(model_name=DEFAULT_MODEL, model_dir=None, cache_dir=None):
+    """``(onnx_path, tokenizer_path)`` from a local directory or the Hugging Face Hub."""
+
+    if model_dir is not None:
+        for name in (ONNX_FILE, os.path.basename(ONNX_FILE)):
+            if os.path.exists(os.path.join(model_dir, name)):
+                return os.path.join(model_dir, name), os.path.join(model_dir, TOKENIZER_FILE)
+        raise FileNotFoundError(f"No {ONNX_FILE} or model.onnx in {model_dir}")
+
+    from huggingface_hub import hf_hub_download
+
+    return (
+        hf_hub_download(model_name, ONNX_FILE, cache_dir=cache_dir),
+        hf_hub_download(model_name, TOKENIZER_FILE, cache_dir=cache_dir),
+    )
+
+
+def quantize_model(onnx_path, output_path=None):
+    """Write (once) and return an int8 dynamically quantized copy of the model."""
+
+    output_path = output_path or onnx_path[: -len(".onnx")] + QUANTIZED_SUFFIX
+    if os.path.exists(output_path):
+        return output_path
+
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    # Written under a temporary name so a crash never leaves half a model
+    tmp = output_path + ".tmp"
+    quantize_dynamic(onnx_path, tmp, weight_type=QuantType.QInt8)
+    os.replace(tmp, output_path)
+    return output_path
+
+
+def length_batches(lengths, batch_size, max_batch_tokens):
+    """Split positions into batches of similar length, shortest first."""
+
+    batches, current, longest = [], [], 0
+    for i in np.argsort(lengths, kind="stable"):
+        length = int(lengths[i])
+        if current and (
+            len(current) == batch_size or (len(current) + 1) * max(longest, length) > max_batch_tokens
+        ):
+            batches.append(current)
+            current, longest = [], 0
+        current.append(int(i))
+        longest = max(longest, length)
+    if current:
+        batches.append(current)
+    return batches
+
+
+class OnnxEmbeddings(Embeddings):
+
+    def __init__(self, model_name=DEFAULT_MODEL, model_dir=None, cache_dir=None, quantize=False,
+                 intra_op_threads=None, batch_size=32, max_batch_tokens=8192, max_length=256,
+                 max_wait_ms=2.0, normalize=True):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        onnx_path, tokenizer_path = model_files(model_name, model_dir, cache_dir)
+        if quantize:
+            onnx_path = quantize_model(onnx_path)
+        self.model_path = onnx_path
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length)
+        self.tokenizer.no_padding()
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        # Batches run one at a time; parallelism is inside each run
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            onnx_path, sess_options=options, providers=["CPUExecutionProvider"]
+        )
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+        self.batch_size = batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.max_wait = max_wait_ms / 1000
+        self.normalize = normalize
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self.stats = {"requests": 0, "texts": 0, "batches": 0, "padded_tokens": 0, "tokens": 0}
+
+    # -------------------- EMBEDDINGS API --------------------
+    def embed_documents(self, texts):
+        return self.embed(texts).tolist()
+
+    def embed_query(self, text):
+        return self.embed([text])[0].tolist()
+
+    def embed(self, texts):
+        """Embed ``texts`` as a float32 matrix; safe to call from many threads."""
+
+        if not texts:
+            return np.zeros((0, self.dimensions), dtype=np.float32)
+
+        # Tokenizing in the caller's thread keeps the worker on the model
+        encodings = self.tokenizer.encode_batch(list(texts))
+
+        future = Future()
+        self._ensure_worker()
+        self._queue.put((encodings, future))
+        return future.result()
+
+    @property
+    def dimensions(self):
+        return self.session.get_outputs()[0].shape[-1]
+
+    def close(self):
+        with self._worker_lock:
+            if self._worker is not None:
+                self._queue.put(_STOP)
+                self._worker.join()
+                self._worker = None
+
+    # -------------------- WORKER --------------------
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name="onnx-embeddings", daemon=True)
+                self._worker.start()
+
+    def _collect(self, first):
+        """``first`` plus every request that arrives within the wait window."""
+
+        requests = [first]
+        texts = len(first[0])
+        while texts < self.batch_size:
+            try:
+                item = self._queue.get(timeout=self.max_wait)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            requests.append(item)
+            texts += len(item[0])
+        return requests
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                return
+
+            requests = self._collect(first)
+            encodings = [e for request, _ in requests for e in request]
+            try:
+                vectors = self._encode(encodings)
+            except Exception as exc:
+                for _, future in requests:
+                    future.set_exception(exc)
+                continue
+
+            start = 0
+            for request, future in requests:
+                future.set_result(vectors[start:start + len(request)])
+                start += len(request)
+
+            self.stats["requests"] += len(requests)
+            self.stats["texts"] += len(encodings)
+
+    def _encode(self, encodings):
+        lengths = np.fromiter((len(e.ids) for e in encodings), dtype=np.int64, count=len(encodings))
+        out = None
+
+        for batch in length_batches(lengths, self.batch_size, self.max_batch_tokens):
+            width = int(lengths[batch].max())
+            ids = np.zeros((len(batch), width), dtype=np.int64)
+            mask = np.zeros((len(batch), width), dtype=np.int64)
+            for row, i in enumerate(batch):
+                ids[row, :lengths[i]] = encodings[i].ids
+                mask[row, :lengths[i]] = 1
+
+            feed = {"input_ids": ids, "attention_mask": mask}
+            if "token_type_ids" in self._inputs:
+                feed["token_type_ids"] = np.zeros_like(ids)
+            hidden = self.session.run(None, feed)[0]
+
+            # Mean over the real (unpadded) tokens
+            weights = mask[:, :, None].astype(np.float32)
+            pooled = (hidden * weights).sum(axis=1) / np.maximum(weights.sum(axis=1), 1e-9)
+            if self.normalize:
+                pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+
+            if out is None:
+                out = np.empty((len(encodings), pooled.shape[1]), dtype=np.float32)
+            out[batch] = pooled
+
+            self.stats["batches"] += 1
+            self.stats["padded_tokens"] += ids.size
+            self.stats["tokens"] += int(lengths[batch].sum())
+
+        return out
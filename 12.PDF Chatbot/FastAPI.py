@@ -1,21 +1,112 @@
 import os
+import json
 import time
 import shutil
-import tempfile
+import asyncio
+import threading
+from functools import partial
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi import FastAPI, UploadFile, File, HTTPException, Request
+
+from manifest import Manifest, file_sha256, chunk_ids_for
+from jobs import BuildJob, JobManager
+from ingest import IngestionPipeline, PagePrefetcher, default_parse_workers, shutdown_pool
+from chains import RagChain, ChainRegistry, ConcurrencyLimiter, QueueFull
+from answer_cache import SemanticAnswerCache
+import index_store
+import index_versions
+from index_specs import IndexSpec
+from vector_backends import get_backend, validate_filter
+from sparse import BM25Index
+from collection_store import CollectionManager, LoadedIndex, DEFAULT_COLLECTION
+from uploads import UploadError, read_upload_file
+from batcher import MicroBatcher, search_batch
+from tokens import count_tokens, get_encoding
+from startup import WarmUp
+from context_packing import ContextPacker
+import metrics
+from metrics import stage, start_timings
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# e.g. http://127.0.0.1:9000/v1 for the stand-in in fake_openai.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+# OpenAIEmbeddings tokenizes inputs with tiktoken to split over-long ones,
+# which downloads the encoding on first use; 0 sends the raw text (offline)
+EMBEDDING_CHECK_CTX_LENGTH = os.getenv("EMBEDDING_CHECK_CTX_LENGTH", "1") != "0"
 
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 STATIC_DIR = os.path.join(BASE_DIR, "static")
+# Indexes, uploads and caches; benchmarks point this at a scratch directory
+DATA_DIR = os.getenv("DATA_DIR") or os.path.join(BASE_DIR, "data")
+# The embedding cache opens its SQLite file here during warm-up
+os.makedirs(DATA_DIR, exist_ok=True)
+
+# Knowledge bases committed to the repo, only ever read. With the default
+# DATA_DIR the default collection starts from a copy of the one in use; any
+# other DATA_DIR starts empty
+SEED_DIRS = {} if os.getenv("DATA_DIR") else {
+    "faiss": os.path.join(BASE_DIR, "faiss_openai_1536"),
+    "chroma": os.path.join(BASE_DIR, "chroma_openai_1536"),
+}
+
+FAISS_DIR = os.path.join(DATA_DIR, "faiss_openai_1536")
+CHROMA_DIR = os.path.join(DATA_DIR, "chroma_openai_1536")
+UPLOAD_DIR = os.path.join(DATA_DIR, "uploads")
+COLLECTIONS_DIR = os.path.join(DATA_DIR, "collections")
+EMBEDDING_CACHE_PATH = os.path.join(DATA_DIR, "embedding_cache.sqlite3")
+JOBS_DIR = os.path.join(DATA_DIR, "jobs")
+
+EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+EMBED_CONCURRENCY = int(os.getenv("EMBED_CONCURRENCY", "4"))
+INGEST_PROCESSES = int(os.getenv("INGEST_PROCESSES", str(default_parse_workers())))
+SSE_POLL_SECONDS = 0.5
+
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "100"))
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+BUILD_WORKERS = int(os.getenv("BUILD_WORKERS", "1"))
+INDEX_MEMORY_BUDGET_MB = int(os.getenv("INDEX_MEMORY_BUDGET_MB", "2048"))
+# How often a worker checks whether another worker published a new index
+INDEX_RELOAD_SECONDS = float(os.getenv("INDEX_RELOAD_SECONDS", "1"))
+
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", "16"))
+QUERY_QUEUE_SIZE = int(os.getenv("QUERY_QUEUE_SIZE", "64"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "32"))
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "60"))
+
+# Concurrent queries are coalesced into one embedding call and one FAISS
+# search; QUERY_BATCH_SIZE=1 turns this off
+QUERY_BATCH_SIZE = int(os.getenv("QUERY_BATCH_SIZE", "16"))
+QUERY_BATCH_WAIT_MS = float(os.getenv("QUERY_BATCH_WAIT_MS", "2"))
 
-FAISS_DIR = os.path.join(BASE_DIR, "faiss_openai_1536")
+SOURCE_SNIPPET_CHARS = 200
+
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "1000"))
+
+# e.g. "flat", "ivf-flat:nlist=1024,nprobe=16", "hnsw:m=32,ef_search=64"
+INDEX_SPEC = IndexSpec.parse(os.getenv("INDEX_SPEC", "flat"))
+
+# "faiss" or "chroma"; both take the same builds, updates and filters
+VECTOR_BACKEND = get_backend(os.getenv("VECTOR_BACKEND", "faiss"), INDEX_SPEC)
+
+# "hybrid" fuses BM25 and vector search, "dense" is vector search only
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+RETRIEVAL_K = int(os.getenv("RETRIEVAL_K", "4"))
+HYBRID_FETCH_K = int(os.getenv("HYBRID_FETCH_K", "20"))
+
+# Prompt context: candidates retrieved, then merged and deduped into at most
+# this many tokens (0 = pass the RETRIEVAL_K chunks as they are)
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "1000"))
+CONTEXT_CANDIDATES = int(os.getenv("CONTEXT_CANDIDATES", "8"))
+CONTEXT_DUPLICATE_THRESHOLD = float(os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.8"))
+RRF_K = int(os.getenv("RRF_K", "60"))
 
 app = FastAPI(title="Persistent PDF RAG API")
 
@@ -26,6 +117,37 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+def route_template(request):
+
+    from starlette.routing import Match
+
+    # Label by route template, not by path, to keep label cardinality bounded
+    for route in request.app.router.routes:
+        if route.matches(request.scope)[0] == Match.FULL:
+            return getattr(route, "path", "other")
+
+    return "unmatched"
+
+@app.middleware("http")
+async def track_requests(request, call_next):
+
+    route = route_template(request)
+    in_flight = metrics.REQUESTS_IN_FLIGHT.labels(method=request.method, route=route)
+
+    # For streaming responses this covers the time until headers are sent
+    in_flight.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        in_flight.dec()
+        metrics.REQUEST_SECONDS.labels(
+            method=request.method, route=route, status=str(status)
+        ).observe(time.perf_counter() - start)
+
 if os.path.isdir(STATIC_DIR):
     app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
@@ -35,13 +157,42 @@ def index():
 
 # -------------------- STATE --------------------
 STATE = {
-    "upload_dir": None,
-    "pdf_paths": [],
-    "vectors": None,
+    "embeddings": None,
+    "llm": None,
+    "http": None,
 }
 
+def observe_build_stage(stage_name, seconds):
+    metrics.BUILD_STAGE_SECONDS.labels(stage=stage_name).observe(seconds)
+
+# Status files let any worker report on a build that another worker runs
+JOBS = JobManager(
+    max_workers=BUILD_WORKERS,
+    on_stage_end=observe_build_stage,
+    status_dir=JOBS_DIR,
+)
+
+# Starts page extraction for every new upload before /build is called
+PAGES = PagePrefetcher(workers=INGEST_PROCESSES)
+
+ANSWER_CACHE = SemanticAnswerCache(
+    threshold=ANSWER_CACHE_THRESHOLD,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    max_entries=ANSWER_CACHE_SIZE,
+)
+
+# Guards lazy creation of the process-wide clients (embedder, LLM, HTTP pool)
+CLIENTS_LOCK = threading.RLock()
+
 class QueryRequest(BaseModel):
     question: str
+    # Metadata filter, e.g. {"filename": "policy.pdf", "page": {"$gte": 2}}
+    filter: dict | None = None
+    # Adds per-stage timings (ms) and the prompt size to the response
+    debug: bool = False
+
+class CollectionRequest(BaseModel):
+    name: str
 
 PROMPT_TMPL = """
 Use ONLY the information inside <context>
@@ -53,137 +204,936 @@ Use ONLY the information inside <context>
 Question: {input}
 """
 
-# -------------------- AUTO LOAD EXISTING KNOWLEDGE --------------------
-@app.on_event("startup")
-def load_existing_index():
+def get_embeddings():
+
+    # One cached embedder for the whole process: builds and queries share
+    # both the on-disk vectors and the hot-query LRU.
+    with CLIENTS_LOCK:
+        if STATE["embeddings"] is None:
+            STATE["embeddings"] = create_embeddings()
+
+    return STATE["embeddings"]
+
+def create_embeddings():
 
     from langchain_openai import OpenAIEmbeddings
-    from langchain_community.vectorstores import FAISS
+    from embedding_cache import CachedEmbeddings
 
-    if os.path.exists(FAISS_DIR):
+    http_client, http_async_client = get_http_clients()
 
-        embeddings = OpenAIEmbeddings(
+    return CachedEmbeddings(
+        OpenAIEmbeddings(
             api_key=OPENAI_API_KEY,
-            model="text-embedding-3-small"
-        )
+            base_url=OPENAI_BASE_URL,
+            model="text-embedding-3-small",
+            check_embedding_ctx_length=EMBEDDING_CHECK_CTX_LENGTH,
+            http_client=http_client,
+            http_async_client=http_async_client,
+        ),
+        EMBEDDING_CACHE_PATH,
+    )
 
-        STATE["vectors"] = FAISS.load_local(
-            FAISS_DIR,
-            embeddings,
-            allow_dangerous_deserialization=True
-        )
+# -------------------- COLLECTIONS (LAZILY LOADED) --------------------
+def open_collection_index(collection):
+    """Open the published index of ``collection`` for serving."""
+
+    version, index_dir = index_versions.current_version(collection.index_root)
+
+    if version == 0:
+        source = first_version_source(collection, index_dir)
+        if source is not None:
+            version, index_dir = publish_copy(collection, source)
+
+    if not VECTOR_BACKEND.exists(index_dir):
+        return None
+
+    sparse = None
+    if RETRIEVAL_MODE == "hybrid":
+        # Indexes built before hybrid retrieval get their BM25 index once
+        if not BM25Index.exists(index_dir):
+            with index_versions.build_lock(collection.index_root):
+                if not BM25Index.exists(index_dir):
+                    build_sparse_index(index_dir)
+        sparse = BM25Index.load(index_dir)
+
+    vectors = VECTOR_BACKEND.open(index_dir, get_embeddings())
+
+    metrics.INDEX_VECTORS.labels(collection=collection.name).set(VECTOR_BACKEND.count(vectors))
+    metrics.INDEX_BYTES.labels(collection=collection.name).set(
+        sum(entry.stat().st_size for entry in os.scandir(index_dir) if entry.is_file())
+        + BM25Index.nbytes(index_dir)
+    )
+
+    return LoadedIndex(vectors, sparse, resident_bytes(index_dir), version)
+
+def first_version_source(collection, index_dir):
+    """Index to publish as version 1 of an unversioned root, if any."""
+
+    # Indexes saved by FAISS.save_local (index.pkl) are converted once
+    if VECTOR_BACKEND.name == "faiss" and index_store.is_legacy(index_dir):
+        return index_dir
+
+    if collection.name != DEFAULT_COLLECTION or VECTOR_BACKEND.exists(index_dir):
+        return None
+
+    seed = SEED_DIRS.get(VECTOR_BACKEND.name)
+    if seed is None:
+        return None
+    if VECTOR_BACKEND.exists(seed) or (VECTOR_BACKEND.name == "faiss" and index_store.is_legacy(seed)):
+        return seed
+
+    return None
 
-        print("✅ Knowledge Base Loaded Automatically")
+def publish_copy(collection, source):
+    """Publish a copy of ``source`` as the first version of ``collection``.
+
+    ``source`` is only read: a ``FAISS.save_local`` index is converted into
+    the staging directory, anything else is copied there.
+    """
+
+    root = collection.index_root
+
+    # Every worker finds the unversioned root at startup; one publishes
+    with index_versions.build_lock(root):
+        if index_versions.current_version(root)[0] == 0:
+            staging = index_versions.staging_dir(root)
+            shutil.rmtree(staging, ignore_errors=True)
+            if VECTOR_BACKEND.name == "faiss" and index_store.is_legacy(source):
+                count = index_store.convert_legacy(source, staging)
+                print(f"🔁 Converted legacy index of '{collection.name}' ({count} vectors) to the mmap format")
+            else:
+                shutil.copytree(source, staging, ignore=shutil.ignore_patterns(".*"))
+            index_versions.publish(root, staging)
+
+    return index_versions.current_version(root)
+
+def resident_bytes(index_dir):
+
+    # The vector index and the BM25 arrays stay resident (or in the page
+    # cache); chunks are read from the docstore on demand
+    return VECTOR_BACKEND.resident_bytes(index_dir) + BM25Index.nbytes(index_dir)
+
+def release_index(collection, loaded):
+    CHAINS.discard(loaded)
+    VECTOR_BACKEND.close(loaded.vectors)
+
+COLLECTIONS = CollectionManager(
+    COLLECTIONS_DIR,
+    open_collection_index,
+    memory_budget=INDEX_MEMORY_BUDGET_MB * 1024 * 1024,
+    default_dirs=(FAISS_DIR if VECTOR_BACKEND.name == "faiss" else CHROMA_DIR, UPLOAD_DIR),
+    on_evict=release_index,
+    check_interval=INDEX_RELOAD_SECONDS,
+)
+
+def get_collection(name, create=False):
+
+    try:
+        return COLLECTIONS.get(name, create=create)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Unknown collection")
+
+def build_sparse_index(index_dir):
+
+    BM25Index.build(VECTOR_BACKEND.iter_chunks(index_dir)).save(index_dir)
+
+@app.on_event("shutdown")
+def stop_workers():
+    JOBS.shutdown()
+    PAGES.shutdown()
+    shutdown_pool()
 
 # -------------------- UPLOAD --------------------
+def pages_dir(collection):
+    return os.path.join(collection.upload_dir, ".pages")
+
+async def receive_upload(collection, chunks, filename):
+    """Stream an upload to disk, drop duplicates and queue page extraction."""
+
+    try:
+        doc_hash, path, duplicate = await collection.uploads.save(
+            chunks, filename, MAX_UPLOAD_MB * 1024 * 1024
+        )
+    except UploadError as exc:
+        raise HTTPException(status_code=exc.status_code, detail=str(exc))
+
+    index_dir = collection.index_dir
+    indexed = Manifest.exists(index_dir) and doc_hash in Manifest(index_dir)
+
+    if not duplicate and not indexed:
+        PAGES.submit(pages_dir(collection), doc_hash, path)
+
+    return {
+        "ok": True,
+        "hash": doc_hash,
+        "filename": os.path.basename(path),
+        "duplicate": duplicate,
+        "indexed": indexed,
+    }
+
 @app.post("/upload")
-async def upload(file: UploadFile = File(...)):
+@app.post("/collections/{collection}/upload")
+async def upload(file: UploadFile = File(...), collection: str = DEFAULT_COLLECTION):
 
-    if file.content_type != "application/pdf":
-        raise HTTPException(status_code=400, detail="PDF only")
+    return await receive_upload(
+        get_collection(collection),
+        read_upload_file(file, UPLOAD_CHUNK_BYTES),
+        file.filename,
+    )
 
-    if STATE["upload_dir"] is None:
-        STATE["upload_dir"] = tempfile.mkdtemp(prefix="pdf_upload_")
+@app.put("/upload/{filename}")
+@app.put("/collections/{collection}/upload/{filename}")
+async def upload_stream(filename: str, request: Request, collection: str = DEFAULT_COLLECTION):
+    """Raw PDF body, written to disk while it is still arriving."""
 
-    path = os.path.join(STATE["upload_dir"], file.filename)
+    target = get_collection(collection)
 
-    with open(path, "wb") as f:
-        shutil.copyfileobj(file.file, f)
+    length = request.headers.get("content-length")
+    if length and length.isdigit() and int(length) > MAX_UPLOAD_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"File exceeds {MAX_UPLOAD_MB} MB")
 
-    STATE["pdf_paths"].append(path)
+    return await receive_upload(target, request.stream(), filename)
 
-    return {"ok": True}
+# -------------------- INCREMENTAL INDEXING --------------------
+def staging_dir(collection):
+    return index_versions.staging_dir(collection.index_root)
 
-# -------------------- BUILD ONCE --------------------
-@app.post("/build")
-def build():
+def load_working_copy(collection):
+    """Load a private copy of the published index for a build to mutate.
 
-    if not STATE["pdf_paths"]:
-        raise HTTPException(status_code=400, detail="Upload PDFs first")
+    Queries keep using the loaded index until ``switch_index`` swaps the
+    finished copy in.
+    """
 
-    from langchain_community.document_loaders import PyPDFLoader
-    from langchain_text_splitters import RecursiveCharacterTextSplitter
-    from langchain_openai import OpenAIEmbeddings
-    from langchain_community.vectorstores import FAISS
+    index_dir = collection.index_dir
+    staging = staging_dir(collection)
+    shutil.rmtree(staging, ignore_errors=True)
+
+    # An index written before manifests existed cannot be diffed, so the
+    # first build after upgrading starts over, exactly like the old /build.
+    if not Manifest.exists(index_dir):
+        return None, Manifest(index_dir)
+
+    manifest = Manifest(index_dir)
+
+    if not VECTOR_BACKEND.exists(index_dir):
+        # Chunks were recorded but the index holding them is gone
+        if any(entry["chunk_ids"] for entry in manifest.documents.values()):
+            manifest.documents = {}
+        return None, manifest
+
+    return VECTOR_BACKEND.open_for_update(index_dir, staging, get_embeddings()), manifest
+
+def publish_index(collection, vectors, manifest):
+    """Write the new index as the next version; ``switch_index`` serves it."""
+
+    staging = staging_dir(collection)
 
-    # DELETE OLD INDEX ONLY WHEN BUILDING NEW ONE
-    if os.path.exists(FAISS_DIR):
-        shutil.rmtree(FAISS_DIR)
+    if vectors is not None:
+        VECTOR_BACKEND.save(vectors, staging)
+        build_sparse_index(staging)
 
-    docs = []
+    manifest.save(staging)
 
-    for path in STATE["pdf_paths"]:
-        loader = PyPDFLoader(path)
-        docs.extend([d for d in loader.load() if d.page_content.strip()])
+    # Other workers pick the new version up on their next query. Stores of
+    # older versions keep their open handles, so in-flight queries finish on
+    # the old files even after they are unlinked.
+    index_versions.publish(collection.index_root, staging)
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200
+def switch_index(collection):
+
+    # Called after the build lock is released: opening an index may take
+    # that lock (first version, BM25 index) while holding the collection's
+    # load lock, which reload() takes as well
+    COLLECTIONS.reload(collection)
+
+    # Answers cached against the previous index may no longer be right
+    ANSWER_CACHE.clear(collection.name)
+
+def ingestion_pipeline(collection, builder):
+
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+    return IngestionPipeline(
+        embeddings=get_embeddings(),
+        splitter=RecursiveCharacterTextSplitter(
+            chunk_size=1000,
+            chunk_overlap=200
+        ),
+        insert=builder.insert,
+        parse_workers=INGEST_PROCESSES,
+        embed_batch_size=EMBED_BATCH_SIZE,
+        max_in_flight=EMBED_CONCURRENCY,
+        prefetched=lambda doc_hash: PAGES.future(pages_dir(collection), doc_hash),
+        observe_embed=lambda seconds, texts: metrics.EMBEDDING_SECONDS.labels(
+            kind="document"
+        ).observe(seconds),
     )
 
-    chunks = splitter.split_documents(docs)
+def apply_changes(collection, job, to_add, to_remove):
+    """Remove and add documents on a working copy, then publish it.
+
+    ``to_add`` maps content hash -> path; ``to_remove`` is a set of hashes.
+    """
+
+    # The file lock keeps builds in other worker processes out as well
+    with collection.lock, index_versions.build_lock(collection.index_root):
+
+        job.set_stage("loading")
+        vectors, manifest = load_working_copy(collection)
+
+        to_add = {h: p for h, p in to_add.items() if h not in manifest}
+        to_remove = {h for h in to_remove if h in manifest}
+
+        job.set("documents_total", len(to_add))
+
+        removed = 0
+        for doc_hash in to_remove:
+            ids = manifest.remove(doc_hash)
+            if ids and vectors is not None:
+                VECTOR_BACKEND.delete(vectors, ids)
+            removed += len(ids)
+            job.advance("documents_removed")
+
+        job.set_stage("ingesting")
+        added = []
+
+        def on_document(doc_hash, path, pages, ids):
+            manifest.add(doc_hash, os.path.basename(path), ids, pages)
+            added.append(len(ids))
+            PAGES.discard(pages_dir(collection), doc_hash)
+
+        builder = VECTOR_BACKEND.builder(get_embeddings(), staging_dir(collection))
+        vectors = ingestion_pipeline(collection, builder).run(
+            sorted(to_add.items()), vectors, chunk_ids_for, on_document, job
+        )
+        vectors = builder.finish(vectors)
+
+        metrics.PAGES_PROCESSED.inc(job.counters["pages_parsed"])
+        metrics.CHUNKS_PROCESSED.inc(job.counters["chunks_embedded"])
+
+        job.set_stage("saving")
+        publish_index(collection, vectors, manifest)
+
+    switch_index(collection)
+
+    return {
+        "documents": len(manifest),
+        "added_documents": len(to_add),
+        "removed_documents": len(to_remove),
+        "added_chunks": sum(added),
+        "removed_chunks": removed,
+    }
+
+def sync_with_uploads(collection, job):
+
+    job.set_stage("hashing")
+    corpus = collection.uploads.corpus()
+
+    if Manifest.exists(collection.index_dir):
+        indexed = set(Manifest(collection.index_dir).documents)
+    else:
+        indexed = set()
+
+    return apply_changes(collection, job, corpus, indexed - set(corpus))
+
+# -------------------- BUILD (BACKGROUND JOBS) --------------------
+@app.post("/build", status_code=202)
+@app.post("/collections/{collection}/build", status_code=202)
+def build(collection: str = DEFAULT_COLLECTION):
+
+    target = get_collection(collection)
+
+    if not target.uploads.corpus() and not Manifest.exists(target.index_dir):
+        raise HTTPException(status_code=400, detail="Upload PDFs first")
+
+    job = JOBS.submit(lambda job: sync_with_uploads(target, job))
+
+    return {"ok": True, "job_id": job.id, "status": job.status, "collection": target.name}
+
+@app.get("/build/{job_id}")
+def build_status(job_id: str):
+    return get_job(job_id).snapshot()
 
-    embeddings = OpenAIEmbeddings(
-        api_key=OPENAI_API_KEY,
-        model="text-embedding-3-small"
+@app.get("/build/{job_id}/events")
+async def build_events(job_id: str):
+
+    job = get_job(job_id)
+
+    async def stream():
+        revision = -1
+        while True:
+            snapshot = job.snapshot()
+            if snapshot["revision"] != revision:
+                revision = snapshot["revision"]
+                event = "done" if job.done else "progress"
+                yield f"event: {event}\ndata: {json.dumps(snapshot)}\n\n"
+            if job.done:
+                return
+            await asyncio.sleep(SSE_POLL_SECONDS)
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+def get_job(job_id):
+
+    job = JOBS.get(job_id)
+
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown build job")
+
+    return job
+
+# -------------------- SINGLE DOCUMENTS --------------------
+@app.get("/documents")
+@app.get("/collections/{collection}/documents")
+def list_documents(collection: str = DEFAULT_COLLECTION):
+
+    index_dir = get_collection(collection).index_dir
+
+    if not Manifest.exists(index_dir):
+        return {"documents": []}
+
+    return {"documents": Manifest(index_dir).summary()}
+
+@app.post("/documents")
+@app.post("/collections/{collection}/documents")
+async def add_single_document(file: UploadFile = File(...), collection: str = DEFAULT_COLLECTION):
+
+    target = get_collection(collection)
+    upload = await receive_upload(
+        target, read_upload_file(file, UPLOAD_CHUNK_BYTES), file.filename
+    )
+    doc_hash = upload["hash"]
+    path = os.path.join(target.upload_dir, upload["filename"])
+
+    job = BuildJob("add", observe_build_stage)
+    result = await asyncio.to_thread(
+        apply_changes, target, job, {doc_hash: path}, set()
     )
 
-    vectors = FAISS.from_documents(chunks, embeddings)
+    return {"ok": True, "hash": doc_hash, "duplicate": upload["duplicate"], **result}
+
+@app.delete("/documents/{doc_hash}")
+@app.delete("/collections/{collection}/documents/{doc_hash}")
+def delete_document(doc_hash: str, collection: str = DEFAULT_COLLECTION):
 
-    vectors.save_local(FAISS_DIR)
+    target = get_collection(collection)
+    index_dir = target.index_dir
 
-    STATE["vectors"] = vectors
+    if not Manifest.exists(index_dir) or doc_hash not in Manifest(index_dir):
+        raise HTTPException(status_code=404, detail="Unknown document")
 
-    return {"ok": True, "message": "Knowledge Base Built Successfully"}
+    filename = Manifest(index_dir).documents[doc_hash]["filename"]
+    result = apply_changes(target, BuildJob("delete", observe_build_stage), {}, {doc_hash})
+
+    # Drop the upload as well so the next /build does not re-add it
+    path = os.path.join(target.upload_dir, filename)
+    if os.path.exists(path) and file_sha256(path) == doc_hash:
+        os.remove(path)
+
+    return {"ok": True, "hash": doc_hash, **result}
+
+# -------------------- COLLECTION ENDPOINTS --------------------
+def describe_collection(collection):
+
+    index_dir = collection.index_dir
+
+    return {
+        "name": collection.name,
+        "documents": len(Manifest(index_dir)) if Manifest.exists(index_dir) else 0,
+        "built": VECTOR_BACKEND.exists(index_dir),
+        "loaded": collection.loaded is not None,
+        "version": collection.version,
+    }
+
+@app.get("/collections")
+def list_collections():
+
+    return {
+        "collections": [
+            describe_collection(COLLECTIONS.get(name)) for name in COLLECTIONS.names()
+        ],
+        **COLLECTIONS.stats(),
+    }
+
+@app.post("/collections", status_code=201)
+def create_collection(body: CollectionRequest):
+
+    if COLLECTIONS.exists(body.name):
+        raise HTTPException(status_code=409, detail="Collection already exists")
+
+    return describe_collection(get_collection(body.name, create=True))
+
+@app.delete("/collections/{collection}")
+def delete_collection(collection: str):
+
+    target = get_collection(collection)
+
+    try:
+        COLLECTIONS.delete(target.name)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    ANSWER_CACHE.clear(target.name)
+
+    for gauge in (metrics.INDEX_VECTORS, metrics.INDEX_BYTES):
+        try:
+            gauge.remove(target.name)
+        except KeyError:
+            pass
+
+    return {"ok": True, "name": target.name}
+
+# -------------------- RAG CHAIN (BUILT ONCE PER INDEX) --------------------
+def get_http_clients():
+
+    import httpx
+
+    # One pooled client pair for every OpenAI call in the process
+    with CLIENTS_LOCK:
+        if STATE["http"] is None:
+
+            limits = httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS,
+            )
+
+            STATE["http"] = (
+                httpx.Client(limits=limits, timeout=HTTP_TIMEOUT_SECONDS),
+                httpx.AsyncClient(limits=limits, timeout=HTTP_TIMEOUT_SECONDS),
+            )
+
+    return STATE["http"]
+
+def get_llm():
+
+    from langchain_openai import ChatOpenAI
+
+    with CLIENTS_LOCK:
+        if STATE["llm"] is None:
+
+            http_client, http_async_client = get_http_clients()
+
+            STATE["llm"] = ChatOpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL,
+                model="gpt-4o-mini",
+                temperature=0,
+                http_client=http_client,
+                http_async_client=http_async_client,
+            )
+
+    return STATE["llm"]
+
+# -------------------- QUERY BATCHING --------------------
+async def embed_question_batch(questions):
+    with stage("embed_batch", metrics.EMBEDDING_SECONDS, kind="query"):
+        return await get_embeddings().aembed_queries(questions)
+
+EMBED_BATCHER = MicroBatcher(embed_question_batch, QUERY_BATCH_SIZE, QUERY_BATCH_WAIT_MS)
+SEARCH_BATCHER = MicroBatcher(
+    partial(search_batch, search=VECTOR_BACKEND.search), QUERY_BATCH_SIZE, QUERY_BATCH_WAIT_MS
+)
+
+async def embed_question(question):
+
+    # The answer cache and the retriever both embed the question; only the
+    # first one has to wait for a batch. This check is memory-only: SQLite
+    # lookups happen in the batch, off the event loop
+    vector = get_embeddings().cached_query(question)
+
+    if vector is not None:
+        return vector
+
+    with stage("embed"):
+        return await EMBED_BATCHER.submit(question)
+
+async def dense_search(vectors, question, k, filter=None):
+
+    vector = await embed_question(question)
+
+    with stage("dense_search", metrics.SEARCH_SECONDS, kind="dense"):
+        if filter is not None:
+            # Filtered searches are rare; they skip the batch
+            found = await asyncio.to_thread(VECTOR_BACKEND.search, vectors, [vector], k, filter)
+            return found[0]
+        return await SEARCH_BATCHER.submit((vectors, vector, k))
+
+def dense_search_sync(vectors, question, k, filter=None):
+
+    # For sync callers of the chain; the batchers only serve the event loop
+    vector = get_embeddings().embed_query(question)
+
+    with stage("dense_search", metrics.SEARCH_SECONDS, kind="dense"):
+        return VECTOR_BACKEND.search(vectors, [vector], k, filter)[0]
+
+def observe_prompt(rag_chain, question, docs):
+
+    tokens = count_tokens(rag_chain.prompt_text(question, docs))
+    metrics.PROMPT_TOKENS.observe(tokens)
+
+    return tokens
+
+def build_rag_chain(loaded):
+
+    from langchain_core.prompts import ChatPromptTemplate
+    from retrievers import BatchedRetriever, HybridRetriever
+
+    vectors = loaded.vectors
+    search = partial(dense_search, vectors)
+
+    if CONTEXT_TOKEN_BUDGET > 0:
+        packer = ContextPacker(CONTEXT_TOKEN_BUDGET, CONTEXT_DUPLICATE_THRESHOLD)
+        k = CONTEXT_CANDIDATES
+    else:
+        packer = None
+        k = RETRIEVAL_K
+
+    if loaded.sparse is not None:
+        retriever = HybridRetriever(
+            vectors=vectors,
+            sparse=loaded.sparse,
+            k=k,
+            fetch_k=HYBRID_FETCH_K,
+            rrf_k=RRF_K,
+            dense_search=search,
+        )
+    else:
+        retriever = BatchedRetriever(
+            search=search,
+            search_sync=partial(dense_search_sync, vectors),
+            k=k,
+        )
+
+    prompt = ChatPromptTemplate.from_template(PROMPT_TMPL)
+
+    return RagChain(retriever, prompt, get_llm(), packer)
+
+# Evicted or replaced indexes are discarded, so this only bounds the
+# chains of resident collections
+CHAINS = ChainRegistry(build_rag_chain, keep=256)
+QUERY_LIMITER = ConcurrencyLimiter(QUERY_CONCURRENCY, QUERY_QUEUE_SIZE)
+
+# -------------------- WARM-UP (AUTO LOAD EXISTING KNOWLEDGE) --------------------
+def load_existing_index():
+
+    # Other collections are opened by their first query
+    loaded = COLLECTIONS.index(COLLECTIONS.get(DEFAULT_COLLECTION))
+    if loaded is None:
+        return "not built"
+
+    CHAINS.get(loaded)
+    print("✅ Knowledge Base Loaded Automatically")
+    return f"version {loaded.version}"
+
+def load_tokenizers():
+
+    # OpenAIEmbeddings splits long inputs with tiktoken. Its encoding is
+    # downloaded on first use unless TIKTOKEN_CACHE_DIR has it (the Docker
+    # image does); either way, not on the first query.
+    inner = get_embeddings().inner
+    if getattr(inner, "tiktoken_enabled", False) and getattr(inner, "check_embedding_ctx_length", False):
+        import tiktoken
+        tiktoken.encoding_for_model(inner.tiktoken_model_name or inner.model)
+
+    return "tiktoken" if get_encoding() is not None else "estimate"
+
+# Runs in the background so the server accepts connections right away;
+# /health/ready tells the load balancer when it is worth sending queries
+WARMUP = WarmUp([
+    ("embeddings", get_embeddings),
+    ("index", load_existing_index),
+    ("llm", get_llm),
+    ("tokenizers", load_tokenizers),
+])
+
+@app.on_event("startup")
+async def start_warm_up():
+    WARMUP.start()
+
+@app.on_event("shutdown")
+async def close_http_clients():
+
+    if STATE["http"] is not None:
+        http_client, http_async_client = STATE["http"]
+        http_client.close()
+        await http_async_client.aclose()
 
 # -------------------- QUERY FOREVER --------------------
-@app.post("/query")
-def query(q: QueryRequest):
+async def get_rag_chain(collection):
+    """Return ``(chain, index_version)`` for a collection, opening it if needed."""
+
+    if collection.loaded is None or COLLECTIONS.outdated(collection):
+        # Opening an evicted (or newly published) index touches the disk;
+        # keep it off the loop
+        loaded = await asyncio.to_thread(COLLECTIONS.index, collection)
+    else:
+        loaded = COLLECTIONS.index(collection)
 
-    if STATE["vectors"] is None:
+    if loaded is None:
         raise HTTPException(
             status_code=400,
             detail="Knowledge not built yet"
         )
 
-    from langchain_openai import ChatOpenAI
-    from langchain_core.prompts import ChatPromptTemplate
-    from langchain_core.runnables import RunnablePassthrough
+    return CHAINS.get(loaded), loaded.version
 
-    retriever = STATE["vectors"].as_retriever(
-        search_kwargs={"k": 4}
+def too_busy():
+    return HTTPException(
+        status_code=503,
+        detail="Too many queries in progress, try again shortly"
     )
 
-    llm = ChatOpenAI(
-        api_key=OPENAI_API_KEY,
-        model="gpt-4o-mini",
-        temperature=0
-    )
+def check_filter(filter):
 
-    prompt = ChatPromptTemplate.from_template(PROMPT_TMPL)
+    if filter is None:
+        return
+
+    try:
+        validate_filter(filter)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Invalid filter: {exc}")
+
+async def cached_answer(question, collection, version, filter=None):
+    """Return ``(question_vector, cached_payload_or_None)``."""
+
+    # Cached answers were retrieved from the whole collection
+    if not ANSWER_CACHE.enabled or filter is not None:
+        return None, None
+
+    vector = await embed_question(question)
+
+    return vector, ANSWER_CACHE.lookup(vector, version, collection.name)
+
+@app.post("/query")
+@app.post("/collections/{collection}/query")
+async def query(q: QueryRequest, collection: str = DEFAULT_COLLECTION):
+
+    timings = start_timings() if q.debug else None
+    check_filter(q.filter)
+
+    target = get_collection(collection)
+    rag_chain, version = await get_rag_chain(target)
+
+    start = time.time()
+    with stage("answer_cache"):
+        vector, cached = await cached_answer(q.question, target, version, q.filter)
+
+    if cached is not None:
+        response = {
+            "answer": cached["answer"],
+            "time": round(time.time() - start, 2),
+            "cached": True,
+        }
+        if timings is not None:
+            response["debug"] = {"timings_ms": timings}
+        return response
+
+    try:
+        async with QUERY_LIMITER:
+            with stage("retrieval"):
+                docs = await rag_chain.aretrieve(q.question, q.filter)
+            prompt_tokens = observe_prompt(rag_chain, q.question, docs)
+            with stage("llm", metrics.LLM_SECONDS):
+                result = await rag_chain.agenerate(q.question, docs)
+            end = time.time()
+    except QueueFull:
+        raise too_busy()
+
+    if vector is not None:
+        ANSWER_CACHE.store(vector, version, q.question, {
+            "answer": result.content,
+            "sources": describe_sources(docs),
+        }, namespace=target.name)
+
+    response = {
+        "answer": result.content,
+        "time": round(end - start, 2)
+    }
+
+    if timings is not None:
+        response["debug"] = {"timings_ms": timings, "prompt_tokens": prompt_tokens}
 
-    rag_chain = (
+    return response
+
+# -------------------- QUERY (STREAMING) --------------------
+def sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+class LimitedStreamingResponse(StreamingResponse):
+    """Gives the query slot back once the response is over, however it ended.
+
+    The body generator may never start (the client is gone before the first
+    chunk is sent), so its ``finally`` can't be relied on to release.
+    """
+
+    def __init__(self, content, limiter, **kwargs):
+        super().__init__(content, **kwargs)
+        self.limiter = limiter
+
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            self.limiter.release()
+
+def describe_sources(docs):
+    return [
         {
-            "context": retriever,
-            "input": RunnablePassthrough(),
+            "source": os.path.basename(str(d.metadata.get("source", ""))),
+            "page": d.metadata.get("page"),
+            "doc_hash": d.metadata.get("doc_hash"),
+            "snippet": d.page_content[:SOURCE_SNIPPET_CHARS],
         }
-        | prompt
-        | llm
+        for d in docs
+    ]
+
+@app.post("/query/stream")
+@app.post("/collections/{collection}/query/stream")
+async def query_stream(q: QueryRequest, collection: str = DEFAULT_COLLECTION):
+    """Server-Sent Events: ``sources``, then ``token``s, then ``stats``."""
+
+    timings = start_timings() if q.debug else None
+    check_filter(q.filter)
+
+    target = get_collection(collection)
+    rag_chain, version = await get_rag_chain(target)
+
+    start = time.perf_counter()
+    vector, cached = await cached_answer(q.question, target, version, q.filter)
+
+    if cached is not None:
+        return StreamingResponse(
+            iter([
+                sse("sources", {"sources": cached["sources"]}),
+                sse("token", {"text": cached["answer"]}),
+                sse("stats", {
+                    "retrieval_ms": 0.0,
+                    "ttft_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "total_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "tokens": 1,
+                    "cached": True,
+                    "similarity": cached["similarity"],
+                    **({"debug": {"timings_ms": timings}} if timings is not None else {}),
+                }),
+            ]),
+            media_type="text/event-stream",
+        )
+
+    # Admission happens before the response starts so overload is a plain 503
+    try:
+        await QUERY_LIMITER.acquire()
+    except QueueFull:
+        raise too_busy()
+
+    async def stream():
+        # The body runs in the response task, outside this request's context
+        if timings is not None:
+            start_timings(timings)
+        try:
+            with stage("retrieval"):
+                docs = await rag_chain.aretrieve(q.question, q.filter)
+            retrieved = time.perf_counter()
+            yield sse("sources", {"sources": describe_sources(docs)})
+
+            prompt_tokens = observe_prompt(rag_chain, q.question, docs)
+            generation = time.perf_counter()
+
+            first_token = None
+            tokens = 0
+            answer = []
+            async for chunk in rag_chain.astream(q.question, docs):
+                if not chunk.content:
+                    continue
+                if first_token is None:
+                    first_token = time.perf_counter()
+                    metrics.LLM_TTFT_SECONDS.observe(first_token - generation)
+                tokens += 1
+                answer.append(chunk.content)
+                yield sse("token", {"text": chunk.content})
+
+            end = time.perf_counter()
+            metrics.LLM_SECONDS.observe(end - generation)
+            metrics.record("llm", end - generation)
+
+            if vector is not None:
+                ANSWER_CACHE.store(vector, version, q.question, {
+                    "answer": "".join(answer),
+                    "sources": describe_sources(docs),
+                }, namespace=target.name)
+
+            stats = {
+                "retrieval_ms": round((retrieved - start) * 1000, 1),
+                "ttft_ms": round((first_token - start) * 1000, 1) if first_token else None,
+                "total_ms": round((end - start) * 1000, 1),
+                "tokens": tokens,
+            }
+            if timings is not None:
+                stats["debug"] = {"timings_ms": timings, "prompt_tokens": prompt_tokens}
+            yield sse("stats", stats)
+        except Exception as exc:
+            yield sse("error", {"detail": str(exc) or type(exc).__name__})
+
+    return LimitedStreamingResponse(
+        stream(),
+        QUERY_LIMITER,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
     )
 
-    start = time.time()
-    result = rag_chain.invoke(q.question)
-    end = time.time()
+# -------------------- METRICS --------------------
+@app.get("/metrics")
+def prometheus_metrics():
+
+    from prometheus_client import generate_latest, CONTENT_TYPE_LATEST
+
+    registry = None
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        # Several uvicorn workers: aggregate what every process recorded
+        from prometheus_client import CollectorRegistry, multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+
+    return Response(
+        generate_latest(registry) if registry is not None else generate_latest(),
+        media_type=CONTENT_TYPE_LATEST,
+    )
+
+# -------------------- CACHE STATS --------------------
+@app.get("/cache/stats")
+def cache_stats():
 
     return {
-        "answer": result.content,
-        "time": round(end - start, 2)
+        "embeddings": STATE["embeddings"].stats() if STATE["embeddings"] is not None else None,
+        "answers": ANSWER_CACHE.stats(),
     }
 
 # -------------------- HEALTH --------------------
+@app.get("/health/live")
+def liveness():
+    return {"status": "ok"}
+
+@app.get("/health/ready")
+def readiness():
+
+    status = WARMUP.snapshot()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @app.get("/health")
 def health():
     return {
         "status": "ok",
-        "knowledge_loaded": STATE["vectors"] is not None
+        "ready": WARMUP.ready,
+        "warmup": WARMUP.snapshot()["steps"],
+        "knowledge_loaded": COLLECTIONS.get(DEFAULT_COLLECTION).loaded is not None,
+        "vector_backend": VECTOR_BACKEND.name,
+        "queries": QUERY_LIMITER.stats(),
+        "collections": COLLECTIONS.stats(),
+        "batching": {
+            "embeddings": EMBED_BATCHER.stats(),
+            "search": SEARCH_BATCHER.stats(),
+        },
     }
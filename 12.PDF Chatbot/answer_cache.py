@@ -0,0 +1,184 @@
+"""Semantic answer cache in front of the RAG chain.
+
+Questions are embedded (the embedder is itself cached, so this is usually
+free) and compared against previously answered questions with a brute-force
+cosine scan over a small in-memory matrix. A match above ``threshold`` returns
+the stored answer without retrieval or an LLM call. Entries expire after
+``ttl_seconds``, the least recently used entry is evicted when the cache is
+full, and a collection's entries are dropped when it publishes a new index
+version. Entries of other collections (``namespace``) are never returned:
+slots are indexed by namespace, so a lookup only scores its own collection's
+rows.
+"""
+
+import time
+import threading
+
+import numpy as np
+
+# Upper edges of the nearest-neighbour similarity histogram in stats()
+SIMILARITY_BUCKETS = (0.80, 0.85, 0.90, 0.925, 0.95, 0.975, 0.99, 1.0)
+
+
+class SemanticAnswerCache:
+
+    def __init__(self, threshold=0.95, ttl_seconds=3600, max_entries=1000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+
+        self._lock = threading.Lock()
+        self._vectors = None
+        self._entries = [None] * max_entries
+        self._free = list(range(max_entries - 1, -1, -1))
+        # namespace -> occupied slots, with creation time and index version
+        # per slot so stale rows are found without visiting the entries
+        self._slots = {}
+        self._created = np.zeros(max_entries, dtype=np.float64)
+        self._versions = np.empty(max_entries, dtype=object)
+
+        self._stats = {
+            "lookups": 0,
+            "hits": 0,
+            "misses": 0,
+            "stores": 0,
+            "evictions": 0,
+            "expirations": 0,
+            "invalidations": 0,
+        }
+        self._nearest = [0] * (len(SIMILARITY_BUCKETS) + 1)
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _release(self, slot):
+        namespace = self._entries[slot]["namespace"]
+        self._slots[namespace].discard(slot)
+        if not self._slots[namespace]:
+            del self._slots[namespace]
+
+        self._entries[slot] = None
+        self._versions[slot] = None
+        self._vectors[slot] = 0.0
+        self._free.append(slot)
+
+    def _record_nearest(self, similarity):
+        for i, edge in enumerate(SIMILARITY_BUCKETS):
+            if similarity < edge:
+                self._nearest[i] += 1
+                return
+        self._nearest[-1] += 1
+
+    def lookup(self, vector, version, namespace=None):
+        if not self.enabled:
+            return None
+
+        query = self._normalize(vector)
+        now = time.time()
+
+        with self._lock:
+            self._stats["lookups"] += 1
+
+            slots = self._slots.get(namespace)
+            if not slots:
+                self._stats["misses"] += 1
+                return None
+
+            rows = np.fromiter(slots, dtype=np.intp, count=len(slots))
+            stale = (now - self._created[rows] > self.ttl_seconds) | (
+                np.asarray(self._versions[rows] != version, dtype=bool)
+            )
+            for slot in rows[stale].tolist():
+                self._stats["expirations"] += 1
+                self._release(slot)
+
+            rows = rows[~stale]
+            if not len(rows):
+                self._stats["misses"] += 1
+                return None
+
+            scores = self._vectors[rows] @ query
+            best = int(np.argmax(scores))
+            slot = int(rows[best])
+            entry = self._entries[slot]
+
+            similarity = float(scores[best])
+            self._record_nearest(similarity)
+
+            if similarity < self.threshold:
+                self._stats["misses"] += 1
+                return None
+
+            self._stats["hits"] += 1
+            entry["last_used"] = now
+            entry["hits"] += 1
+            return {**entry["payload"], "similarity": round(similarity, 4)}
+
+    def store(self, vector, version, question, payload, namespace=None):
+        if not self.enabled:
+            return
+
+        vector = self._normalize(vector)
+        now = time.time()
+
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.zeros((self.max_entries, vector.shape[0]), dtype=np.float32)
+
+            if not self._free:
+                lru = min(
+                    range(self.max_entries),
+                    key=lambda s: self._entries[s]["last_used"],
+                )
+                self._release(lru)
+                self._stats["evictions"] += 1
+
+            slot = self._free.pop()
+            self._vectors[slot] = vector
+            self._created[slot] = now
+            self._versions[slot] = version
+            self._slots.setdefault(namespace, set()).add(slot)
+            self._entries[slot] = {
+                "question": question,
+                "payload": payload,
+                "version": version,
+                "namespace": namespace,
+                "created": now,
+                "last_used": now,
+                "hits": 0,
+            }
+            self._stats["stores"] += 1
+
+    def clear(self, namespace=None):
+        with self._lock:
+            for slot in list(self._slots.get(namespace, ())):
+                self._release(slot)
+            self._stats["invalidations"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            entries = self.max_entries - len(self._free)
+            nearest = list(self._nearest)
+
+        lookups = stats["lookups"]
+        edges = ["<%g" % edge for edge in SIMILARITY_BUCKETS] + [">=1"]
+
+        stats.update({
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            "max_entries": self.max_entries,
+            "entries": entries,
+            "hit_rate": round(stats["hits"] / lookups, 4) if lookups else 0.0,
+            # Similarity of the best live match for every lookup that had one;
+            # shows how many misses a lower threshold would have turned into hits
+            "nearest_similarity": dict(zip(edges, nearest)),
+        })
+        return stats
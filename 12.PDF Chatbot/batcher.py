@@ -0,0 +1,181 @@
+"""Request coalescing for the query path.
+
+Concurrent queries each need one question embedding and one FAISS search.
+``MicroBatcher`` collects the requests that arrive within ``max_wait_ms`` of
+the first one (or until ``max_batch_size`` are waiting), runs them as one
+call and hands every caller its own result. Questions are embedded with a
+single API request and searched with one ``index.search`` over a matrix of
+query vectors, which lets FAISS use BLAS instead of one scan per query.
+
+``stats()`` reports batch-size and queue-wait histograms: a longer window
+gives bigger batches (throughput) at the cost of added latency per request.
+"""
+
+import time
+import asyncio
+
+import numpy as np
+from langchain_core.documents import Document
+
+# Upper edges of the histograms in stats()
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+WAIT_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50)
+
+
+def _bucket(edges, value):
+    for i, edge in enumerate(edges):
+        if value <= edge:
+            return i
+    return len(edges)
+
+
+def _histogram(edges, counts):
+    labels = ["<=%g" % edge for edge in edges] + [">%g" % edges[-1]]
+    return dict(zip(labels, counts))
+
+
+class MicroBatcher:
+
+    def __init__(self, run_batch, max_batch_size=16, max_wait_ms=2.0):
+        """``run_batch(items)`` is async and returns one result per item."""
+        self.run_batch = run_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+
+        self._loop = None
+        self._queue = None
+        self._worker = None
+
+        self.batches = 0
+        self.items = 0
+        self._sizes = [0] * (len(SIZE_BUCKETS) + 1)
+        self._waits = [0] * (len(WAIT_BUCKETS_MS) + 1)
+
+    @property
+    def enabled(self):
+        return self.max_batch_size > 1 and self.max_wait > 0
+
+    async def submit(self, item):
+        if not self.enabled:
+            return (await self.run_batch([item]))[0]
+
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Bound to the loop that serves requests; recreated if it changes
+            self._loop = loop
+            self._queue = asyncio.Queue()
+            self._worker = loop.create_task(self._collect())
+
+        future = loop.create_future()
+        self._queue.put_nowait((item, future, time.perf_counter()))
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            self._record(batch)
+            # Dispatched as its own task so the next batch is collected while
+            # this one is in flight
+            loop.create_task(self._dispatch(batch))
+
+    def _record(self, batch):
+        now = time.perf_counter()
+        self.batches += 1
+        self.items += len(batch)
+        self._sizes[_bucket(SIZE_BUCKETS, len(batch))] += 1
+        for _, _, queued in batch:
+            self._waits[_bucket(WAIT_BUCKETS_MS, (now - queued) * 1000)] += 1
+
+    async def _dispatch(self, batch):
+        try:
+            results = await self.run_batch([item for item, _, _ in batch])
+        except Exception as exc:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(exc)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            # Callers that gave up (client disconnected) are skipped
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self):
+        return {
+            "enabled": self.enabled,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches": self.batches,
+            "requests": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "batch_size": _histogram(SIZE_BUCKETS, self._sizes),
+            "queue_wait_ms": _histogram(WAIT_BUCKETS_MS, self._waits),
+        }
+
+
+# -------------------- BATCHED FAISS SEARCH --------------------
+def search_many(vectors, queries, k):
+    """One ``index.search`` for many query vectors of a langchain FAISS store.
+
+    Returns one list of ``Document`` per query, like ``similarity_search``.
+    """
+
+    import faiss
+
+    matrix = np.asarray(queries, dtype=np.float32)
+    if getattr(vectors, "_normalize_L2", False):
+        faiss.normalize_L2(matrix)
+
+    _, positions = vectors.index.search(matrix, k)
+
+    results = []
+    for row in positions:
+        docs = []
+        for position in row:
+            if position == -1:
+                continue
+            doc = vectors.docstore.search(vectors.index_to_docstore_id[int(position)])
+            if isinstance(doc, Document):
+                docs.append(doc)
+        results.append(docs)
+    return results
+
+
+async def search_batch(items, search=search_many):
+    """``run_batch`` for ``(vectors, query_vector, k)`` items.
+
+    Items are grouped per store, so one batch may serve several collections.
+    ``search(vectors, queries, k)`` is the store's batched search.
+    """
+
+    groups = {}
+    for i, (vectors, _, _) in enumerate(items):
+        groups.setdefault(id(vectors), []).append(i)
+
+    results = [None] * len(items)
+
+    async def run(indexes):
+        vectors = items[indexes[0]][0]
+        k = max(items[i][2] for i in indexes)
+        found = await asyncio.to_thread(
+            search, vectors, [items[i][1] for i in indexes], k
+        )
+        for i, docs in zip(indexes, found):
+            results[i] = docs[:items[i][2]]
+
+    await asyncio.gather(*(run(indexes) for indexes in groups.values()))
+    return results
@@ -0,0 +1,272 @@
+"""Build time, query latency, startup time and disk footprint per vector backend.
+
+Every backend indexes the same corpus: the chunks, vectors and metadata of an
+existing FAISS index directory, or ``--synthetic N`` random chunks spread over
+``--docs`` documents. Queries are held-out vectors, searched one at a time
+like the API serves them, without and with a metadata filter (one document).
+Startup is measured in a fresh interpreter: import, open, first query.
+
+    python bench_backends.py faiss_openai_1536
+    python bench_backends.py --synthetic 50000 --backend faiss --backend chroma
+    python bench_backends.py --synthetic 20000 --spec hnsw:m=32 --out backends.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+import numpy as np
+
+import index_store
+import index_versions
+from bench_index import synthetic_vectors
+from index_specs import IndexSpec, extract_vectors
+from vector_backends import BACKENDS, get_backend
+
+BATCH_SIZE = 256
+
+
+def load_corpus(index_dir):
+    """``(vectors, texts, metadatas)`` from a FAISS index directory."""
+
+    index_dir = index_versions.current_dir(index_dir)
+    if index_store.is_legacy(index_dir):
+        raise SystemExit(f"{index_dir} is in the legacy format; start the app once to convert it")
+
+    store = index_store.load_index(index_dir, None)
+    vectors = extract_vectors(store.index).astype(np.float32)
+
+    texts, metadatas = [], []
+    for position in range(len(vectors)):
+        doc = store.docstore.search(store.index_to_docstore_id[position])
+        texts.append(doc.page_content)
+        metadatas.append(dict(doc.metadata))
+    store.docstore.close()
+
+    # Corpora built before file names were recorded filter on the source path
+    for metadata in metadatas:
+        metadata.setdefault("filename", os.path.basename(str(metadata.get("source", ""))))
+
+    return vectors, texts, metadatas
+
+
+def synthetic_corpus(n, dim, docs, seed=0):
+    rng = np.random.default_rng(seed)
+    vectors = synthetic_vectors(n, dim, seed)
+    doc_of = rng.integers(0, docs, n)
+    texts = [f"chunk {i} of document {d}" for i, d in enumerate(doc_of)]
+    metadatas = [
+        {"filename": f"doc{d:05d}.pdf", "page": int(i % 50), "doc_hash": f"{d:064x}"}
+        for i, d in enumerate(doc_of)
+    ]
+    return vectors, texts, metadatas
+
+
+def disk_bytes(path):
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+    return total
+
+
+def build(backend, index_dir, vectors, texts, metadatas):
+    ids = [f"chunk-{i}" for i in range(len(vectors))]
+    builder = backend.builder(None, index_dir)
+
+    store = None
+    for start in range(0, len(vectors), BATCH_SIZE):
+        end = start + BATCH_SIZE
+        store = builder.insert(
+            store,
+            list(zip(texts[start:end], vectors[start:end].tolist())),
+            metadatas[start:end],
+            ids[start:end],
+        )
+    store = builder.finish(store)
+
+    os.makedirs(index_dir, exist_ok=True)
+    backend.save(store, index_dir)
+
+
+def percentiles(latencies):
+    return {
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def query_latency(backend, store, queries, k, filters=None):
+    latencies = []
+    for i, query in enumerate(queries):
+        filter = filters[i] if filters else None
+        start = time.perf_counter()
+        backend.search(store, [query], k, filter)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return percentiles(latencies)
+
+
+def startup(name, spec, index_dir, query, k):
+    """Import, open and first query in a new interpreter (a worker starting)."""
+
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--startup", name,
+         "--spec", str(spec), "--startup-dir", index_dir, "-k", str(k)],
+        input=json.dumps(query.tolist()),
+        capture_output=True,
+        text=True,
+        check=True,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def startup_child(name, spec, index_dir, k):
+    query = np.asarray(json.loads(sys.stdin.read()), dtype=np.float32)
+
+    start = time.perf_counter()
+    backend = get_backend(name, IndexSpec.parse(spec))
+    # Import the store library up front so it is counted separately
+    if name == "chroma":
+        import chromadb  # noqa: F401
+    else:
+        import faiss  # noqa: F401
+        import langchain_community.vectorstores  # noqa: F401
+    imported = time.perf_counter()
+
+    store = backend.open(index_dir, None)
+    opened = time.perf_counter()
+
+    backend.search(store, [query], k)
+    done = time.perf_counter()
+
+    print(json.dumps({
+        "import_seconds": round(imported - start, 3),
+        "open_seconds": round(opened - imported, 3),
+        "first_query_ms": round((done - opened) * 1000, 3),
+        "startup_seconds": round(done - start, 3),
+    }))
+
+
+def bench_backend(name, spec, work_dir, base, texts, metadatas, queries, filters, k):
+    backend = get_backend(name, spec)
+    index_dir = os.path.join(work_dir, name)
+
+    start = time.perf_counter()
+    build(backend, index_dir, base, texts, metadatas)
+    build_seconds = time.perf_counter() - start
+
+    store = backend.open(index_dir, None)
+    try:
+        # Warm up so the first measured query doesn't pay for lazy loading
+        backend.search(store, [queries[0]], k)
+        unfiltered = query_latency(backend, store, queries, k)
+        filtered = query_latency(backend, store, queries, k, filters)
+    finally:
+        backend.close(store)
+
+    return {
+        "backend": name,
+        "spec": str(spec) if name == "faiss" else None,
+        "build_seconds": round(build_seconds, 2),
+        "query": unfiltered,
+        "filtered_query": filtered,
+        "startup": startup(name, spec, index_dir, queries[0], k),
+        "disk_bytes": disk_bytes(index_dir),
+        "resident_bytes": backend.resident_bytes(index_dir),
+    }
+
+
+def print_table(rows):
+    header = (
+        f"{'backend':<10} {'build s':>8} {'p50 ms':>8} {'p99 ms':>8} {'filt p50':>9} "
+        f"{'filt p99':>9} {'start s':>8} {'1st q ms':>9} {'disk MB':>8}"
+    )
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['backend']:<10} {r['build_seconds']:>8.2f} {r['query']['p50_ms']:>8.3f} "
+            f"{r['query']['p99_ms']:>8.3f} {r['filtered_query']['p50_ms']:>9.3f} "
+            f"{r['filtered_query']['p99_ms']:>9.3f} {r['startup']['startup_seconds']:>8.2f} "
+            f"{r['startup']['first_query_ms']:>9.2f} {r['disk_bytes'] / 1e6:>8.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("index_dir", nargs="?", help="FAISS index directory to take the corpus from")
+    parser.add_argument("--synthetic", type=int, help="use N random chunks instead")
+    parser.add_argument("--dim", type=int, default=1536, help="dimension of synthetic vectors")
+    parser.add_argument("--docs", type=int, default=100, help="documents the synthetic chunks belong to")
+    parser.add_argument("--backend", action="append", choices=sorted(BACKENDS),
+                        help="backend to test (repeatable; default all)")
+    parser.add_argument("--spec", default="flat", help="index spec of the FAISS backend")
+    parser.add_argument("-k", type=int, default=20, help="neighbours per query (the retriever's fetch_k)")
+    parser.add_argument("--query-fraction", type=float, default=0.1)
+    parser.add_argument("--max-queries", type=int, default=500)
+    parser.add_argument("--work-dir", help="where to build the indexes (default: a temp dir)")
+    parser.add_argument("--out", default="backends_report.json", help="where to write the JSON report")
+    parser.add_argument("--startup", help=argparse.SUPPRESS)
+    parser.add_argument("--startup-dir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.startup:
+        startup_child(args.startup, args.spec, args.startup_dir, args.k)
+        return
+
+    if args.synthetic:
+        vectors, texts, metadatas = synthetic_corpus(args.synthetic, args.dim, args.docs)
+        source = f"synthetic:{args.synthetic}x{args.dim}"
+    elif args.index_dir:
+        vectors, texts, metadatas = load_corpus(args.index_dir)
+        source = args.index_dir
+    else:
+        parser.error("pass an index directory or --synthetic N")
+
+    # The same held-out split for every backend; queries keep their chunk's
+    # metadata so each filtered query targets the document it came from
+    order = np.random.default_rng(0).permutation(len(vectors))
+    n_queries = min(max(1, int(len(vectors) * args.query_fraction)), args.max_queries)
+    held_out, kept = order[:n_queries], order[n_queries:]
+    base_vectors, queries = vectors[kept], vectors[held_out]
+    texts_kept = [texts[i] for i in kept]
+    metadatas_kept = [metadatas[i] for i in kept]
+    filters = [{"filename": metadatas[i]["filename"]} for i in held_out]
+    k = min(args.k, len(base_vectors))
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_backends_")
+    print(f"{source}: {len(base_vectors)} chunks, {n_queries} queries, dim {vectors.shape[1]}, k {k}\n")
+
+    rows = []
+    try:
+        for name in args.backend or sorted(BACKENDS):
+            rows.append(bench_backend(
+                name, IndexSpec.parse(args.spec), work_dir, base_vectors,
+                texts_kept, metadatas_kept, queries, filters, k,
+            ))
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    print_table(rows)
+
+    report = {
+        "source": source,
+        "chunks": len(base_vectors),
+        "queries": n_queries,
+        "dim": int(vectors.shape[1]),
+        "k": k,
+        "results": rows,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
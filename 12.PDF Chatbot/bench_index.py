@@ -0,0 +1,159 @@
+"""Recall vs latency vs memory report for the index specs in ``index_specs.py``.
+
+Vectors come from an existing index directory (our own corpus), so no
+embedding calls are made. A held-out sample serves as queries; exact search
+over the remaining vectors is the ground truth.
+
+    python bench_index.py faiss_openai_1536
+    python bench_index.py faiss_openai_1536 --spec flat --spec hnsw:m=16 -k 5
+    python bench_index.py --synthetic 100000 --out index_report.json
+"""
+
+import os
+import json
+import time
+import argparse
+
+import numpy as np
+
+import index_store
+import index_versions
+from index_specs import IndexSpec, extract_vectors
+
+DEFAULT_SPECS = (
+    "flat",
+    "sq:sq=fp16",
+    "sq:sq=8",
+    "ivf-flat:nlist=1024,nprobe=16",
+    "ivf-sq:nlist=1024,sq=8,nprobe=16",
+    "ivf-pq:nlist=1024,m=64,nbits=8,nprobe=16",
+    "hnsw:m=32,ef_search=64",
+)
+
+
+def load_vectors(index_dir):
+    import faiss
+
+    # A versioned root (see index_versions.py) or a flat/legacy directory
+    path = os.path.join(index_versions.current_dir(index_dir), index_store.INDEX_NAME)
+    return extract_vectors(faiss.read_index(path)).astype(np.float32)
+
+
+def synthetic_vectors(n, dim, seed=0):
+    # Clustered rather than uniform noise, which is closer to real embeddings
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(n // 100, 1), dim)).astype(np.float32)
+    labels = rng.integers(0, len(centers), n)
+    return centers[labels] + 0.3 * rng.standard_normal((n, dim)).astype(np.float32)
+
+
+def split(vectors, query_fraction, max_queries, seed=0):
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(vectors))
+    n_queries = min(max(1, int(len(vectors) * query_fraction)), max_queries)
+    return vectors[order[n_queries:]], vectors[order[:n_queries]]
+
+
+def ground_truth(base, queries, k):
+    import faiss
+
+    index = faiss.IndexFlatL2(base.shape[1])
+    index.add(base)
+    return index.search(queries, k)[1]
+
+
+def recall_at_k(found, truth):
+    hits = sum(len(set(f) & set(t)) for f, t in zip(found, truth))
+    return hits / truth.size
+
+
+def bench_spec(spec, base, queries, truth, k):
+    import faiss
+
+    start = time.perf_counter()
+    index = spec.create(base)
+    index.add(base)
+    build_seconds = time.perf_counter() - start
+
+    size = len(faiss.serialize_index(index))
+
+    # One query at a time, like the API serves them
+    latencies = []
+    found = np.empty((len(queries), k), dtype=np.int64)
+    for i, query in enumerate(queries):
+        start = time.perf_counter()
+        found[i] = index.search(query[None, :], k)[1][0]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "spec": str(spec),
+        "factory": spec.factory_string(len(base)),
+        "recall_at_k": round(recall_at_k(found, truth), 4),
+        "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+        "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+        "index_bytes": size,
+        "bytes_per_vector": round(size / len(base), 1),
+        "build_seconds": round(build_seconds, 2),
+    }
+
+
+def print_table(rows, k):
+    header = f"{'spec':<44} {'recall@' + str(k):>9} {'p50 ms':>8} {'p99 ms':>8} {'B/vec':>8} {'MB':>8} {'build s':>8}"
+    print(header)
+    print("-" * len(header))
+    for r in rows:
+        print(
+            f"{r['spec']:<44} {r['recall_at_k']:>9.4f} {r['p50_ms']:>8.3f} "
+            f"{r['p99_ms']:>8.3f} {r['bytes_per_vector']:>8.1f} "
+            f"{r['index_bytes'] / 1e6:>8.2f} {r['build_seconds']:>8.2f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("index_dir", nargs="?", help="index directory to read vectors from")
+    parser.add_argument("--synthetic", type=int, help="use N random clustered vectors instead")
+    parser.add_argument("--dim", type=int, default=1536, help="dimension of synthetic vectors")
+    parser.add_argument("--spec", action="append", help="index spec to test (repeatable)")
+    parser.add_argument("-k", type=int, default=4, help="neighbours per query (the retriever's k)")
+    parser.add_argument("--query-fraction", type=float, default=0.1)
+    parser.add_argument("--max-queries", type=int, default=1000)
+    parser.add_argument("--out", default="index_report.json", help="where to write the JSON report")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        vectors = synthetic_vectors(args.synthetic, args.dim)
+        source = f"synthetic:{args.synthetic}x{args.dim}"
+    elif args.index_dir:
+        vectors = load_vectors(args.index_dir)
+        source = args.index_dir
+    else:
+        parser.error("pass an index directory or --synthetic N")
+
+    base, queries = split(vectors, args.query_fraction, args.max_queries)
+    k = min(args.k, len(base))
+    truth = ground_truth(base, queries, k)
+
+    print(f"{source}: {len(base)} vectors, {len(queries)} queries, dim {base.shape[1]}\n")
+
+    rows = []
+    for text in args.spec or DEFAULT_SPECS:
+        rows.append(bench_spec(IndexSpec.parse(text), base, queries, truth, k))
+
+    print_table(rows, k)
+
+    report = {
+        "source": source,
+        "vectors": len(base),
+        "queries": len(queries),
+        "dim": int(base.shape[1]),
+        "k": k,
+        "results": rows,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
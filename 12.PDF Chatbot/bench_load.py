@@ -0,0 +1,486 @@
+"""Offline load test of the API: uploads, one build, then queries.
+
+Starts ``fake_openai.py`` and the API (``uvicorn FastAPI:app``) on local ports
+with a scratch ``DATA_DIR``, so no OpenAI credits are used and every run sees
+the same embeddings and answers. A synthetic corpus of ``--docs`` PDFs is
+uploaded at ``--concurrency``, built, and queried with ``--queries`` distinct
+questions. The report has requests/sec, p50/p95/p99 latency and server memory
+per phase and is written as JSON; ``--baseline`` compares with an older one.
+
+    python bench_load.py --docs 20 --queries 200 --concurrency 16
+    python bench_load.py --stream --embed-latency-ms 80 --out after.json --baseline before.json
+    python bench_load.py --url http://127.0.0.1:8000 --skip-upload --skip-build
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import asyncio
+import tempfile
+import argparse
+import platform
+import threading
+import subprocess
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+VOCABULARY = (
+    "policy employee customer privacy conduct integrity report conflict "
+    "interest manager review quarter compliance team data protection access "
+    "request approval travel expense contract vendor security incident "
+    "training record retention audit exception escalation"
+).split()
+
+
+# -------------------- SYNTHETIC CORPUS --------------------
+def make_pdf(pages):
+    """A minimal text-only PDF with one Helvetica page per string."""
+
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    }
+    kids = []
+    for i, text in enumerate(pages):
+        page, content = 4 + 2 * i, 5 + 2 * i
+        kids.append(f"{page} 0 R")
+        lines = [text[j:j + 90] for j in range(0, len(text), 90)]
+        ops = "BT /F1 10 Tf 40 800 Td 12 TL " + " ".join(
+            "(" + line.translate({ord(c): None for c in "\\()"}) + ") '" for line in lines
+        ) + " ET"
+        ops = ops.encode("latin-1", "replace")
+        objects[content] = b"<< /Length %d >>\nstream\n" % len(ops) + ops + b"\nendstream"
+        objects[page] = (
+            "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {content} 0 R >>"
+        ).encode()
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(pages)} >>".encode()
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = {}
+    for number in sorted(objects):
+        offsets[number] = len(out)
+        out += b"%d 0 obj\n" % number + objects[number] + b"\nendobj\n"
+
+    xref = len(out)
+    size = max(objects) + 1
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % size
+    for number in range(1, size):
+        out += b"%010d 00000 n \n" % offsets[number]
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, xref)
+    return bytes(out)
+
+
+def make_corpus(n_docs, pages, words_per_page, seed=0):
+    """``[(filename, pdf_bytes), ...]``; every document has distinct content."""
+
+    rng = random.Random(seed)
+    corpus = []
+    for d in range(n_docs):
+        texts = []
+        for p in range(pages):
+            words = [rng.choice(VOCABULARY) for _ in range(words_per_page)]
+            # A unique identifier per page gives BM25 something exact to find
+            words.insert(rng.randrange(len(words) + 1), f"DOC-{d}-P{p}")
+            texts.append(" ".join(words))
+        corpus.append((f"bench-{d:04d}.pdf", make_pdf(texts)))
+    return corpus
+
+
+def make_questions(n, n_docs, pages, seed=0):
+    rng = random.Random(seed + 1)
+    return [
+        f"What does {rng.choice(VOCABULARY)} say about {rng.choice(VOCABULARY)} "
+        f"in DOC-{rng.randrange(n_docs)}-P{rng.randrange(pages)} (#{i})?"
+        for i in range(n)
+    ]
+
+
+# -------------------- PROCESSES --------------------
+def spawn(args, env=None, cwd=BASE_DIR):
+    return subprocess.Popen(
+        [sys.executable, *args],
+        cwd=cwd,
+        env={**os.environ, **(env or {})},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.STDOUT,
+    )
+
+
+def wait_until_up(url, process, timeout=60):
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def stop(process):
+    if process is None or process.poll() is not None:
+        return
+    process.terminate()
+    try:
+        process.wait(timeout=10)
+    except subprocess.TimeoutExpired:
+        process.kill()
+
+
+class MemorySampler:
+    """Samples the RSS of a process (and its children) in the background."""
+
+    def __init__(self, pid, interval=0.1):
+        import psutil
+
+        self.process = psutil.Process(pid)
+        self.interval = interval
+        self.peak = 0
+        self.current = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _rss(self):
+        import psutil
+
+        total = 0
+        for process in [self.process, *self.process.children(recursive=True)]:
+            try:
+                total += process.memory_info().rss
+            except psutil.Error:
+                pass
+        return total
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.current = self._rss()
+            self.peak = max(self.peak, self.current)
+            self._stop.wait(self.interval)
+
+    def start(self):
+        self.current = self.peak = self._rss()
+        self._thread.start()
+        return self
+
+    def reset_peak(self):
+        self.peak = self.current = self._rss()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# -------------------- LOAD --------------------
+def summarize(latencies, errors, wall_seconds):
+    done = len(latencies)
+    summary = {
+        "requests": done + errors,
+        "errors": errors,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_second": round(done / wall_seconds, 2) if wall_seconds else None,
+    }
+    if latencies:
+        ms = np.asarray(latencies) * 1000
+        summary.update({
+            "mean_ms": round(float(ms.mean()), 2),
+            "p50_ms": round(float(np.percentile(ms, 50)), 2),
+            "p95_ms": round(float(np.percentile(ms, 95)), 2),
+            "p99_ms": round(float(np.percentile(ms, 99)), 2),
+            "max_ms": round(float(ms.max()), 2),
+        })
+    return summary
+
+
+async def run_load(items, concurrency, send):
+    """Call ``send(item)`` for every item with at most ``concurrency`` in flight.
+
+    ``send`` returns a dict of extra per-request measurements (or ``None``)
+    and raises on failure.
+    """
+
+    queue = asyncio.Queue()
+    for item in items:
+        queue.put_nowait(item)
+
+    latencies = []
+    extras = []
+    errors = []
+
+    async def worker():
+        while True:
+            try:
+                item = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            start = time.perf_counter()
+            try:
+                extra = await send(item)
+            except Exception as exc:
+                errors.append(str(exc) or type(exc).__name__)
+                continue
+            latencies.append(time.perf_counter() - start)
+            if extra:
+                extras.append(extra)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    summary = summarize(latencies, len(errors), time.perf_counter() - start)
+    if errors:
+        summary["first_error"] = errors[0]
+    return summary, extras
+
+
+async def upload_phase(client, corpus, concurrency):
+
+    async def send(item):
+        name, data = item
+        response = await client.put(
+            f"/upload/{name}", content=data, headers={"Content-Type": "application/pdf"}
+        )
+        response.raise_for_status()
+
+    summary, _ = await run_load(corpus, concurrency, send)
+    summary["bytes"] = sum(len(data) for _, data in corpus)
+    return summary
+
+
+async def build_phase(client, poll_seconds=0.2):
+    start = time.perf_counter()
+
+    response = await client.post("/build")
+    response.raise_for_status()
+    job_id = response.json()["job_id"]
+
+    while True:
+        job = (await client.get(f"/build/{job_id}")).json()
+        if job["status"] in ("succeeded", "failed"):
+            break
+        await asyncio.sleep(poll_seconds)
+
+    seconds = time.perf_counter() - start
+    if job["status"] != "succeeded":
+        raise RuntimeError(f"Build failed: {job['error']}")
+
+    return {
+        "seconds": round(seconds, 3),
+        "pages": job["pages_parsed"],
+        "chunks": job["chunks_embedded"],
+        "chunks_per_second": round(job["chunks_embedded"] / seconds, 2) if seconds else None,
+    }
+
+
+async def query_phase(client, questions, concurrency, stream):
+
+    async def send(question):
+        if not stream:
+            response = await client.post("/query", json={"question": question})
+            response.raise_for_status()
+            return {"cached": bool(response.json().get("cached"))}
+
+        start = time.perf_counter()
+        first_token = None
+        async with client.stream("POST", "/query/stream", json={"question": question}) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if line == "event: error":
+                    raise RuntimeError("error event in stream")
+                if first_token is None and line == "event: token":
+                    first_token = time.perf_counter() - start
+        return {"ttft": first_token}
+
+    summary, extras = await run_load(questions, concurrency, send)
+
+    if stream:
+        ttfts = np.asarray([e["ttft"] for e in extras if e["ttft"] is not None]) * 1000
+        if len(ttfts):
+            summary["ttft_p50_ms"] = round(float(np.percentile(ttfts, 50)), 2)
+            summary["ttft_p95_ms"] = round(float(np.percentile(ttfts, 95)), 2)
+            summary["ttft_p99_ms"] = round(float(np.percentile(ttfts, 99)), 2)
+    else:
+        summary["cached"] = sum(e["cached"] for e in extras)
+
+    return summary
+
+
+async def run(args, memory):
+    import httpx
+
+    corpus = make_corpus(args.docs, args.pages, args.words_per_page, args.seed)
+    questions = make_questions(args.queries + args.warmup, args.docs, args.pages, args.seed)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    phases = {}
+
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+
+        def measure(name, result):
+            if memory is not None:
+                result["rss_peak_mb"] = round(memory.peak / 2**20, 1)
+                result["rss_end_mb"] = round(memory.current / 2**20, 1)
+                memory.reset_peak()
+            phases[name] = result
+            print(f"{name:<8} {json.dumps(result)}")
+
+        if memory is not None:
+            phases["idle"] = {"rss_mb": round(memory.current / 2**20, 1)}
+
+        if not args.skip_upload:
+            measure("upload", await upload_phase(client, corpus, args.concurrency))
+
+        if not args.skip_build:
+            measure("build", await build_phase(client))
+
+        # Warm-up queries open the index and fill connection pools
+        for question in questions[:args.warmup]:
+            await client.post("/query", json={"question": question})
+        if memory is not None:
+            memory.reset_peak()
+
+        measure("query", await query_phase(
+            client, questions[args.warmup:], args.concurrency, args.stream
+        ))
+
+    return phases
+
+
+# -------------------- REPORT --------------------
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "describe", "--always", "--dirty"],
+            cwd=BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+COMPARED = ("requests_per_second", "p50_ms", "p95_ms", "p99_ms", "ttft_p50_ms",
+            "seconds", "chunks_per_second", "rss_peak_mb")
+
+
+def compare(report, baseline):
+    label = baseline.get("label")
+    print(f"\nvs {baseline.get('revision') or 'baseline'}" + (f" ({label})" if label else ""))
+    print(f"{'phase':<8} {'metric':<20} {'before':>12} {'after':>12} {'change':>9}")
+    for phase, after in report["phases"].items():
+        before = baseline.get("phases", {}).get(phase, {})
+        for metric in COMPARED:
+            if metric not in after or metric not in before or not before[metric]:
+                continue
+            change = (after[metric] - before[metric]) / before[metric] * 100
+            print(
+                f"{phase:<8} {metric:<20} {before[metric]:>12} {after[metric]:>12} "
+                f"{change:>+8.1f}%"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", help="test an already running API instead of starting one")
+    parser.add_argument("--port", type=int, default=8765, help="port for the API it starts")
+    parser.add_argument("--fake-port", type=int, default=9765, help="port for fake_openai.py")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers")
+    parser.add_argument("--docs", type=int, default=10, help="PDFs in the corpus")
+    parser.add_argument("--pages", type=int, default=5, help="pages per PDF")
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--stream", action="store_true", help="query /query/stream and measure TTFT")
+    parser.add_argument("--skip-upload", action="store_true")
+    parser.add_argument("--skip-build", action="store_true")
+    parser.add_argument("--embed-latency-ms", type=float, default=30.0)
+    parser.add_argument("--ttft-ms", type=float, default=250.0)
+    parser.add_argument("--token-latency-ms", type=float, default=15.0)
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-request timeout")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the API, e.g. RETRIEVAL_MODE=dense")
+    parser.add_argument("--label", help="free text stored in the report")
+    parser.add_argument("--out", default="load_report.json", help="where to write the JSON report")
+    parser.add_argument("--baseline", help="earlier report to compare with")
+    args = parser.parse_args()
+
+    extra_env = dict(item.split("=", 1) for item in args.env)
+
+    fake = api = None
+    data_dir = None
+    memory = None
+
+    try:
+        if args.url is None:
+            data_dir = tempfile.mkdtemp(prefix="rag-load-")
+            fake = spawn([
+                "fake_openai.py",
+                "--port", str(args.fake_port),
+                "--embed-latency-ms", str(args.embed_latency_ms),
+                "--ttft-ms", str(args.ttft_ms),
+                "--token-latency-ms", str(args.token_latency_ms),
+                "--answer-tokens", str(args.answer_tokens),
+                "--jitter", str(args.jitter),
+                "--seed", str(args.seed),
+            ])
+            wait_until_up(f"http://127.0.0.1:{args.fake_port}/stats", fake)
+
+            api = spawn(
+                ["-m", "uvicorn", "FastAPI:app", "--port", str(args.port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                env={
+                    "OPENAI_API_KEY": "fake",
+                    "OPENAI_BASE_URL": f"http://127.0.0.1:{args.fake_port}/v1",
+                    # Otherwise the client downloads tiktoken's encoding
+                    "EMBEDDING_CHECK_CTX_LENGTH": "0",
+                    "DATA_DIR": data_dir,
+                    **extra_env,
+                },
+            )
+            args.url = f"http://127.0.0.1:{args.port}"
+            wait_until_up(args.url + "/health", api)
+            memory = MemorySampler(api.pid).start()
+
+        phases = asyncio.run(run(args, memory))
+    finally:
+        if memory is not None:
+            memory.close()
+        stop(api)
+        stop(fake)
+        if data_dir is not None:
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        "label": args.label,
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("out", "baseline", "label")
+        },
+        "env": extra_env,
+        "phases": phases,
+    }
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
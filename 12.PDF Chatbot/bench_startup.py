@@ -0,0 +1,297 @@
+"""Cold start report: import profile and time-to-ready of the API.
+
+The import profile runs ``python -X importtime`` on the app module (and the
+libraries the warm-up imports later) and lists the heaviest packages. Startup
+is timed over ``--runs`` fresh ``uvicorn FastAPI:app`` processes against
+``fake_openai.py`` with a copy of ``--index-dir``: from spawning the process
+to accepting connections (``/health/live``), to ready (``/health/ready``),
+to the first answered ``/query``. Before the timed runs, one start with a
+``DATA_DIR`` that does not exist yet has to reach ready as well.
+
+    python bench_startup.py --runs 5
+    python bench_startup.py --imports-only
+    python bench_startup.py --out after.json --baseline before.json
+
+Against revisions without ``/health/ready`` the server counts as ready once
+``/health`` answers, which is when the old blocking startup had finished.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import argparse
+import platform
+import subprocess
+
+import numpy as np
+
+from bench_load import BASE_DIR, spawn, stop, wait_until_up, git_revision
+
+# Imported by the warm-up rather than by the app module
+DEFERRED_MODULES = ("langchain_openai", "faiss", "langchain_community.vectorstores", "tiktoken")
+POLL_SECONDS = 0.01
+
+
+# -------------------- IMPORT PROFILE --------------------
+def import_profile(module, env=None, top=10):
+    """``python -X importtime -c "import module"`` in a fresh interpreter."""
+
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BASE_DIR,
+        env={**os.environ, **(env or {})},
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        return {"module": module, "error": result.stderr.strip().splitlines()[-1]}
+
+    packages = {}
+    total_us = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # "import time: <self us> | <cumulative us> | <indented name>"
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        package = name.split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us)
+        if name == module:
+            total_us = int(cumulative_us)
+
+    heaviest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "module": module,
+        "seconds": round(total_us / 1e6, 3),
+        "packages": [
+            {"package": name, "seconds": round(us / 1e6, 3)} for name, us in heaviest
+        ],
+    }
+
+
+def print_profile(profile):
+    if "error" in profile:
+        print(f"{profile['module']}: {profile['error']}")
+        return
+    print(f"import {profile['module']}: {profile['seconds']:.3f}s")
+    for row in profile["packages"]:
+        print(f"    {row['package']:<32} {row['seconds']:>7.3f}s")
+
+
+# -------------------- TIME TO READY --------------------
+def poll(url, process, timeout, accept=(200,)):
+    """Seconds until ``url`` answers with one of ``accept``, or None on 404."""
+
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"the API exited with code {process.returncode}")
+        try:
+            response = httpx.get(url, timeout=1)
+            if response.status_code == 404:
+                return None
+            if response.status_code in accept:
+                return response
+        except httpx.TransportError:
+            pass
+        time.sleep(POLL_SECONDS)
+    raise RuntimeError(f"{url} not ready within {timeout}s")
+
+
+def start_once(args, data_dir, fake_url):
+    import httpx
+
+    url = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    api = spawn(
+        ["-m", "uvicorn", "FastAPI:app", "--port", str(args.port), "--log-level", "warning"],
+        env={
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_BASE_URL": fake_url,
+            "EMBEDDING_CHECK_CTX_LENGTH": "0",
+            "DATA_DIR": data_dir,
+            **args.extra_env,
+        },
+    )
+    try:
+        if poll(url + "/health/live", api, args.timeout) is None:
+            # Older revision: /health answers once the blocking startup is done
+            poll(url + "/health", api, args.timeout)
+            listening = ready = time.perf_counter() - start
+            steps = None
+        else:
+            listening = time.perf_counter() - start
+            response = poll(url + "/health/ready", api, args.timeout)
+            ready = time.perf_counter() - start
+            steps = response.json()["steps"]
+
+        response = httpx.post(url + "/query", json={"question": args.question}, timeout=args.timeout)
+        response.raise_for_status()
+        first_answer = time.perf_counter() - start
+    finally:
+        stop(api)
+
+    return {
+        "listening_seconds": round(listening, 3),
+        "ready_seconds": round(ready, 3),
+        "first_answer_seconds": round(first_answer, 3),
+        "steps": steps,
+    }
+
+
+def fresh_start(args, fake_url):
+    """Start against a ``DATA_DIR`` that does not exist and wait for ready."""
+
+    data_dir = os.path.join(tempfile.mkdtemp(prefix="rag-fresh-"), "data")
+    url = f"http://127.0.0.1:{args.port}"
+    start = time.perf_counter()
+    api = spawn(
+        ["-m", "uvicorn", "FastAPI:app", "--port", str(args.port), "--log-level", "warning"],
+        env={
+            "OPENAI_API_KEY": "fake",
+            "OPENAI_BASE_URL": fake_url,
+            "EMBEDDING_CHECK_CTX_LENGTH": "0",
+            "DATA_DIR": data_dir,
+            **args.extra_env,
+        },
+    )
+    try:
+        if poll(url + "/health/live", api, args.timeout) is None:
+            return None
+        # A failing warm-up step keeps retrying, so this times out
+        response = poll(url + "/health/ready", api, args.timeout)
+    finally:
+        stop(api)
+        shutil.rmtree(os.path.dirname(data_dir), ignore_errors=True)
+
+    return {
+        "ready_seconds": round(time.perf_counter() - start, 3),
+        "steps": response.json()["steps"],
+    }
+
+
+def summarize(runs):
+    summary = {}
+    for key in ("listening_seconds", "ready_seconds", "first_answer_seconds"):
+        values = [run[key] for run in runs]
+        summary[key] = {
+            "median": round(float(np.median(values)), 3),
+            "min": round(min(values), 3),
+            "max": round(max(values), 3),
+        }
+    return summary
+
+
+def time_to_ready(args):
+    data_dir = tempfile.mkdtemp(prefix="rag-startup-")
+    fake = None
+    try:
+        shutil.copytree(args.index_dir, os.path.join(data_dir, os.path.basename(args.index_dir.rstrip("/\\"))))
+
+        fake = spawn([
+            "fake_openai.py", "--port", str(args.fake_port),
+            "--embed-latency-ms", "0", "--ttft-ms", "0", "--token-latency-ms", "0",
+        ])
+        wait_until_up(f"http://127.0.0.1:{args.fake_port}/stats", fake)
+        fake_url = f"http://127.0.0.1:{args.fake_port}/v1"
+
+        fresh = fresh_start(args, fake_url)
+        if fresh is not None:
+            print(f"empty DATA_DIR: ready in {fresh['ready_seconds']:.3f}s")
+
+        # The first start converts a legacy index and fills the page cache;
+        # it is reported but not part of the summary
+        first = start_once(args, data_dir, fake_url)
+        print(f"first start: ready in {first['ready_seconds']:.3f}s (not counted)")
+
+        runs = []
+        for i in range(args.runs):
+            run = start_once(args, data_dir, fake_url)
+            runs.append(run)
+            print(
+                f"run {i + 1}: listening {run['listening_seconds']:.3f}s, "
+                f"ready {run['ready_seconds']:.3f}s, first answer {run['first_answer_seconds']:.3f}s"
+            )
+    finally:
+        stop(fake)
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    return {"fresh_start": fresh, "first_start": first, "runs": runs, "summary": summarize(runs)}
+
+
+# -------------------- REPORT --------------------
+def compare(report, baseline):
+    print(f"\nvs {baseline.get('revision') or 'baseline'}")
+    before = (baseline.get("startup") or {}).get("summary", {})
+    after = (report.get("startup") or {}).get("summary", {})
+    for key, values in after.items():
+        if key in before and before[key]["median"]:
+            old, new = before[key]["median"], values["median"]
+            print(f"{key:<22} {old:>8.3f}s {new:>8.3f}s {(new - old) / old * 100:>+8.1f}%")
+
+    old_imports = {p["module"]: p.get("seconds") for p in baseline.get("imports", [])}
+    for profile in report.get("imports", []):
+        old = old_imports.get(profile["module"])
+        if old and profile.get("seconds") is not None:
+            new = profile["seconds"]
+            print(f"import {profile['module']:<15} {old:>8.3f}s {new:>8.3f}s {(new - old) / old * 100:>+8.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="timed starts")
+    parser.add_argument("--index-dir", default=os.path.join(BASE_DIR, "faiss_openai_1536"),
+                        help="index copied into the scratch DATA_DIR")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--fake-port", type=int, default=9766)
+    parser.add_argument("--question", default="What does the policy say about conflicts of interest?")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--imports-only", action="store_true", help="skip the startup runs")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="extra environment for the API, e.g. VECTOR_BACKEND=chroma")
+    parser.add_argument("--out", default="startup_report.json", help="where to write the JSON report")
+    parser.add_argument("--baseline", help="earlier report to compare with")
+    args = parser.parse_args()
+    args.extra_env = dict(item.split("=", 1) for item in args.env)
+
+    scratch = tempfile.mkdtemp(prefix="rag-imports-")
+    try:
+        imports = [import_profile("FastAPI", {"DATA_DIR": scratch, **args.extra_env})]
+        imports += [import_profile(module) for module in DEFERRED_MODULES]
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    for profile in imports:
+        print_profile(profile)
+        print()
+
+    report = {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "env": args.extra_env,
+        "imports": imports,
+        "startup": None if args.imports_only else time_to_ready(args),
+    }
+
+    if report["startup"] is not None:
+        print()
+        for key, values in report["startup"]["summary"].items():
+            print(f"{key:<22} median {values['median']:.3f}s  (min {values['min']:.3f}s, max {values['max']:.3f}s)")
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
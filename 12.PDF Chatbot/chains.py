@@ -0,0 +1,149 @@
+"""RAG chain registry and query admission control.
+
+The retriever -> prompt -> LLM graph only depends on the published index, so
+it is built once per loaded index (i.e. per published version of a
+collection) and reused by every request. ``RagChain`` keeps retrieval and
+generation as separate steps so the streaming endpoint can send sources
+before the first token. With a ``packer`` (``context_packing.py``) the
+retrieved chunks are merged, deduped and cut to a token budget before they
+become the prompt's context.
+
+``ConcurrencyLimiter`` bounds how many queries run at once and how many may
+wait for a slot, instead of letting each request grab its own thread.
+"""
+
+import asyncio
+import threading
+from collections import OrderedDict
+
+from metrics import stage
+
+
+class RagChain:
+
+    def __init__(self, retriever, prompt, llm, packer=None):
+        self.retriever = retriever
+        self.prompt = prompt
+        self.generate = prompt | llm
+        self.packer = packer
+
+    async def aretrieve(self, question, filter=None):
+        if filter is None:
+            docs = await self.retriever.ainvoke(question)
+        else:
+            docs = await self.retriever.ainvoke(question, filter=filter)
+
+        if self.packer is None:
+            return docs
+        with stage("context_packing"):
+            return self.packer.pack(docs)
+
+    def _inputs(self, question, docs):
+        context = docs if self.packer is None else self.packer.format(docs)
+        return {"context": context, "input": question}
+
+    async def ainvoke(self, question):
+        docs = await self.aretrieve(question)
+        return docs, await self.agenerate(question, docs)
+
+    async def agenerate(self, question, docs):
+        return await self.generate.ainvoke(self._inputs(question, docs))
+
+    def prompt_text(self, question, docs):
+        return self.prompt.format(**self._inputs(question, docs))
+
+    def astream(self, question, docs):
+        return self.generate.astream(self._inputs(question, docs))
+
+
+class ChainRegistry:
+
+    def __init__(self, build_chain, keep=2):
+        self.build_chain = build_chain
+        self.keep = keep
+        self._chains = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, index):
+        # Keyed by the index object itself: a request can never pair a new
+        # version number with the previous index while a swap is happening.
+        key = id(index)
+        with self._lock:
+            entry = self._chains.get(key)
+            if entry is None or entry[0] is not index:
+                entry = (index, self.build_chain(index))
+                self._chains[key] = entry
+                # Requests that started on an older version may still hold
+                # its chain; only the registry's reference is dropped.
+                while len(self._chains) > self.keep:
+                    self._chains.popitem(last=False)
+            return entry[1]
+
+    def discard(self, index):
+        # Called when an index is replaced or evicted so the registry does
+        # not keep it alive
+        with self._lock:
+            entry = self._chains.get(id(index))
+            if entry is not None and entry[0] is index:
+                del self._chains[id(index)]
+
+    def clear(self):
+        with self._lock:
+            self._chains.clear()
+
+
+class QueueFull(Exception):
+    pass
+
+
+class ConcurrencyLimiter:
+
+    def __init__(self, max_concurrency, max_waiting):
+        self.max_concurrency = max_concurrency
+        self.max_waiting = max_waiting
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._semaphore = None
+
+    def _get_semaphore(self):
+        # Created lazily so it binds to the server's running event loop
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        return self._semaphore
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+        return False
+
+    async def acquire(self):
+        semaphore = self._get_semaphore()
+
+        if semaphore.locked() and self.waiting >= self.max_waiting:
+            self.rejected += 1
+            raise QueueFull()
+
+        self.waiting += 1
+        try:
+            await semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        self.in_flight += 1
+
+    def release(self):
+        self.in_flight -= 1
+        self._get_semaphore().release()
+
+    def stats(self):
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_waiting": self.max_waiting,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,256 @@
+"""Named collections: one knowledge base per tenant.
+
+Every collection has its own index directory, upload directory, build lock
+and index version. The default collection keeps the original
+``faiss_openai_1536/`` + ``uploads/`` layout; the others live under
+``collections/<name>/{index,uploads}``.
+
+Indexes are opened lazily by the first query that needs them. Once the
+resident indexes add up to more than ``memory_budget`` bytes, the least
+recently used ones are evicted. Eviction only drops the manager's reference:
+queries still holding an evicted index finish on it, and the next query
+opens it again from disk.
+
+Index directories are versioned (``index_versions.py``). At most every
+``check_interval`` seconds a query compares the loaded version with the one
+on disk and reopens the index if another worker published a newer one.
+"""
+
+import os
+import re
+import time
+import shutil
+import threading
+from collections import OrderedDict
+
+from uploads import UploadStore
+from index_versions import current_dir, current_version
+
+DEFAULT_COLLECTION = "default"
+
+NAME_RE = re.compile(r"^[a-z0-9][a-z0-9_-]{0,63}$")
+
+
+class LoadedIndex:
+    """Serving objects of one published index version of a collection."""
+
+    def __init__(self, vectors, sparse=None, nbytes=0, version=0):
+        self.vectors = vectors
+        self.sparse = sparse
+        self.nbytes = nbytes
+        self.version = version
+
+
+class Collection:
+
+    def __init__(self, name, index_root, upload_dir):
+        self.name = name
+        self.index_root = index_root
+        self.upload_dir = upload_dir
+        self.uploads = UploadStore(upload_dir)
+
+        # /build and the per-document endpoints all mutate the same index +
+        # manifest; builds of different collections run independently
+        self.lock = threading.Lock()
+        self._load_lock = threading.Lock()
+
+        self.version = 0
+        self.loaded = None
+        self.last_used = 0.0
+        # Latest version seen on disk and when it was last looked up
+        self.published = 0
+        self.checked_at = 0.0
+
+    @property
+    def index_dir(self):
+        """Directory of the currently published index version."""
+        return current_dir(self.index_root)
+
+
+class CollectionManager:
+
+    def __init__(self, root, open_index, memory_budget, default_dirs=None, on_evict=None,
+                 check_interval=1.0):
+        self.root = root
+        self.open_index = open_index
+        self.memory_budget = memory_budget
+        self.default_dirs = default_dirs
+        self.on_evict = on_evict
+        self.check_interval = check_interval
+
+        self._collections = {}
+        self._resident = OrderedDict()
+        self._lock = threading.RLock()
+
+        self.loads = 0
+        self.evictions = 0
+        self.reloads = 0
+
+    @staticmethod
+    def validate(name):
+        if not NAME_RE.match(name):
+            raise ValueError(
+                "Collection names are 1-64 lowercase letters, digits, '-' or '_'"
+            )
+
+    def _paths(self, name):
+        if name == DEFAULT_COLLECTION and self.default_dirs:
+            return self.default_dirs
+        base = os.path.join(self.root, name)
+        return os.path.join(base, "index"), os.path.join(base, "uploads")
+
+    def exists(self, name):
+        return name == DEFAULT_COLLECTION or os.path.isdir(os.path.join(self.root, name))
+
+    def names(self):
+        names = {DEFAULT_COLLECTION}
+        if os.path.isdir(self.root):
+            names.update(
+                name for name in os.listdir(self.root)
+                if NAME_RE.match(name) and os.path.isdir(os.path.join(self.root, name))
+            )
+        return sorted(names)
+
+    def get(self, name, create=False):
+        """Return the collection ``name``; ``KeyError`` if it does not exist."""
+
+        self.validate(name)
+
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                if not self.exists(name):
+                    if not create:
+                        raise KeyError(name)
+                    os.makedirs(os.path.join(self.root, name))
+                collection = Collection(name, *self._paths(name))
+                self._collections[name] = collection
+            return collection
+
+    def delete(self, name):
+        if name == DEFAULT_COLLECTION:
+            raise ValueError("The default collection cannot be deleted")
+
+        collection = self.get(name)
+
+        with collection.lock:
+            self.evict(collection)
+            with self._lock:
+                self._collections.pop(name, None)
+            shutil.rmtree(os.path.join(self.root, name), ignore_errors=True)
+
+    # -------------------- RESIDENT INDEXES --------------------
+    def index(self, collection):
+        """The collection's ``LoadedIndex``, opened if needed; ``None`` if unbuilt."""
+
+        loaded = collection.loaded
+
+        if loaded is not None and self.outdated(collection):
+            self.reload(collection)
+            loaded = collection.loaded
+
+        if loaded is None:
+            with collection._load_lock:
+                loaded = collection.loaded
+                if loaded is None:
+                    loaded = self.open_index(collection)
+                    if loaded is None:
+                        return None
+                    self._install(collection, loaded)
+                    self.loads += 1
+
+        with self._lock:
+            collection.last_used = time.time()
+            if collection.name in self._resident:
+                self._resident.move_to_end(collection.name)
+
+        return loaded
+
+    def outdated(self, collection):
+        """Whether a newer version of the loaded index has been published."""
+
+        loaded = collection.loaded
+        if loaded is None:
+            return False
+
+        now = time.monotonic()
+        if now - collection.checked_at >= self.check_interval:
+            collection.checked_at = now
+            collection.published = current_version(collection.index_root)[0]
+
+        return collection.published != loaded.version
+
+    def reload(self, collection):
+        """Swap in the index version currently published for ``collection``."""
+
+        with collection._load_lock:
+            previous = collection.loaded
+            if (
+                previous is not None
+                and previous.version == current_version(collection.index_root)[0]
+            ):
+                # Another query got here first
+                return
+            loaded = self.open_index(collection)
+            self._install(collection, loaded)
+            self.reloads += 1
+
+        if previous is not None and self.on_evict is not None:
+            self.on_evict(collection, previous)
+
+    def evict(self, collection):
+        with self._lock:
+            self._evict(collection)
+
+    def _install(self, collection, loaded):
+        with self._lock:
+            collection.loaded = loaded
+            collection.last_used = time.time()
+            collection.checked_at = time.monotonic()
+
+            if loaded is None:
+                self._resident.pop(collection.name, None)
+                return
+
+            collection.version = collection.published = loaded.version
+            self._resident[collection.name] = collection
+            self._resident.move_to_end(collection.name)
+
+            # Never evict the index that was just opened, even if it alone
+            # exceeds the budget
+            while self._resident_bytes() > self.memory_budget and len(self._resident) > 1:
+                self._evict(next(iter(self._resident.values())))
+                self.evictions += 1
+
+    def _evict(self, collection):
+        self._resident.pop(collection.name, None)
+        loaded, collection.loaded = collection.loaded, None
+        if loaded is not None and self.on_evict is not None:
+            self.on_evict(collection, loaded)
+
+    def _resident_bytes(self):
+        return sum(
+            c.loaded.nbytes for c in self._resident.values() if c.loaded is not None
+        )
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            resident = [
+                {
+                    "name": c.name,
+                    "version": c.version,
+                    "bytes": c.loaded.nbytes,
+                    "idle_seconds": round(now - c.last_used, 1),
+                }
+                for c in reversed(self._resident.values()) if c.loaded is not None
+            ]
+            return {
+                "total": len(self.names()),
+                "resident": resident,
+                "resident_bytes": sum(r["bytes"] for r in resident),
+                "memory_budget_bytes": self.memory_budget,
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,166 @@
+"""Token-budgeted assembly of the retrieved chunks into the prompt context.
+
+Chunks are split with an overlap, so neighbouring hits from the same page
+repeat part of each other's text. ``ContextPacker`` turns the retriever's
+ranked candidates into the passages the LLM sees:
+
+1. chunks of the same document where the end of one is the start of the
+   other (the splitter's overlap) are merged into one span, which ranks like
+   its best chunk;
+2. spans whose word trigrams mostly (``duplicate_threshold``) appear in a
+   better ranked span are dropped;
+3. spans are added best first while they fit in ``token_budget`` tokens
+   (tiktoken, see ``tokens.py``). One that doesn't fit is skipped, so a
+   shorter, lower ranked span can still use the rest.
+
+The best span is truncated if even it doesn't fit, so the context is never
+empty.
+"""
+
+import re
+import itertools
+
+from langchain_core.documents import Document
+
+from metrics import CONTEXT_CHUNKS
+from tokens import count_tokens, truncate_tokens
+
+# Shortest shared text taken for the splitter's overlap rather than chance
+MIN_OVERLAP_CHARS = 32
+SHINGLE_WORDS = 3
+WORD_RE = re.compile(r"\w+")
+SEPARATOR = "\n\n"
+
+
+def _overlap(first, second):
+    """Length of the longest suffix of ``first`` that ``second`` starts with."""
+
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return 0
+
+    # The earliest match is the longest overlap
+    pos = first.find(probe, max(0, len(first) - len(second)))
+    while pos != -1:
+        if second.startswith(first[pos:]):
+            return len(first) - pos
+        pos = first.find(probe, pos + 1)
+    return 0
+
+
+def _join(first, second):
+    if second in first:
+        return first
+    n = _overlap(first, second)
+    return first + second[n:] if n else None
+
+
+def shingles(text):
+    words = WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_WORDS:
+        return {tuple(words)} if words else set()
+    return set(zip(*(words[i:] for i in range(SHINGLE_WORDS))))
+
+
+class _Span:
+
+    def __init__(self, doc, rank):
+        self.doc = doc
+        self.text = doc.page_content
+        self.rank = rank
+        self.chunks = 1
+
+    def absorb(self, other, text):
+        self.text = text
+        self.chunks += other.chunks
+        if other.rank < self.rank:
+            self.doc, self.rank = other.doc, other.rank
+
+    def document(self):
+        return Document(id=self.doc.id, page_content=self.text, metadata=self.doc.metadata)
+
+
+class ContextPacker:
+
+    def __init__(self, token_budget, duplicate_threshold=0.8):
+        self.token_budget = token_budget
+        self.duplicate_threshold = duplicate_threshold
+
+    def pack(self, docs):
+        """Best first list of passages (merged chunks) within the budget."""
+
+        spans = self._merge(docs)
+        CONTEXT_CHUNKS.labels(outcome="merged").inc(len(docs) - len(spans))
+
+        kept = self._drop_duplicates(spans)
+        CONTEXT_CHUNKS.labels(outcome="duplicate").inc(len(spans) - len(kept))
+
+        packed = self._fill(kept)
+        CONTEXT_CHUNKS.labels(outcome="over_budget").inc(len(kept) - len(packed))
+        CONTEXT_CHUNKS.labels(outcome="packed").inc(len(packed))
+
+        return [span.document() for span in packed]
+
+    def format(self, docs):
+        return SEPARATOR.join(render(doc) for doc in docs)
+
+    def _merge(self, docs):
+        groups = {}
+        for rank, doc in enumerate(docs):
+            key = doc.metadata.get("doc_hash") or doc.metadata.get("source")
+            groups.setdefault(key, []).append(_Span(doc, rank))
+
+        spans = []
+        for group in groups.values():
+            merged = True
+            while merged:
+                merged = False
+                for a, b in itertools.permutations(group, 2):
+                    text = _join(a.text, b.text)
+                    if text is not None:
+                        a.absorb(b, text)
+                        group.remove(b)
+                        merged = True
+                        break
+            spans.extend(group)
+
+        return sorted(spans, key=lambda span: span.rank)
+
+    def _drop_duplicates(self, spans):
+        kept, seen = [], []
+        for span in spans:
+            grams = shingles(span.text)
+            if grams and any(
+                len(grams & other) >= self.duplicate_threshold * len(grams) for other in seen
+            ):
+                continue
+            kept.append(span)
+            seen.append(grams)
+        return kept
+
+    def _fill(self, spans):
+        packed, used = [], 0
+        for span in spans:
+            tokens = count_tokens(render(span.document())) + (1 if packed else 0)
+            if used + tokens <= self.token_budget:
+                packed.append(span)
+                used += tokens
+
+        if not packed and spans:
+            top = spans[0]
+            header = count_tokens(render(Document(page_content="", metadata=top.doc.metadata)))
+            top.text = truncate_tokens(top.text, max(self.token_budget - header, 1))
+            packed.append(top)
+
+        return packed
+
+
+def render(doc):
+    """A passage as the LLM sees it: where it comes from, then the text."""
+
+    name = doc.metadata.get("filename") or str(doc.metadata.get("source", "")).replace("\\", "/").rsplit("/", 1)[-1]
+    page = doc.metadata.get("page")
+    if page is None:
+        return f"[{name}]\n{doc.page_content}" if name else doc.page_content
+    # PDF pages are 0-based in the metadata
+    return f"[{name}, page {page + 1}]\n{doc.page_content}"
@@ -0,0 +1,221 @@
+"""Persistent embedding cache shared by the build and query paths.
+
+Vectors are stored in SQLite as float32 blobs keyed by
+``(model, dimensions, sha256(text))`` and hot query strings are additionally
+kept in an in-memory LRU, so re-embedding an unchanged chunk or a repeated
+question never reaches the embedding API.
+
+The async methods run on the server's event loop, so they only touch the
+LRU there; SQLite reads and commits go through ``asyncio.to_thread``.
+"""
+
+import asyncio
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+# SQLite caps the number of bound parameters per statement
+LOOKUP_BATCH = 500
+
+
+def text_key(text):
+    return hashlib.sha256(text.encode("utf-8")).digest()
+
+
+class CachedEmbeddings(Embeddings):
+
+    def __init__(self, inner, path, model=None, dimensions=None, lru_size=2048):
+        self.inner = inner
+        self.model = model or getattr(inner, "model", type(inner).__name__)
+        self.dimensions = dimensions or getattr(inner, "dimensions", None) or 0
+        self.lru_size = lru_size
+
+        self._lru = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            " model TEXT NOT NULL,"
+            " dimensions INTEGER NOT NULL,"
+            " text_hash BLOB NOT NULL,"
+            " vector BLOB NOT NULL,"
+            " PRIMARY KEY (model, dimensions, text_hash)"
+            ") WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    # -------------------- STORAGE --------------------
+    def _load(self, keys):
+        found = {}
+        with self._lock:
+            for start in range(0, len(keys), LOOKUP_BATCH):
+                batch = keys[start:start + LOOKUP_BATCH]
+                marks = ",".join("?" * len(batch))
+                rows = self._db.execute(
+                    "SELECT text_hash, vector FROM embeddings"
+                    f" WHERE model = ? AND dimensions = ? AND text_hash IN ({marks})",
+                    [self.model, self.dimensions, *batch],
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32).tolist()
+        return found
+
+    def _store(self, items):
+        rows = [
+            (self.model, self.dimensions, key, np.asarray(vec, dtype=np.float32).tobytes())
+            for key, vec in items
+        ]
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?)", rows
+            )
+            self._db.commit()
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._lru[key] = vector
+            self._lru.move_to_end(key)
+            while len(self._lru) > self.lru_size:
+                self._lru.popitem(last=False)
+
+    def _recall(self, key):
+        with self._lock:
+            vector = self._lru.get(key)
+            if vector is not None:
+                self._lru.move_to_end(key)
+                self._stats["memory_hits"] += 1
+            return vector
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._stats[name] += n
+
+    # -------------------- DOCUMENTS --------------------
+    def _lookup_documents(self, texts):
+        keys = [text_key(t) for t in texts]
+        found = self._load(list(set(keys)))
+
+        # Duplicate texts inside one call are embedded only once
+        missing = {}
+        for i, key in enumerate(keys):
+            if key not in found:
+                missing.setdefault(key, i)
+
+        self._count("disk_hits", len(keys) - sum(1 for k in keys if k in missing))
+        self._count("misses", len(missing))
+        return keys, found, missing
+
+    def _merge(self, keys, found, missing, vectors):
+        fresh = list(zip(missing, vectors))
+        if fresh:
+            self._store(fresh)
+            found.update(fresh)
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts):
+        keys, found, missing = self._lookup_documents(texts)
+        vectors = []
+        if missing:
+            vectors = self.inner.embed_documents([texts[i] for i in missing.values()])
+        return self._merge(keys, found, missing, vectors)
+
+    async def aembed_documents(self, texts):
+        keys, found, missing = await asyncio.to_thread(self._lookup_documents, texts)
+        vectors = []
+        if missing:
+            vectors = await self.inner.aembed_documents(
+                [texts[i] for i in missing.values()]
+            )
+        return await asyncio.to_thread(self._merge, keys, found, missing, vectors)
+
+    # -------------------- QUERIES --------------------
+    def _load_queries(self, keys):
+        """Vectors of ``keys`` found on disk, moved into the LRU."""
+        found = self._load(keys)
+        self._count("disk_hits", len(found))
+        for key, vector in found.items():
+            self._remember(key, vector)
+        return found
+
+    def _store_queries(self, items):
+        self._count("misses", len(items))
+        self._store(items)
+        for key, vector in items:
+            self._remember(key, vector)
+
+    def embed_query(self, text):
+        key = text_key(text)
+        vector = self._recall(key)
+        if vector is None:
+            vector = self._load_queries([key]).get(key)
+        if vector is None:
+            vector = self.inner.embed_query(text)
+            self._store_queries([(key, vector)])
+        return vector
+
+    async def aembed_query(self, text):
+        key = text_key(text)
+        vector = self._recall(key)
+        if vector is None:
+            vector = (await asyncio.to_thread(self._load_queries, [key])).get(key)
+        if vector is None:
+            vector = await self.inner.aembed_query(text)
+            await asyncio.to_thread(self._store_queries, [(key, vector)])
+        return vector
+
+    def cached_query(self, text):
+        """The vector of a query if it is in the LRU, or ``None``.
+
+        Never calls the API or reads SQLite, so it is safe on the event loop.
+        """
+        return self._recall(text_key(text))
+
+    async def aembed_queries(self, texts):
+        """Embed several queries with at most one API request."""
+        keys = [text_key(text) for text in texts]
+        vectors = {key: self._recall(key) for key in keys}
+
+        missing = [key for key, vector in vectors.items() if vector is None]
+        if missing:
+            vectors.update(await asyncio.to_thread(self._load_queries, missing))
+            missing = [key for key in missing if vectors[key] is None]
+
+        if missing:
+            text_of = dict(zip(keys, texts))
+            fresh = list(zip(missing, await self.inner.aembed_documents(
+                [text_of[key] for key in missing]
+            )))
+            await asyncio.to_thread(self._store_queries, fresh)
+            vectors.update(fresh)
+
+        return [vectors[key] for key in keys]
+
+    # -------------------- STATS --------------------
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stored = self._db.execute(
+                "SELECT COUNT(*) FROM embeddings WHERE model = ? AND dimensions = ?",
+                (self.model, self.dimensions),
+            ).fetchone()[0]
+
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+
+        stats.update({
+            "model": self.model,
+            "dimensions": self.dimensions or None,
+            "hits": hits,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+            "stored_vectors": stored,
+            "lru_entries": len(self._lru),
+        })
+        return stats
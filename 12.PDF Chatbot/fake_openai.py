@@ -0,0 +1,205 @@
+"""Local stand-in for the OpenAI embeddings and chat completions API.
+
+Embeddings are derived from a hash of the input, so the same text always
+gets the same unit vector, and answers are built from a fixed vocabulary
+seeded by the prompt. Every call sleeps for a configurable latency with
++/- ``jitter`` (a fraction of it), which makes load tests reproducible and
+free while still looking like a remote API to the app.
+
+    python fake_openai.py --port 9000 --embed-latency-ms 50 --ttft-ms 300
+
+Point the app at it with ``OPENAI_BASE_URL=http://127.0.0.1:9000/v1``, and
+``EMBEDDING_CHECK_CTX_LENGTH=0`` to keep the embeddings client from
+downloading tiktoken's encoding.
+"""
+
+import json
+import time
+import uuid
+import base64
+import random
+import asyncio
+import hashlib
+import argparse
+
+import numpy as np
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+WORDS = (
+    "the policy requires every employee to report conflicts of interest "
+    "and protect customer data according to the code of conduct while "
+    "managers review exceptions each quarter with the compliance team"
+).split()
+
+
+def _seed(value):
+    if not isinstance(value, str):
+        # Pre-tokenized input (lists of token ids)
+        value = json.dumps(value)
+    return int.from_bytes(hashlib.sha256(value.encode("utf-8")).digest()[:8], "little")
+
+
+def fake_embedding(value, dim):
+    vector = np.random.default_rng(_seed(value)).standard_normal(dim).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def fake_answer(messages, n_tokens):
+    rng = random.Random(_seed(messages))
+    return [(" " if i else "") + rng.choice(WORDS) for i in range(n_tokens)]
+
+
+def _inputs(value):
+    # str | [str] | [int] (one tokenized text) | [[int]]
+    if isinstance(value, str):
+        return [value]
+    if value and isinstance(value[0], int):
+        return [value]
+    return list(value)
+
+
+class FakeOpenAI:
+
+    def __init__(self, dim=1536, embed_latency_ms=30.0, ttft_ms=250.0,
+                 token_latency_ms=15.0, answer_tokens=60, jitter=0.2, seed=0):
+        self.dim = dim
+        self.embed_latency = embed_latency_ms / 1000
+        self.ttft = ttft_ms / 1000
+        self.token_latency = token_latency_ms / 1000
+        self.answer_tokens = answer_tokens
+        self.jitter = jitter
+        self._random = random.Random(seed)
+
+        self.calls = {"embeddings": 0, "embedded_inputs": 0, "chat": 0}
+
+    async def _sleep(self, seconds):
+        if seconds > 0:
+            await asyncio.sleep(seconds * (1 + self.jitter * self._random.uniform(-1, 1)))
+
+    async def embeddings(self, body):
+        inputs = _inputs(body["input"])
+        self.calls["embeddings"] += 1
+        self.calls["embedded_inputs"] += len(inputs)
+
+        await self._sleep(self.embed_latency)
+
+        dim = body.get("dimensions") or self.dim
+        data = []
+        for i, value in enumerate(inputs):
+            vector = fake_embedding(value, dim)
+            if body.get("encoding_format") == "base64":
+                # What the openai client asks for by default
+                embedding = base64.b64encode(vector.tobytes()).decode("ascii")
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "fake"),
+            "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+        }
+
+    async def chat(self, body):
+        self.calls["chat"] += 1
+
+        messages = body.get("messages", [])
+        tokens = fake_answer(messages, self.answer_tokens)
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in messages) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        completion_id = "chatcmpl-" + uuid.uuid4().hex[:24]
+        created = int(time.time())
+        model = body.get("model", "fake")
+
+        if not body.get("stream"):
+            await self._sleep(self.ttft + self.token_latency * len(tokens))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop",
+                }],
+                "usage": usage,
+            }
+
+        def chunk(delta, finish_reason=None):
+            return "data: " + json.dumps({
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }) + "\n\n"
+
+        async def stream():
+            await self._sleep(self.ttft)
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    await self._sleep(self.token_latency)
+                yield chunk({"content": token})
+            yield chunk({}, "stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+
+def create_app(fake=None):
+    fake = fake or FakeOpenAI()
+    app = FastAPI(title="Fake OpenAI API")
+    app.state.fake = fake
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        return await fake.embeddings(await request.json())
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        return await fake.chat(await request.json())
+
+    @app.get("/stats")
+    def stats():
+        return fake.calls
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimensions")
+    parser.add_argument("--embed-latency-ms", type=float, default=30.0)
+    parser.add_argument("--ttft-ms", type=float, default=250.0, help="delay before the first token")
+    parser.add_argument("--token-latency-ms", type=float, default=15.0, help="delay between tokens")
+    parser.add_argument("--answer-tokens", type=int, default=60)
+    parser.add_argument("--jitter", type=float, default=0.2, help="latency varies by +/- this fraction")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    fake = FakeOpenAI(
+        dim=args.dim,
+        embed_latency_ms=args.embed_latency_ms,
+        ttft_ms=args.ttft_ms,
+        token_latency_ms=args.token_latency_ms,
+        answer_tokens=args.answer_tokens,
+        jitter=args.jitter,
+        seed=args.seed,
+    )
+    uvicorn.run(create_app(fake), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,283 @@
+"""Configurable FAISS index types for the knowledge base.
+
+A spec is a short string, ``kind[:key=value,...]``::
+
+    flat                                  exact search (the default)
+    ivf-flat:nlist=1024,nprobe=16         inverted lists over raw vectors
+    ivf-pq:nlist=1024,m=64,nbits=8        inverted lists + product quantization
+    ivf-sq:nlist=1024,sq=8                inverted lists + scalar quantization
+    hnsw:m=32,ef_construction=200,ef_search=64
+    sq:sq=fp16                            scalar quantized flat scan (8, 4, fp16)
+
+``train_size`` sets how many vectors are sampled to train IVF/PQ/SQ indexes.
+``nprobe`` and ``ef_search`` are search-time parameters: they are applied
+every time an index is loaded and can be changed without rebuilding.
+"""
+
+import os
+import json
+
+import numpy as np
+
+SPEC_NAME = "index_spec.json"
+
+KINDS = ("flat", "ivf-flat", "ivf-pq", "ivf-sq", "hnsw", "sq")
+
+DEFAULTS = {
+    "nlist": 1024,
+    "m": 32,
+    "nbits": 8,
+    "sq": "8",
+    "ef_construction": 200,
+    "ef_search": 64,
+    "nprobe": 16,
+    "train_size": 50000,
+}
+
+# Parameters that only affect search; changing them never needs a rebuild
+SEARCH_PARAMS = ("nprobe", "ef_search")
+
+# FAISS wants ~39 training points per IVF centroid
+POINTS_PER_CENTROID = 39
+
+
+class IndexSpec:
+
+    def __init__(self, kind="flat", **params):
+        if kind not in KINDS:
+            raise ValueError(f"Unknown index kind {kind!r}, expected one of {KINDS}")
+        self.kind = kind
+        self.params = {**DEFAULTS, **params}
+
+    @classmethod
+    def parse(cls, text):
+        text = (text or "flat").strip()
+        kind, _, rest = text.partition(":")
+        params = {}
+        for item in filter(None, rest.split(",")):
+            key, _, value = item.partition("=")
+            key = key.strip()
+            if key not in DEFAULTS:
+                raise ValueError(f"Unknown index parameter {key!r} in {text!r}")
+            value = value.strip()
+            params[key] = value if key == "sq" else int(value)
+        return cls(kind.strip().lower(), **params)
+
+    def __str__(self):
+        keys = {
+            "flat": (),
+            "ivf-flat": ("nlist", "nprobe"),
+            "ivf-pq": ("nlist", "m", "nbits", "nprobe"),
+            "ivf-sq": ("nlist", "sq", "nprobe"),
+            "hnsw": ("m", "ef_construction", "ef_search"),
+            "sq": ("sq",),
+        }[self.kind]
+        if not keys:
+            return self.kind
+        return self.kind + ":" + ",".join(f"{k}={self.params[k]}" for k in keys)
+
+    def structure(self):
+        """The part of the spec that determines the on-disk index layout."""
+        return {
+            k: v for k, v in self.params.items()
+            if k not in SEARCH_PARAMS and k != "train_size"
+        } | {"kind": self.kind}
+
+    @property
+    def is_flat(self):
+        return self.kind == "flat"
+
+    @property
+    def needs_training(self):
+        return self.kind in ("ivf-flat", "ivf-pq", "ivf-sq", "sq")
+
+    def factory_string(self, n_train=None):
+        p = self.params
+        sq = "SQfp16" if str(p["sq"]) == "fp16" else f"SQ{p['sq']}"
+        nlist = p["nlist"]
+        nbits = p["nbits"]
+        if n_train is not None:
+            # Small corpora cannot train the configured number of centroids
+            nlist = max(1, min(nlist, n_train // POINTS_PER_CENTROID))
+            nbits = max(1, min(nbits, int(np.log2(max(n_train, 2)))))
+        # "np" skips the polysemous training index_factory enables for PQ;
+        # searches never use it and it takes seconds even for tiny corpora
+        return {
+            "flat": "Flat",
+            "ivf-flat": f"IVF{nlist},Flat",
+            "ivf-pq": f"IVF{nlist},PQ{p['m']}x{nbits}np",
+            "ivf-sq": f"IVF{nlist},{sq}",
+            "hnsw": f"HNSW{p['m']},Flat",
+            "sq": sq,
+        }[self.kind]
+
+    def create(self, vectors):
+        """Create an index for ``vectors`` (float32 matrix), trained if needed."""
+
+        import faiss
+
+        dim = vectors.shape[1]
+        index = faiss.index_factory(dim, self.factory_string(len(vectors)))
+
+        hnsw = getattr(index, "hnsw", None)
+        if hnsw is not None:
+            hnsw.efConstruction = self.params["ef_construction"]
+
+        if not index.is_trained:
+            sample = vectors
+            if len(vectors) > self.params["train_size"]:
+                rows = np.random.default_rng(0).choice(
+                    len(vectors), self.params["train_size"], replace=False
+                )
+                sample = vectors[rows]
+            index.train(sample)
+
+        self.tune(index)
+        return index
+
+    def tune(self, index):
+        """Apply the search-time parameters to a loaded index."""
+
+        import faiss
+
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = min(self.params["nprobe"], ivf.nlist)
+
+        hnsw = getattr(index, "hnsw", None)
+        if hnsw is not None:
+            hnsw.efSearch = self.params["ef_search"]
+
+        return index
+
+    # -------------------- PERSISTENCE --------------------
+    def save(self, index_dir):
+        with open(os.path.join(index_dir, SPEC_NAME), "w", encoding="utf-8") as f:
+            json.dump({"spec": str(self), "structure": self.structure()}, f, indent=2)
+
+    @classmethod
+    def load(cls, index_dir):
+        path = os.path.join(index_dir, SPEC_NAME)
+        if not os.path.exists(path):
+            # Directories written before specs existed always hold a flat index
+            return cls("flat")
+        with open(path, "r", encoding="utf-8") as f:
+            return cls.parse(json.load(f)["spec"])
+
+
+def extract_vectors(index):
+    """Return all vectors of ``index`` as a float32 matrix, in position order."""
+
+    import faiss
+
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype=np.float32)
+
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is not None:
+        ivf.make_direct_map()
+
+    return index.reconstruct_n(0, index.ntotal)
+
+
+# -------------------- BUILDING --------------------
+class SpecIndexBuilder:
+    """``insert`` callable for ``IngestionPipeline`` that honours a spec.
+
+    Flat indexes take batches straight away. Trainable indexes buffer
+    batches until ``train_size`` vectors are available (or the build ends),
+    train on them and only then start adding. Buffered vectors are kept as
+    float32 matrices, not the lists of floats the embedder returns.
+    """
+
+    def __init__(self, spec, embeddings):
+        self.spec = spec
+        self.embeddings = embeddings
+        self._pending = []
+        self._pending_count = 0
+
+    def insert(self, vectors, text_embeddings, metadatas, ids):
+        if vectors is not None or not self.spec.needs_training:
+            if vectors is None:
+                vectors = self._empty(len(text_embeddings[0][1]))
+            vectors.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            return vectors
+
+        texts = [text for text, _ in text_embeddings]
+        matrix = np.asarray([vec for _, vec in text_embeddings], dtype=np.float32)
+        self._pending.append((texts, matrix, metadatas, ids))
+        self._pending_count += len(texts)
+
+        if self._pending_count >= self.spec.params["train_size"]:
+            return self._materialize()
+        return None
+
+    def finish(self, vectors):
+        if vectors is None and self._pending:
+            return self._materialize()
+        return vectors
+
+    def _empty(self, dim, training=None):
+        from langchain_community.vectorstores import FAISS
+        from langchain_community.docstore.in_memory import InMemoryDocstore
+
+        if training is None:
+            training = np.zeros((0, dim), dtype=np.float32)
+
+        return FAISS(self.embeddings, self.spec.create(training), InMemoryDocstore(), {})
+
+    def _materialize(self):
+        training = np.vstack([matrix for _, matrix, _, _ in self._pending])
+        vectors = self._empty(training.shape[1], training)
+        del training
+
+        for texts, matrix, metadatas, ids in self._pending:
+            vectors.add_embeddings(zip(texts, matrix), metadatas=metadatas, ids=ids)
+
+        self._pending = []
+        self._pending_count = 0
+        return vectors
+
+
+def rebuild(vectors, spec):
+    """Re-create the index of ``vectors`` with ``spec``, keeping positions."""
+
+    vectors.index = _recreate(spec, extract_vectors(vectors.index))
+    return vectors
+
+
+def _recreate(spec, matrix):
+    index = spec.create(matrix)
+    if len(matrix):
+        index.add(matrix)
+    return index
+
+
+def delete_ids(vectors, ids, spec):
+    """``vectors.delete`` for every index kind.
+
+    Flat code indexes compact on ``remove_ids`` the way the langchain store
+    expects. IVF indexes keep holes in their ids and HNSW cannot remove at
+    all, so those are refilled with the kept vectors, reusing the trained
+    quantizers. Quantized vectors are re-added from their reconstruction.
+    """
+
+    import faiss
+
+    if spec.kind in ("flat", "sq"):
+        vectors.delete(ids)
+        return
+
+    drop = set(ids)
+    mapping = dict(vectors.index_to_docstore_id.items())
+    keep = [p for p, id_ in sorted(mapping.items()) if id_ not in drop]
+
+    matrix = extract_vectors(vectors.index)
+    index = faiss.clone_index(vectors.index)
+    index.reset()
+    if keep:
+        index.add(matrix[keep])
+
+    vectors.index = spec.tune(index)
+    vectors.docstore.delete([id_ for id_ in mapping.values() if id_ in drop])
+    vectors.index_to_docstore_id = {i: mapping[p] for i, p in enumerate(keep)}
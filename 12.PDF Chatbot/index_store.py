@@ -0,0 +1,329 @@
+"""Pickle-free on-disk format for the FAISS knowledge base.
+
+An index directory contains:
+
+* ``index.faiss``      - the FAISS index, memory-mapped read-only when served
+* ``docstore.sqlite3`` - chunk text + JSON metadata and the FAISS position ->
+  chunk id table, read lazily by id
+* ``manifest.json``    - see ``manifest.py``
+
+Nothing is unpickled on startup and the resident size of a loaded index does
+not grow with the corpus: vectors are paged in by the OS and chunks are read
+only when a search returns them. ``python index_store.py convert SRC DST``
+converts a directory written by ``FAISS.save_local`` (``index.faiss`` +
+``index.pkl``) into a new directory; the source is never modified.
+"""
+
+import os
+import sys
+import json
+import shutil
+import sqlite3
+import pathlib
+import threading
+
+from langchain_core.documents import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+
+INDEX_NAME = "index.faiss"
+DOCSTORE_NAME = "docstore.sqlite3"
+LEGACY_DOCSTORE_NAME = "index.pkl"
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS chunks ("
+    " id TEXT PRIMARY KEY,"
+    " text TEXT NOT NULL,"
+    " metadata TEXT NOT NULL"
+    ") WITHOUT ROWID",
+    "CREATE TABLE IF NOT EXISTS positions ("
+    " position INTEGER PRIMARY KEY,"
+    " id TEXT NOT NULL"
+    ")",
+)
+
+
+def has_index(index_dir):
+    return os.path.exists(os.path.join(index_dir, INDEX_NAME))
+
+
+def is_legacy(index_dir):
+    return (
+        os.path.exists(os.path.join(index_dir, LEGACY_DOCSTORE_NAME))
+        and not os.path.exists(os.path.join(index_dir, DOCSTORE_NAME))
+    )
+
+
+# -------------------- SQLITE DOCSTORE --------------------
+class SqliteDocstore(Docstore, AddableMixin):
+    """Chunk store read lazily by id.
+
+    The connection is opened eagerly, so a store keeps reading the file it
+    was opened on even after a newer index has been swapped into its path.
+    """
+
+    def __init__(self, path, readonly=True):
+        self.path = path
+        self.readonly = readonly
+        self._lock = threading.Lock()
+
+        if readonly:
+            uri = pathlib.Path(path).absolute().as_uri() + "?mode=ro"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            for statement in SCHEMA:
+                self._conn.execute(statement)
+            self._conn.commit()
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def search(self, search):
+        rows = self.query("SELECT text, metadata FROM chunks WHERE id = ?", (search,))
+        if not rows:
+            return f"ID {search} not found."
+        text, metadata = rows[0]
+        return Document(id=search, page_content=text, metadata=json.loads(metadata))
+
+    def add(self, texts):
+        self._require_writable()
+        rows = [
+            (id_, doc.page_content, json.dumps(doc.metadata, default=str))
+            for id_, doc in texts.items()
+        ]
+        with self._lock:
+            existing = self._existing([r[0] for r in rows])
+            if existing:
+                raise ValueError(f"Tried to add ids that already exist: {existing}")
+            self._conn.executemany("INSERT INTO chunks VALUES (?, ?, ?)", rows)
+
+    def delete(self, ids):
+        self._require_writable()
+        with self._lock:
+            missing = set(ids) - self._existing(ids)
+            if missing:
+                raise ValueError(f"Tried to delete ids that does not exist: {missing}")
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE id = ?", [(id_,) for id_ in ids]
+            )
+
+    def iter_chunks(self, batch_size=1000):
+        """Yield ``(id, text)`` for every chunk, a batch of rows at a time."""
+        last = ""
+        while True:
+            rows = self.query(
+                "SELECT id, text FROM chunks WHERE id > ? ORDER BY id LIMIT ?",
+                (last, batch_size),
+            )
+            if not rows:
+                return
+            yield from rows
+            last = rows[-1][0]
+
+    def write_positions(self, index_to_docstore_id):
+        self._require_writable()
+        with self._lock:
+            self._conn.execute("DELETE FROM positions")
+            self._conn.executemany(
+                "INSERT INTO positions VALUES (?, ?)",
+                sorted(index_to_docstore_id.items()),
+            )
+
+    def close(self):
+        with self._lock:
+            if not self.readonly:
+                self._conn.commit()
+            self._conn.close()
+
+    def _existing(self, ids):
+        found = set()
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            marks = ",".join("?" * len(batch))
+            found.update(
+                r[0] for r in self._conn.execute(
+                    f"SELECT id FROM chunks WHERE id IN ({marks})", batch
+                )
+            )
+        return found
+
+    def _require_writable(self):
+        if self.readonly:
+            raise ValueError("Docstore is read-only")
+
+
+class PositionMap:
+    """Read-only ``{faiss position: chunk id}`` mapping backed by SQLite."""
+
+    def __init__(self, docstore):
+        self.docstore = docstore
+
+    def __getitem__(self, position):
+        rows = self.docstore.query(
+            "SELECT id FROM positions WHERE position = ?", (int(position),)
+        )
+        if not rows:
+            raise KeyError(position)
+        return rows[0][0]
+
+    def get(self, position, default=None):
+        try:
+            return self[position]
+        except KeyError:
+            return default
+
+    def __len__(self):
+        return self.docstore.query("SELECT COUNT(*) FROM positions")[0][0]
+
+    def __contains__(self, position):
+        return self.get(position) is not None
+
+    def items(self):
+        return self.docstore.query("SELECT position, id FROM positions ORDER BY position")
+
+    def values(self):
+        return [id_ for _, id_ in self.items()]
+
+    def __iter__(self):
+        return iter([position for position, _ in self.items()])
+
+
+# -------------------- LOAD / SAVE --------------------
+def read_faiss_index(path, mmap=True):
+
+    import faiss
+
+    if mmap:
+        flag = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP)
+        try:
+            return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Index types without mmap support are read into memory
+            pass
+
+    return faiss.read_index(path)
+
+
+def load_index(index_dir, embeddings):
+    """Open an index for serving: mmap'd vectors, lazy docstore."""
+
+    from langchain_community.vectorstores import FAISS
+
+    if not has_index(index_dir):
+        return None
+
+    docstore = SqliteDocstore(os.path.join(index_dir, DOCSTORE_NAME))
+
+    return FAISS(
+        embeddings,
+        read_faiss_index(os.path.join(index_dir, INDEX_NAME)),
+        docstore,
+        PositionMap(docstore),
+    )
+
+
+def load_for_update(index_dir, work_dir, embeddings):
+    """Open a private, writable copy of ``index_dir`` inside ``work_dir``."""
+
+    from langchain_community.vectorstores import FAISS
+
+    if not has_index(index_dir):
+        return None
+
+    os.makedirs(work_dir, exist_ok=True)
+    work_docstore = os.path.join(work_dir, DOCSTORE_NAME)
+    shutil.copyfile(os.path.join(index_dir, DOCSTORE_NAME), work_docstore)
+
+    docstore = SqliteDocstore(work_docstore, readonly=False)
+
+    return FAISS(
+        embeddings,
+        read_faiss_index(os.path.join(index_dir, INDEX_NAME), mmap=False),
+        docstore,
+        dict(PositionMap(docstore).items()),
+    )
+
+
+def save_index(vectors, index_dir):
+    """Write ``vectors`` (any langchain FAISS store) to ``index_dir``."""
+
+    import faiss
+
+    os.makedirs(index_dir, exist_ok=True)
+    path = os.path.join(index_dir, DOCSTORE_NAME)
+
+    docstore = vectors.docstore
+    reuse = (
+        isinstance(docstore, SqliteDocstore)
+        and not docstore.readonly
+        and os.path.abspath(docstore.path) == os.path.abspath(path)
+    )
+
+    if not reuse:
+        if os.path.exists(path):
+            os.remove(path)
+        target = SqliteDocstore(path, readonly=False)
+        ids = list(vectors.index_to_docstore_id.values())
+        for start in range(0, len(ids), 1000):
+            batch = ids[start:start + 1000]
+            target.add({id_: docstore.search(id_) for id_ in batch})
+        docstore = target
+
+    docstore.write_positions(dict(vectors.index_to_docstore_id.items()))
+    docstore.close()
+
+    faiss.write_index(vectors.index, os.path.join(index_dir, INDEX_NAME))
+
+
+# -------------------- LEGACY CONVERSION --------------------
+def convert_legacy(src_dir, dst_dir):
+    """Convert a ``FAISS.save_local`` directory to this format.
+
+    This is the only place that still unpickles ``index.pkl``; only run it on
+    directories you produced yourself.
+    """
+
+    import pickle
+    import faiss
+
+    with open(os.path.join(src_dir, LEGACY_DOCSTORE_NAME), "rb") as f:
+        docstore, index_to_docstore_id = pickle.load(f)
+
+    os.makedirs(dst_dir, exist_ok=True)
+    path = os.path.join(dst_dir, DOCSTORE_NAME)
+    if os.path.exists(path):
+        os.remove(path)
+
+    target = SqliteDocstore(path, readonly=False)
+    target.add({id_: docstore.search(id_) for id_ in index_to_docstore_id.values()})
+    target.write_positions(index_to_docstore_id)
+    target.close()
+
+    index = faiss.read_index(os.path.join(src_dir, INDEX_NAME))
+    faiss.write_index(index, os.path.join(dst_dir, INDEX_NAME))
+
+    for name in os.listdir(src_dir):
+        path = os.path.join(src_dir, name)
+        # Skips lock files and the staging dir when converting into a version
+        if name.startswith(".") or not os.path.isfile(path):
+            continue
+        if name not in (INDEX_NAME, LEGACY_DOCSTORE_NAME, DOCSTORE_NAME):
+            shutil.copy2(path, os.path.join(dst_dir, name))
+
+    return index.ntotal
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) != 4 or sys.argv[1] != "convert":
+        print("usage: python index_store.py convert SRC_DIR DST_DIR")
+        sys.exit(2)
+
+    src, dst = sys.argv[2], sys.argv[3]
+    if os.path.abspath(src) == os.path.abspath(dst):
+        print("DST_DIR must differ from SRC_DIR; the source is left as it is")
+        sys.exit(2)
+
+    n = convert_legacy(src, dst)
+    print(f"Converted {n} vectors: {src} -> {dst}")
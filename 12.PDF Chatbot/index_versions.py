@@ -0,0 +1,173 @@
+"""Versioned index directories shared by several server processes.
+
+An index root holds one directory per published version and a ``CURRENT``
+file naming the live one::
+
+    faiss_openai_1536/
+        CURRENT          "v000012"
+        v000011/         index.faiss, docstore.sqlite3, manifest.json, ...
+        v000012/
+        .staging/        the build in progress
+        .lock            held by the process that is building
+
+A build writes ``.staging``, renames it to the next ``vNNNNNN`` and then
+replaces ``CURRENT`` with ``os.replace``, so a reader sees either the old or
+the new version, never a half-written one. Every worker checks ``CURRENT``
+and reopens the index when it changed; version directories are immutable,
+so all workers mmap the same files and share them through the page cache.
+
+A root without ``CURRENT`` is the flat layout written before versioning (or
+committed to the repo) and counts as version 0. Its files are left in place
+when the first version is published.
+"""
+
+import os
+import re
+import shutil
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+CURRENT_NAME = "CURRENT"
+LOCK_NAME = ".lock"
+STAGING_NAME = ".staging"
+VERSION_RE = re.compile(r"^v(\d{6,})$")
+
+# Versions kept on disk besides the live one, for workers that have not
+# switched yet (only matters where open files cannot be deleted)
+KEEP_PREVIOUS = 1
+
+
+def version_name(version):
+    return "v%06d" % version
+
+
+def current_version(root):
+    """``(version, directory)`` of the live index under ``root``."""
+
+    try:
+        with open(os.path.join(root, CURRENT_NAME), "r", encoding="utf-8") as f:
+            name = f.read().strip()
+    except FileNotFoundError:
+        return 0, root
+
+    match = VERSION_RE.match(name)
+    if match is None:
+        raise ValueError(f"Corrupt {CURRENT_NAME} file in {root}: {name!r}")
+    return int(match.group(1)), os.path.join(root, name)
+
+
+def current_dir(root):
+    return current_version(root)[1]
+
+
+def staging_dir(root):
+    return os.path.join(root, STAGING_NAME)
+
+
+def publish(root, staging):
+    """Make ``staging`` the next version of ``root``; returns the new version.
+
+    Callers hold ``build_lock(root)``.
+    """
+
+    version = current_version(root)[0] + 1
+    name = version_name(version)
+    os.replace(staging, os.path.join(root, name))
+
+    tmp = os.path.join(root, CURRENT_NAME + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(name + "\n")
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, os.path.join(root, CURRENT_NAME))
+
+    prune(root, version)
+
+    return version
+
+
+def prune(root, version):
+    """Delete versions older than the ones kept and leftover staging dirs.
+
+    Nothing else under ``root`` is touched: the flat layout a root started
+    from (possibly committed to git) stays where it is, unused.
+    """
+
+    keep = {version_name(v) for v in range(version - KEEP_PREVIOUS, version + 1)}
+
+    for entry in os.scandir(root):
+        if entry.name in keep or not entry.is_dir():
+            continue
+        # Callers hold the build lock, so no staging dir is in use
+        if VERSION_RE.match(entry.name) or entry.name.startswith(STAGING_NAME):
+            # Open files can't be deleted on Windows; retried next publish
+            shutil.rmtree(entry.path, ignore_errors=True)
+
+
+# -------------------- CROSS-PROCESS BUILD LOCK --------------------
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+_held = threading.local()
+
+
+@contextmanager
+def build_lock(root):
+    """Exclusive lock on ``root`` across threads and worker processes.
+
+    Re-entrant within a thread, so a build may open (and convert) the index
+    it is building on.
+    """
+
+    os.makedirs(root, exist_ok=True)
+    path = os.path.abspath(os.path.join(root, LOCK_NAME))
+
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = set()
+    if path in held:
+        yield
+        return
+
+    # File locks are per process on some platforms; serialise threads first
+    with _thread_locks_guard:
+        thread_lock = _thread_locks.setdefault(path, threading.Lock())
+
+    with thread_lock:
+        held.add(path)
+        try:
+            with open(path, "a+b") as f:
+                _lock_file(f)
+                try:
+                    yield
+                finally:
+                    _unlock_file(f)
+        finally:
+            held.discard(path)
+
+
+def _lock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        return
+    f.seek(0)
+    # LK_LOCK gives up after ~10 seconds; keep waiting
+    while True:
+        try:
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(f):
+    if fcntl is not None:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+    else:
+        f.seek(0)
+        msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,378 @@
+"""Pipelined PDF ingestion: parse -> split -> embed -> insert.
+
+The four stages run concurrently and are connected by bounded queues, so CPU
+bound page extraction (in a process pool) overlaps with network bound
+embedding calls and memory stays flat no matter how many PDFs are queued:
+
+    parse thread --pages_q--> split thread --batch_q--> N embed threads
+        --insert_q--> insert stage (caller's thread, owns the index)
+
+Only the insert stage touches the vector store, so the store does not need
+to be thread-safe.
+
+``PagePrefetcher`` extracts the pages of a file as soon as it is uploaded;
+the parse stage then picks up the finished (or still running) extraction
+instead of starting its own.
+"""
+
+import os
+import json
+import time
+import queue
+import random
+import threading
+import multiprocessing
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+
+from langchain_core.documents import Document
+
+_STOP = object()
+
+_POOL = None
+_POOL_WORKERS = 0
+_POOL_LOCK = threading.Lock()
+
+
+# -------------------- STAGE 1: PAGE EXTRACTION --------------------
+def extract_pages(path):
+    """Runs in a worker process; returns picklable ``(text, metadata)`` pairs."""
+
+    from langchain_community.document_loaders import PyPDFLoader
+
+    return [
+        (d.page_content, d.metadata)
+        for d in PyPDFLoader(path).lazy_load()
+        if d.page_content.strip()
+    ]
+
+
+def default_parse_workers():
+    return min(4, os.cpu_count() or 1)
+
+
+def get_pool(workers):
+    global _POOL, _POOL_WORKERS
+
+    with _POOL_LOCK:
+        if _POOL is None or _POOL_WORKERS != workers:
+            if _POOL is not None:
+                _POOL.shutdown(wait=False)
+            # spawn: forking a process that already runs threads is unsafe
+            _POOL = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            _POOL_WORKERS = workers
+        return _POOL
+
+
+def shutdown_pool():
+    global _POOL
+
+    with _POOL_LOCK:
+        if _POOL is not None:
+            _POOL.shutdown(wait=False, cancel_futures=True)
+            _POOL = None
+
+
+# -------------------- PREFETCH AFTER UPLOAD --------------------
+class PagePrefetcher:
+    """Page extraction that starts when a file lands, not when /build runs.
+
+    Results are kept as JSON in ``cache_dir`` (one file per content hash), so
+    they also survive a restart. Entries are discarded once the document is
+    indexed.
+    """
+
+    def __init__(self, workers):
+        self.workers = workers
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="prefetch"
+        )
+
+    @staticmethod
+    def _path(cache_dir, doc_hash):
+        return os.path.join(cache_dir, doc_hash + ".json")
+
+    def submit(self, cache_dir, doc_hash, path):
+        key = self._path(cache_dir, doc_hash)
+        with self._lock:
+            if key in self._inflight or os.path.exists(key):
+                return
+            self._inflight[key] = self._executor.submit(self._extract, key, path)
+
+    def _extract(self, key, path):
+        try:
+            if self.workers:
+                pages = get_pool(self.workers).submit(extract_pages, path).result()
+            else:
+                pages = extract_pages(path)
+
+            os.makedirs(os.path.dirname(key), exist_ok=True)
+            tmp = key + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(pages, f, default=str)
+            os.replace(tmp, key)
+            return pages
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def future(self, cache_dir, doc_hash):
+        """A future with the pages of ``doc_hash``, or ``None`` if never prefetched."""
+
+        key = self._path(cache_dir, doc_hash)
+        with self._lock:
+            future = self._inflight.get(key)
+        if future is not None:
+            return future
+
+        try:
+            with open(key, "r", encoding="utf-8") as f:
+                pages = [tuple(page) for page in json.load(f)]
+        except (OSError, ValueError):
+            return None
+
+        future = Future()
+        future.set_result(pages)
+        return future
+
+    def discard(self, cache_dir, doc_hash):
+        try:
+            os.remove(self._path(cache_dir, doc_hash))
+        except FileNotFoundError:
+            pass
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class _Aborted(Exception):
+    pass
+
+
+class _DocumentState:
+
+    def __init__(self, doc_hash, path, pages, ids, batches):
+        self.doc_hash = doc_hash
+        self.path = path
+        self.pages = pages
+        self.ids = ids
+        self.remaining = batches
+
+
+class IngestionPipeline:
+
+    def __init__(
+        self,
+        embeddings,
+        splitter,
+        insert,
+        parse_workers=0,
+        embed_batch_size=64,
+        max_in_flight=4,
+        queue_size=8,
+        max_retries=5,
+        backoff_seconds=1.0,
+        prefetched=None,
+        observe_embed=None,
+    ):
+        """
+        ``insert(vectors, text_embeddings, metadatas, ids)`` adds one embedded
+        batch to the store and returns the (possibly newly created) store.
+        ``parse_workers=0`` extracts pages in a thread instead of a process pool.
+        ``prefetched(doc_hash)`` may return a future with already extracted pages.
+        ``observe_embed(seconds, texts)`` is told about every successful
+        embedding call.
+        """
+        self.embeddings = embeddings
+        self.splitter = splitter
+        self.insert = insert
+        self.parse_workers = parse_workers
+        self.embed_batch_size = embed_batch_size
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.prefetched = prefetched
+        self.observe_embed = observe_embed
+
+    # -------------------- QUEUE HELPERS --------------------
+    def _put(self, q, item):
+        while not self._abort.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return
+            except queue.Full:
+                continue
+        raise _Aborted()
+
+    def _get(self, q):
+        while not self._abort.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        raise _Aborted()
+
+    def _stage(self, fn, *args):
+        def run():
+            try:
+                fn(*args)
+            except _Aborted:
+                pass
+            except BaseException as exc:
+                self._errors.append(exc)
+                self._abort.set()
+
+        thread = threading.Thread(target=run, daemon=True, name=f"ingest-{fn.__name__}")
+        thread.start()
+        return thread
+
+    # -------------------- STAGES --------------------
+    def _prefetched(self, doc_hash):
+        return self.prefetched(doc_hash) if self.prefetched is not None else None
+
+    def _parse(self, documents):
+        if not self.parse_workers:
+            for doc_hash, path in documents:
+                future = self._prefetched(doc_hash)
+                pages = future.result() if future is not None else extract_pages(path)
+                self._put(self._pages_q, (doc_hash, path, pages))
+        else:
+            pool = get_pool(self.parse_workers)
+            pending = deque()
+            for doc_hash, path in documents:
+                future = self._prefetched(doc_hash)
+                if future is None:
+                    future = pool.submit(extract_pages, path)
+                pending.append((doc_hash, path, future))
+                if len(pending) >= self.parse_workers * 2:
+                    doc_hash_, path_, future = pending.popleft()
+                    self._put(self._pages_q, (doc_hash_, path_, future.result()))
+            while pending:
+                doc_hash_, path_, future = pending.popleft()
+                self._put(self._pages_q, (doc_hash_, path_, future.result()))
+
+        self._put(self._pages_q, _STOP)
+
+    def _split(self, job, chunk_ids_for):
+        while True:
+            item = self._get(self._pages_q)
+            if item is _STOP:
+                break
+
+            doc_hash, path, raw_pages = item
+            pages = [Document(page_content=t, metadata=m) for t, m in raw_pages]
+            chunks = self.splitter.split_documents(pages)
+            ids = chunk_ids_for(doc_hash, len(chunks))
+
+            for chunk in chunks:
+                chunk.metadata["doc_hash"] = doc_hash
+                # "source" is the full upload path; filters use the file name
+                chunk.metadata["filename"] = os.path.basename(path)
+
+            size = self.embed_batch_size
+            batches = [
+                (chunks[i:i + size], ids[i:i + size])
+                for i in range(0, len(chunks), size)
+            ]
+            state = _DocumentState(doc_hash, path, len(pages), ids, len(batches))
+
+            if job is not None:
+                job.advance("pages_parsed", len(pages))
+                job.advance("chunks_total", len(chunks))
+
+            if not batches:
+                self._put(self._insert_q, (state, None, None, None))
+            for batch, batch_ids in batches:
+                self._put(self._batch_q, (state, batch, batch_ids))
+
+        for _ in range(self.max_in_flight):
+            self._put(self._batch_q, _STOP)
+
+    def _embed_with_retry(self, texts):
+        for attempt in range(self.max_retries + 1):
+            try:
+                start = time.perf_counter()
+                vectors = self.embeddings.embed_documents(texts)
+                if self.observe_embed is not None:
+                    self.observe_embed(time.perf_counter() - start, len(texts))
+                return vectors
+            except Exception:
+                if attempt == self.max_retries or self._abort.is_set():
+                    raise
+                delay = self.backoff_seconds * (2 ** attempt)
+                time.sleep(delay + random.uniform(0, delay / 2))
+
+    def _embed(self):
+        while True:
+            item = self._get(self._batch_q)
+            if item is _STOP:
+                break
+
+            state, batch, batch_ids = item
+            texts = [c.page_content for c in batch]
+            vectors = self._embed_with_retry(texts)
+            pairs = list(zip(texts, vectors))
+            metadatas = [c.metadata for c in batch]
+            self._put(self._insert_q, (state, pairs, metadatas, batch_ids))
+
+        self._put(self._insert_q, _STOP)
+
+    # -------------------- RUN --------------------
+    def run(self, documents, vectors, chunk_ids_for, on_document, job=None):
+        """Ingest ``[(doc_hash, path), ...]`` into ``vectors``.
+
+        ``on_document(doc_hash, path, pages, ids)`` is called once every chunk
+        of a document is in the store. Returns the store.
+        """
+        self._abort = threading.Event()
+        self._errors = []
+        self._pages_q = queue.Queue(maxsize=self.queue_size)
+        self._batch_q = queue.Queue(maxsize=self.queue_size)
+        self._insert_q = queue.Queue(maxsize=self.queue_size)
+
+        threads = [
+            self._stage(self._parse, list(documents)),
+            self._stage(self._split, job, chunk_ids_for),
+        ]
+        threads += [self._stage(self._embed) for _ in range(self.max_in_flight)]
+
+        stopped = 0
+        try:
+            while stopped < self.max_in_flight:
+                item = self._get(self._insert_q)
+                if item is _STOP:
+                    stopped += 1
+                    continue
+
+                state, pairs, metadatas, batch_ids = item
+
+                if pairs is not None:
+                    vectors = self.insert(vectors, pairs, metadatas, batch_ids)
+                    state.remaining -= 1
+                    if job is not None:
+                        job.advance("chunks_embedded", len(pairs))
+
+                if state.remaining == 0:
+                    on_document(state.doc_hash, state.path, state.pages, state.ids)
+                    if job is not None:
+                        job.advance("documents_done")
+        except _Aborted:
+            pass
+        except BaseException:
+            self._abort.set()
+            raise
+        finally:
+            for thread in threads:
+                thread.join(timeout=5)
+
+        if self._errors:
+            raise self._errors[0]
+
+        return vectors
+
@@ -0,0 +1,262 @@
+"""Background build jobs with progress reporting.
+
+``/build`` submits a job to a single-worker executor and returns its id right
+away; the build function reports progress on the ``BuildJob`` it is handed and
+clients poll ``snapshot()`` (or stream it over SSE) to render throughput/ETA.
+
+With ``status_dir`` set, snapshots are also written there as JSON so that
+other server processes can answer status requests for a job they don't run.
+"""
+
+import os
+import re
+import json
+import time
+import uuid
+import threading
+import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+FINISHED = (SUCCEEDED, FAILED)
+
+# Stages during which chunks are being embedded; throughput/ETA are measured
+# from the start of the stage
+EMBED_STAGES = ("embedding", "ingesting")
+
+JOB_ID_RE = re.compile(r"^[0-9a-f]{12}$")
+
+# Progress written to the status file at most this often (stage changes and
+# the end of a job are always written)
+STATUS_WRITE_SECONDS = 0.5
+
+
+class BuildJob:
+
+    def __init__(self, kind="build", on_stage_end=None, status_path=None):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        # on_stage_end(stage, seconds) is called whenever a stage is left
+        self.on_stage_end = on_stage_end
+        self.status_path = status_path
+        self._written_at = 0.0
+        self.status = QUEUED
+        self.stage = "queued"
+        self.error = None
+        self.result = None
+
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.stage_started_at = None
+
+        self.counters = {
+            "documents_total": 0,
+            "documents_done": 0,
+            "documents_removed": 0,
+            "pages_parsed": 0,
+            "chunks_total": 0,
+            "chunks_embedded": 0,
+        }
+
+        # Bumped on every change so streams only emit when something moved
+        self.revision = 0
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+
+    def set_stage(self, stage):
+        with self._lock:
+            ended = self._end_stage()
+            self.stage = stage
+            self.stage_started_at = time.time()
+            self.revision += 1
+        self._report(ended)
+        self._write_status(force=True)
+
+    def _end_stage(self):
+        if self.stage_started_at is None:
+            return None
+        return self.stage, time.time() - self.stage_started_at
+
+    def _report(self, ended):
+        if ended is not None and self.on_stage_end is not None:
+            self.on_stage_end(*ended)
+
+    def advance(self, counter, n=1):
+        with self._lock:
+            self.counters[counter] += n
+            self.revision += 1
+        self._write_status()
+
+    def set(self, counter, value):
+        with self._lock:
+            self.counters[counter] = value
+            self.revision += 1
+        self._write_status()
+
+    def _finish(self, status, result=None, error=None):
+        with self._lock:
+            ended = self._end_stage()
+            self.status = status
+            self.stage = status
+            self.result = result
+            self.error = error
+            self.finished_at = time.time()
+            self.revision += 1
+        self._report(ended)
+        self._write_status(force=True)
+
+    def _write_status(self, force=False):
+        if self.status_path is None:
+            return
+
+        with self._write_lock:
+            now = time.monotonic()
+            if not force and now - self._written_at < STATUS_WRITE_SECONDS:
+                return
+            self._written_at = now
+
+            tmp = self.status_path + ".tmp"
+            try:
+                with open(tmp, "w", encoding="utf-8") as f:
+                    json.dump(self.snapshot(), f)
+                os.replace(tmp, self.status_path)
+            except OSError:
+                # Only other workers read this; never fail the build over it
+                pass
+
+    def snapshot(self):
+        with self._lock:
+            counters = dict(self.counters)
+            now = self.finished_at or time.time()
+            elapsed = now - self.started_at if self.started_at else 0.0
+
+            embed_elapsed = 0.0
+            if self.stage in EMBED_STAGES and self.stage_started_at:
+                embed_elapsed = now - self.stage_started_at
+
+            throughput = None
+            eta = None
+            if embed_elapsed > 0 and counters["chunks_embedded"]:
+                throughput = counters["chunks_embedded"] / embed_elapsed
+                remaining = counters["chunks_total"] - counters["chunks_embedded"]
+                eta = max(remaining, 0) / throughput
+
+            return {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "stage": self.stage,
+                **counters,
+                "elapsed_seconds": round(elapsed, 2),
+                "chunks_per_second": round(throughput, 2) if throughput else None,
+                "eta_seconds": round(eta, 1) if eta is not None else None,
+                "result": self.result,
+                "error": self.error,
+                "revision": self.revision,
+            }
+
+    @property
+    def done(self):
+        return self.status in FINISHED
+
+
+class JobStatusFile:
+    """Read-only view of a job that runs in another server process."""
+
+    def __init__(self, path):
+        self.path = path
+        self._last = None
+
+    def snapshot(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._last = json.load(f)
+        except (OSError, ValueError):
+            if self._last is None:
+                raise
+        return self._last
+
+    @property
+    def done(self):
+        return self.snapshot()["status"] in FINISHED
+
+
+class JobManager:
+
+    def __init__(self, max_workers=1, keep=50, on_stage_end=None, status_dir=None):
+        self.keep = keep
+        self.on_stage_end = on_stage_end
+        self.status_dir = status_dir
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="build"
+        )
+
+    def submit(self, fn, kind="build"):
+        job = BuildJob(kind, self.on_stage_end)
+
+        if self.status_dir is not None:
+            os.makedirs(self.status_dir, exist_ok=True)
+            job.status_path = os.path.join(self.status_dir, job.id + ".json")
+
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.keep:
+                oldest = next(iter(self._jobs))
+                if not self._jobs[oldest].done:
+                    break
+                self._jobs.pop(oldest)
+                self._remove_status(oldest)
+
+        job._write_status(force=True)
+
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    @staticmethod
+    def _run(job, fn):
+        job.started_at = time.time()
+        job.status = RUNNING
+        job.set_stage("starting")
+        try:
+            result = fn(job)
+        except Exception as exc:
+            traceback.print_exc()
+            job._finish(FAILED, error=str(exc) or type(exc).__name__)
+        else:
+            job._finish(SUCCEEDED, result=result)
+
+    def get(self, job_id):
+        """The job ``job_id``, or a ``JobStatusFile`` if another process runs it."""
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+
+        if job is None and self.status_dir is not None and JOB_ID_RE.match(job_id):
+            path = os.path.join(self.status_dir, job_id + ".json")
+            if os.path.exists(path):
+                return JobStatusFile(path)
+
+        return job
+
+    def _remove_status(self, job_id):
+        if self.status_dir is None:
+            return
+        try:
+            os.remove(os.path.join(self.status_dir, job_id + ".json"))
+        except OSError:
+            pass
+
+    def active(self):
+        with self._lock:
+            return [job for job in self._jobs.values() if not job.done]
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,87 @@
+"""Content-addressed manifest of the PDFs that make up the knowledge base.
+
+Each indexed document is keyed by the SHA-256 of its bytes and remembers the
+ids of the chunks it contributed to the vector store, so a build only has to
+embed new files and delete the vectors of files that went away.
+"""
+
+import os
+import json
+import hashlib
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def chunk_ids_for(doc_hash, count):
+    return [f"{doc_hash}-{i}" for i in range(count)]
+
+
+class Manifest:
+
+    def __init__(self, index_dir):
+        self.path = os.path.join(index_dir, MANIFEST_NAME)
+        self.documents = {}
+
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self.documents = data.get("documents", {})
+
+    @staticmethod
+    def exists(index_dir):
+        return os.path.exists(os.path.join(index_dir, MANIFEST_NAME))
+
+    def __contains__(self, doc_hash):
+        return doc_hash in self.documents
+
+    def __len__(self):
+        return len(self.documents)
+
+    def add(self, doc_hash, filename, chunk_ids, pages):
+        self.documents[doc_hash] = {
+            "filename": filename,
+            "chunk_ids": list(chunk_ids),
+            "pages": pages,
+        }
+
+    def remove(self, doc_hash):
+        entry = self.documents.pop(doc_hash, None)
+        return entry["chunk_ids"] if entry else []
+
+    def diff(self, wanted_hashes):
+        """Return ``(to_add, to_remove)`` hash sets for a desired corpus."""
+        wanted = set(wanted_hashes)
+        current = set(self.documents)
+        return wanted - current, current - wanted
+
+    def summary(self):
+        return [
+            {
+                "hash": doc_hash,
+                "filename": entry["filename"],
+                "pages": entry["pages"],
+                "chunks": len(entry["chunk_ids"]),
+            }
+            for doc_hash, entry in self.documents.items()
+        ]
+
+    def save(self, index_dir=None):
+        path = os.path.join(index_dir, MANIFEST_NAME) if index_dir else self.path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(
+                {"version": MANIFEST_VERSION, "documents": self.documents},
+                f,
+                indent=2,
+            )
+        os.replace(tmp_path, path)
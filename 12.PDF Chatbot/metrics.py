@@ -0,0 +1,113 @@
+"""Prometheus metrics and per-request stage timings.
+
+``stage(name, histogram)`` times a block, observes it on the histogram and,
+when the current request asked for it (``start_timings()``), also records the
+duration in that request's timings dict. The dict lives in a context
+variable, so it follows the request through ``await``s and ``to_thread``.
+"""
+
+import time
+import contextvars
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60,
+)
+TOKEN_BUCKETS = (64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+BUILD_BUCKETS = (0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+EMBEDDING_SECONDS = Histogram(
+    "rag_embedding_seconds",
+    "Latency of embedding API calls",
+    ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+SEARCH_SECONDS = Histogram(
+    "rag_search_seconds",
+    "Latency of one retrieval search",
+    ["kind"],
+    buckets=LATENCY_BUCKETS,
+)
+PROMPT_TOKENS = Histogram(
+    "rag_prompt_tokens",
+    "Tokens in the prompt sent to the LLM",
+    buckets=TOKEN_BUCKETS,
+)
+LLM_TTFT_SECONDS = Histogram(
+    "rag_llm_time_to_first_token_seconds",
+    "Time from sending the prompt to the first streamed token",
+    buckets=LATENCY_BUCKETS,
+)
+LLM_SECONDS = Histogram(
+    "rag_llm_seconds",
+    "Total LLM generation time",
+    buckets=LATENCY_BUCKETS,
+)
+REQUEST_SECONDS = Histogram(
+    "rag_request_seconds",
+    "HTTP request latency",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "rag_requests_in_flight",
+    "HTTP requests currently being processed",
+    ["method", "route"],
+)
+
+BUILD_STAGE_SECONDS = Histogram(
+    "rag_build_stage_seconds",
+    "Duration of each build job stage",
+    ["stage"],
+    buckets=BUILD_BUCKETS,
+)
+PAGES_PROCESSED = Counter("rag_pages_processed_total", "PDF pages extracted by builds")
+CHUNKS_PROCESSED = Counter("rag_chunks_processed_total", "Chunks embedded by builds")
+
+CONTEXT_CHUNKS = Counter(
+    "rag_context_chunks_total",
+    "Retrieved chunks by what context packing did with them",
+    ["outcome"],
+)
+
+READY = Gauge("rag_ready", "1 once the background warm-up has finished")
+WARMUP_STEP_SECONDS = Gauge(
+    "rag_warmup_step_seconds", "Duration of each startup warm-up step", ["step"]
+)
+
+INDEX_VECTORS = Gauge("rag_index_vectors", "Vectors in the published index", ["collection"])
+INDEX_BYTES = Gauge("rag_index_bytes", "Size of the published index files", ["collection"])
+
+_TIMINGS = contextvars.ContextVar("rag_timings", default=None)
+
+
+def start_timings(timings=None):
+    """Collect stage timings for the current request; returns the dict.
+
+    Pass an existing dict to keep collecting into it from another context,
+    e.g. the generator behind a streaming response.
+    """
+    if timings is None:
+        timings = {}
+    _TIMINGS.set(timings)
+    return timings
+
+
+def record(name, seconds):
+    timings = _TIMINGS.get()
+    if timings is not None:
+        timings[name] = round(timings.get(name, 0.0) + seconds * 1000, 2)
+
+
+@contextmanager
+def stage(name, histogram=None, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        if histogram is not None:
+            (histogram.labels(**labels) if labels else histogram).observe(elapsed)
+        record(name, elapsed)
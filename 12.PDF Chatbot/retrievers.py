@@ -0,0 +1,93 @@
+"""Retrievers the RAG chain uses; imported when the first chain is built.
+
+They are langchain ``BaseRetriever`` models, and importing
+``langchain_core.retrievers`` (runnables, langsmith) takes about half a
+second, so the app module doesn't import them at startup.
+
+``HybridRetriever`` runs BM25 (``sparse.py``) and vector search concurrently
+and merges both rankings with reciprocal rank fusion. ``dense_search(question,
+k, filter)`` replaces the store's own async search when set (the API passes
+its batched search). With a metadata ``filter`` the BM25 side searches deeper
+and drops chunks that don't match. ``BatchedRetriever`` is the dense-only
+variant whose async searches go through the batchers in ``batcher.py``.
+"""
+
+import asyncio
+
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from metrics import SEARCH_SECONDS, stage
+from sparse import reciprocal_rank_fusion
+from vector_backends import FILTER_FETCH_MULTIPLIER, matches
+
+
+class HybridRetriever(BaseRetriever):
+
+    vectors: object
+    sparse: object
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+    dense_search: object = None
+
+    def _fuse(self, dense_docs, sparse_hits, filter=None):
+        docs = {doc.id: doc for doc in dense_docs}
+        ranked = reciprocal_rank_fusion(
+            [[doc.id for doc in dense_docs], [id_ for id_, _ in sparse_hits]],
+            k=self.rrf_k,
+        )
+
+        results = []
+        for id_ in ranked:
+            doc = docs.get(id_)
+            if doc is None:
+                doc = self.vectors.docstore.search(id_)
+            # Ids that are missing from this store (e.g. mid-swap) are skipped
+            if not isinstance(doc, Document):
+                continue
+            if filter is not None and not matches(doc.metadata, filter):
+                continue
+            results.append(doc)
+            if len(results) == self.k:
+                break
+        return results
+
+    def _sparse_search(self, query, filter=None):
+        k = self.fetch_k * (FILTER_FETCH_MULTIPLIER if filter is not None else 1)
+        with stage("sparse_search", SEARCH_SECONDS, kind="sparse"):
+            return self.sparse.search(query, k)
+
+    def _get_relevant_documents(self, query, *, run_manager=None, filter=None):
+        dense_docs = self.vectors.similarity_search(query, k=self.fetch_k, filter=filter)
+        return self._fuse(dense_docs, self._sparse_search(query, filter), filter)
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None, filter=None):
+        if self.dense_search is not None:
+            dense = self.dense_search(query, self.fetch_k, filter)
+        else:
+            dense = self.vectors.asimilarity_search(query, k=self.fetch_k, filter=filter)
+
+        dense_docs, sparse_hits = await asyncio.gather(
+            dense,
+            asyncio.to_thread(self._sparse_search, query, filter),
+        )
+        return self._fuse(dense_docs, sparse_hits, filter)
+
+
+class BatchedRetriever(BaseRetriever):
+    """Dense retriever whose ``search(question, k, filter)`` goes through the batchers.
+
+    Sync calls (``invoke``) can't wait on the batchers, which live on the
+    event loop; they use ``search_sync``, one embedding and one search.
+    """
+
+    search: object
+    search_sync: object
+    k: int = 4
+
+    def _get_relevant_documents(self, query, *, run_manager=None, filter=None):
+        return self.search_sync(query, self.k, filter)
+
+    async def _aget_relevant_documents(self, query, *, run_manager=None, filter=None):
+        return await self.search(query, self.k, filter)
@@ -0,0 +1,208 @@
+"""In-process BM25 index and hybrid (sparse + dense) retrieval.
+
+The sparse index is rebuilt from the docstore whenever a build publishes a
+new index and is saved next to it in a ``sparse/`` directory of ``.npy``
+files, which are memory-mapped on load: opening an index reads no postings
+and builds no Python objects, whatever the size of the corpus.
+
+* ``terms``: the vocabulary as sorted fixed-width byte strings; a term's id
+  is its position, found with ``searchsorted``
+* ``offsets`` / ``docs`` (uint32) / ``tfs`` (uint16): postings, CSR-style,
+  so a query only touches the postings of its own terms
+* ``norm``: each chunk's BM25 length normalisation, computed at build time
+* ``chunk_bytes`` / ``chunk_offsets``: chunk ids as concatenated UTF-8
+
+``HybridRetriever`` (``retrievers.py``) merges the BM25 and vector rankings
+with ``reciprocal_rank_fusion``, which needs no score normalisation.
+"""
+
+import os
+import re
+import math
+import shutil
+from collections import Counter
+
+import numpy as np
+
+SPARSE_NAME = "sparse"
+ARRAYS = ("terms", "offsets", "docs", "tfs", "norm", "chunk_bytes", "chunk_offsets", "params")
+
+# Keeps identifiers such as "AB-1234", "v2.1" or "user_id" as one token; their
+# parts are indexed as well so "1234" also matches
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+PART_RE = re.compile(r"[-_./]")
+MAX_TOKEN_CHARS = 64
+
+STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have in is it its of on or "
+    "that the this to was were will with".split()
+)
+
+
+def tokenize(text):
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if len(token) > MAX_TOKEN_CHARS or token in STOPWORDS:
+            continue
+        tokens.append(token)
+        if PART_RE.search(token):
+            tokens.extend(
+                part for part in PART_RE.split(token)
+                if part and part not in STOPWORDS
+            )
+    return tokens
+
+
+class BM25Index:
+
+    def __init__(self, terms, offsets, docs, tfs, norm, chunk_bytes, chunk_offsets, k1=1.2, b=0.75):
+        self.terms = terms
+        self.offsets = offsets
+        self.docs = docs
+        self.tfs = tfs
+        self.norm = norm
+        self.chunk_bytes = chunk_bytes
+        self.chunk_offsets = chunk_offsets
+        self.k1 = k1
+        self.b = b
+
+    def __len__(self):
+        return len(self.chunk_offsets) - 1
+
+    @classmethod
+    def build(cls, chunks, k1=1.2, b=0.75):
+        """Build from an iterable of ``(chunk_id, text)`` pairs."""
+
+        vocab = {}
+        chunk_ids = []
+        doc_lens = []
+        term_col, doc_col, tf_col = [], [], []
+
+        for doc, (chunk_id, text) in enumerate(chunks):
+            tokens = tokenize(text)
+            chunk_ids.append(chunk_id.encode("utf-8"))
+            doc_lens.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                term_col.append(vocab.setdefault(term, len(vocab)))
+                doc_col.append(doc)
+                tf_col.append(tf)
+
+        # Term ids become positions in the sorted vocabulary
+        terms = np.asarray([term.encode("utf-8") for term in vocab], dtype=np.bytes_)
+        by_term = np.argsort(terms, kind="stable")
+        rank = np.empty(len(vocab), dtype=np.int64)
+        rank[by_term] = np.arange(len(vocab))
+
+        term_col = rank[np.asarray(term_col, dtype=np.int64)]
+        order = np.argsort(term_col, kind="stable")
+
+        offsets = np.zeros(len(vocab) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_col, minlength=len(vocab)), out=offsets[1:])
+
+        doc_lens = np.asarray(doc_lens, dtype=np.float32)
+        avgdl = float(doc_lens.mean()) if len(doc_lens) else 0.0
+        norm = k1 * (1 - b + b * doc_lens / avgdl) if avgdl else doc_lens * 0.0
+
+        chunk_offsets = np.zeros(len(chunk_ids) + 1, dtype=np.int64)
+        np.cumsum([len(id_) for id_ in chunk_ids], out=chunk_offsets[1:])
+
+        return cls(
+            terms[by_term],
+            offsets,
+            np.asarray(doc_col, dtype=np.uint32)[order],
+            np.minimum(np.asarray(tf_col, dtype=np.int64), 65535).astype(np.uint16)[order],
+            norm.astype(np.float32),
+            np.frombuffer(b"".join(chunk_ids), dtype=np.uint8),
+            chunk_offsets,
+            k1=k1,
+            b=b,
+        )
+
+    def term_id(self, term):
+        key = term.encode("utf-8")
+        if len(key) > self.terms.dtype.itemsize:
+            return None
+        i = int(np.searchsorted(self.terms, key))
+        if i < len(self.terms) and self.terms[i] == key:
+            return i
+        return None
+
+    def chunk_id(self, i):
+        lo, hi = self.chunk_offsets[i], self.chunk_offsets[i + 1]
+        return self.chunk_bytes[lo:hi].tobytes().decode("utf-8")
+
+    def search(self, query, k=4):
+        """Return ``[(chunk_id, score), ...]`` for the ``k`` best chunks."""
+
+        n = len(self)
+        if not n:
+            return []
+
+        scores = np.zeros(n, dtype=np.float32)
+        for term, qtf in Counter(tokenize(query)).items():
+            t = self.term_id(term)
+            if t is None:
+                continue
+            lo, hi = self.offsets[t], self.offsets[t + 1]
+            docs = self.docs[lo:hi]
+            tf = self.tfs[lo:hi].astype(np.float32)
+            df = hi - lo
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            # A term appears once per document in its postings, so += is safe
+            scores[docs] += qtf * idf * tf * (self.k1 + 1) / (tf + self.norm[docs])
+
+        hits = np.flatnonzero(scores)
+        if len(hits) > k:
+            hits = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+        hits = hits[np.argsort(-scores[hits], kind="stable")]
+
+        return [(self.chunk_id(i), float(scores[i])) for i in hits]
+
+    # -------------------- PERSISTENCE --------------------
+    def save(self, index_dir):
+        path = os.path.join(index_dir, SPARSE_NAME)
+        tmp = path + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+
+        arrays = {name: getattr(self, name) for name in ARRAYS[:-1]}
+        arrays["params"] = np.asarray([self.k1, self.b], dtype=np.float64)
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp, name + ".npy"), np.asarray(array), allow_pickle=False)
+
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, index_dir):
+        path = os.path.join(index_dir, SPARSE_NAME)
+        if not cls.exists(index_dir):
+            return None
+        arrays = {
+            name: np.load(os.path.join(path, name + ".npy"), mmap_mode="r", allow_pickle=False)
+            for name in ARRAYS
+        }
+        k1, b = np.asarray(arrays.pop("params")).tolist()
+        return cls(**arrays, k1=k1, b=b)
+
+    @staticmethod
+    def exists(index_dir):
+        return os.path.exists(os.path.join(index_dir, SPARSE_NAME, "params.npy"))
+
+    @staticmethod
+    def nbytes(index_dir):
+        path = os.path.join(index_dir, SPARSE_NAME)
+        if not os.path.isdir(path):
+            return 0
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+
+# -------------------- RANK FUSION --------------------
+def reciprocal_rank_fusion(rankings, k=60):
+    """Merge ranked id lists; an id scores ``sum(1 / (k + rank))``."""
+
+    scores = {}
+    for ranking in rankings:
+        for rank, id_ in enumerate(ranking, start=1):
+            scores[id_] = scores.get(id_, 0.0) + 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
@@ -0,0 +1,88 @@
+"""Background warm-up and readiness.
+
+The server starts listening as soon as the app module is imported: the
+startup hook only starts a ``WarmUp``, which runs its steps (OpenAI clients,
+tokenizer, the default index, ...) one after another in a daemon thread.
+Every step is the same lazy initialiser a request would call, so a query that
+arrives early simply waits for that step instead of failing.
+
+``ready`` turns true once every step has finished; a step that fails is
+retried with backoff and keeps the process unready until it succeeds.
+"""
+
+import time
+import threading
+import traceback
+
+from metrics import READY, WARMUP_STEP_SECONDS
+
+RETRY_SECONDS = 1.0
+MAX_RETRY_SECONDS = 30.0
+
+
+class WarmUp:
+
+    def __init__(self, steps):
+        # [(name, callable)], run in order
+        self.steps = list(steps)
+        self.status = {name: {"status": "pending"} for name, _ in self.steps}
+        self.started_at = None
+        self.ready_seconds = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        if self._thread is None:
+            self.started_at = time.time()
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+        return self
+
+    def wait(self, timeout=None):
+        return self._ready.wait(timeout)
+
+    def _run(self):
+        for name, step in self.steps:
+            delay = RETRY_SECONDS
+            while not self._run_step(name, step):
+                time.sleep(delay)
+                delay = min(delay * 2, MAX_RETRY_SECONDS)
+
+        self.ready_seconds = time.time() - self.started_at
+        self._ready.set()
+        READY.set(1)
+
+    def _run_step(self, name, step):
+        status = self.status[name]
+        status["status"] = "running"
+        start = time.perf_counter()
+        try:
+            detail = step()
+        except Exception as exc:
+            traceback.print_exc()
+            status.update(
+                status="failed",
+                error=f"{type(exc).__name__}: {exc}",
+                attempts=status.get("attempts", 0) + 1,
+            )
+            return False
+
+        seconds = time.perf_counter() - start
+        WARMUP_STEP_SECONDS.labels(step=name).set(seconds)
+        status.pop("error", None)
+        status.update(status="done", seconds=round(seconds, 3))
+        # Steps may return a short note, e.g. which index version was loaded
+        if isinstance(detail, str):
+            status["detail"] = detail
+        return True
+
+    def snapshot(self):
+        return {
+            "ready": self.ready,
+            "seconds_to_ready": round(self.ready_seconds, 3) if self.ready_seconds is not None else None,
+            "steps": {name: dict(status) for name, status in self.status.items()},
+        }
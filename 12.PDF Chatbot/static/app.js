@@ -17,7 +17,13 @@ function addMessage(text, who = 'user') {
   const frag = tpl.content.cloneNode(true);
   frag.querySelector('.text').textContent = text;
   frag.querySelector('.time').textContent = fmtTime();
+  const bubble = frag.firstElementChild;
   $('#messages').appendChild(frag);
+  scrollToBottom();
+  return bubble;
+}
+
+function scrollToBottom() {
   $('#messages').scrollTop = $('#messages').scrollHeight;
 }
 
@@ -47,13 +53,19 @@ $('#file-input').addEventListener('change', async (e) => {
   setStatus('Uploading...');
 
   try {
+    let duplicates = 0;
     for (const f of files) {
-      const fd = new FormData();
-      fd.append('file', f, f.name);
-      await api('/upload', { method: 'POST', body: fd });
+      // Raw body: the server hashes and writes it while it is still arriving
+      const res = await api(`/upload/${encodeURIComponent(f.name)}`, {
+        method: 'PUT',
+        headers: { 'Accept': 'application/json', 'Content-Type': 'application/pdf' },
+        body: f,
+      });
+      if (res.duplicate) duplicates += 1;
+      else state.files.push(f.name);
     }
-    state.files.push(...files.map(f => f.name));
-    setStatus(`${state.files.length} file(s) ready. Click Build.`);
+    const skipped = duplicates ? ` (${duplicates} duplicate(s) skipped)` : '';
+    setStatus(`${state.files.length} file(s) ready${skipped}. Click Build.`);
     setBuildEnabled(true);
   } catch (err) {
     console.error(err);
@@ -64,21 +76,62 @@ $('#file-input').addEventListener('change', async (e) => {
 });
 
 // Build vectors
+function fmtProgress(p) {
+  switch (p.stage) {
+    case 'hashing':
+    case 'loading':
+      return 'Preparing build...';
+    case 'parsing':
+      return `Parsing PDFs... ${p.pages_parsed} page(s), ${p.chunks_total} chunk(s)`;
+    case 'embedding':
+    case 'ingesting': {
+      let text = `Parsed ${p.pages_parsed} page(s) · embedded ${p.chunks_embedded}/${p.chunks_total} chunks`;
+      if (p.chunks_per_second) text += ` · ${p.chunks_per_second}/s`;
+      if (p.eta_seconds !== null) text += ` · ETA ${Math.ceil(p.eta_seconds)}s`;
+      return text;
+    }
+    case 'saving':
+      return 'Saving knowledge base...';
+    default:
+      return 'Building vector DB...';
+  }
+}
+
+function watchBuild(jobId) {
+  return new Promise((resolve, reject) => {
+    const events = new EventSource(`/build/${jobId}/events`);
+    events.addEventListener('progress', (e) => setStatus(fmtProgress(JSON.parse(e.data))));
+    events.addEventListener('done', (e) => {
+      events.close();
+      const p = JSON.parse(e.data);
+      if (p.status === 'succeeded') resolve(p);
+      else reject(new Error(p.error || 'Build failed'));
+    });
+    events.onerror = () => {
+      events.close();
+      reject(new Error('Lost connection to build progress'));
+    };
+  });
+}
+
 $('#build-btn').addEventListener('click', async () => {
   if (state.building) return;
   state.building = true;
-  setStatus('Building vector DB... This can take a minute.');
+  setStatus('Starting build...');
   setBuildEnabled(false);
 
   try {
-    const res = await api('/build', { method: 'POST' });
+    const job = await api('/build', { method: 'POST' });
+    const done = await watchBuild(job.job_id);
     state.built = true;
-    setStatus(res.message || 'Vector DB built.');
+    const r = done.result || {};
+    setStatus(`Knowledge Base ready: ${r.documents} document(s), +${r.added_chunks} / -${r.removed_chunks} chunk(s) in ${done.elapsed_seconds}s.`);
   } catch (err) {
     console.error(err);
     setStatus(`Build error: ${err.message}`);
   } finally {
     state.building = false;
+    setBuildEnabled(true);
   }
 });
 
@@ -92,7 +145,35 @@ $('#health-btn').addEventListener('click', async () => {
   }
 });
 
-// Send question
+// Send question (streamed over Server-Sent Events)
+async function* readEvents(res) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) return;
+    buffer += decoder.decode(value, { stream: true });
+    let sep;
+    while ((sep = buffer.indexOf('\n\n')) !== -1) {
+      const frame = buffer.slice(0, sep);
+      buffer = buffer.slice(sep + 2);
+      let event = 'message';
+      let data = '';
+      for (const line of frame.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      yield { event, data: data ? JSON.parse(data) : {} };
+    }
+  }
+}
+
+function fmtSources(sources) {
+  const names = sources.map(s => s.page !== null && s.page !== undefined ? `${s.source} p.${s.page + 1}` : s.source);
+  return [...new Set(names)].join(', ');
+}
+
 $('#composer').addEventListener('submit', async (e) => {
   e.preventDefault();
   const input = $('#question');
@@ -101,16 +182,40 @@ $('#composer').addEventListener('submit', async (e) => {
   addMessage(text, 'user');
   input.value = '';
 
+  const bubble = addMessage('…', 'bot');
+  const textEl = bubble.querySelector('.text');
+  const timeEl = bubble.querySelector('.time');
+  let answer = '';
+  let sources = '';
+
   try {
-    const res = await api('/query', {
+    const res = await fetch('/query/stream', {
       method: 'POST',
-      headers: { 'Content-Type': 'application/json' },
+      headers: { 'Content-Type': 'application/json', 'Accept': 'text/event-stream' },
       body: JSON.stringify({ question: text }),
     });
-    const answer = res.answer || 'No answer.';
-    addMessage(answer, 'bot');
+    if (!res.ok) {
+      const detail = await res.json().catch(() => ({}));
+      throw new Error(detail.detail || `Request failed: ${res.status}`);
+    }
+    for await (const { event, data } of readEvents(res)) {
+      if (event === 'sources') {
+        sources = fmtSources(data.sources || []);
+      } else if (event === 'token') {
+        answer += data.text;
+        textEl.textContent = answer;
+        scrollToBottom();
+      } else if (event === 'stats') {
+        const ttft = data.ttft_ms !== null ? `${(data.ttft_ms / 1000).toFixed(2)}s to first token · ` : '';
+        timeEl.textContent = `${fmtTime()} · ${ttft}${(data.total_ms / 1000).toFixed(2)}s`;
+        if (sources) timeEl.title = `Sources: ${sources}`;
+      } else if (event === 'error') {
+        throw new Error(data.detail);
+      }
+    }
+    if (!answer) textEl.textContent = 'No answer.';
   } catch (err) {
-    addMessage(`Error: ${err.message}`, 'bot');
+    textEl.textContent = answer ? `${answer}\n\nError: ${err.message}` : `Error: ${err.message}`;
   }
 });
 
@@ -0,0 +1,44 @@
+"""Token counting for prompts.
+
+Uses the tiktoken encoding of the chat model. tiktoken downloads its BPE
+files on first use; where that is not possible (offline containers) counts
+fall back to the usual ~4 characters per token estimate.
+"""
+
+import threading
+
+MODEL = "gpt-4o-mini"
+CHARS_PER_TOKEN = 4
+
+_ENCODING = None
+_LOCK = threading.Lock()
+
+
+def get_encoding():
+    global _ENCODING
+
+    with _LOCK:
+        if _ENCODING is None:
+            try:
+                import tiktoken
+                _ENCODING = tiktoken.encoding_for_model(MODEL)
+            except Exception:
+                _ENCODING = False
+        return _ENCODING or None
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is None:
+        return max(1, len(text) // CHARS_PER_TOKEN) if text else 0
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def truncate_tokens(text, max_tokens):
+    """The longest prefix of ``text`` that fits in ``max_tokens`` tokens."""
+
+    encoding = get_encoding()
+    if encoding is None:
+        return text[:max_tokens * CHARS_PER_TOKEN]
+    ids = encoding.encode(text, disallowed_special=())
+    return text if len(ids) <= max_tokens else encoding.decode(ids[:max_tokens])
@@ -0,0 +1,174 @@
+"""Streaming, content-addressed PDF uploads.
+
+An upload is written to a ``.part`` file in the upload dir chunk by chunk
+while it is hashed, so a file is never held in memory and its SHA-256 is
+known as soon as its last byte lands. A file whose content is already in the
+upload dir is dropped instead of being stored (and later embedded) twice.
+
+``UploadStore.corpus()`` remembers the hash of every file by size + mtime,
+so builds only hash files that are new or changed.
+"""
+
+import os
+import asyncio
+import hashlib
+import itertools
+import tempfile
+import threading
+
+from manifest import file_sha256
+
+PDF_MAGIC = b"%PDF-"
+PART_PREFIX = ".upload-"
+
+
+class UploadError(Exception):
+    status_code = 400
+
+
+class NotAPdf(UploadError):
+    pass
+
+
+class UploadTooLarge(UploadError):
+    status_code = 413
+
+
+def safe_filename(filename):
+    name = os.path.basename((filename or "").replace("\\", "/")).strip()
+    if not name or name.startswith("."):
+        raise UploadError("Invalid file name")
+    if not name.lower().endswith(".pdf"):
+        name += ".pdf"
+    return name
+
+
+class UploadStore:
+
+    def __init__(self, upload_dir):
+        self.upload_dir = upload_dir
+        self._hashes = {}
+        self._lock = threading.Lock()
+        # Held from the duplicate check until the file is in place
+        self._place_lock = threading.Lock()
+
+    def corpus(self):
+        """Map content hash -> path for every PDF currently in the upload dir."""
+
+        if not os.path.isdir(self.upload_dir):
+            return {}
+
+        with self._lock:
+            current = {}
+            for name in sorted(os.listdir(self.upload_dir)):
+                if not name.lower().endswith(".pdf"):
+                    continue
+                path = os.path.join(self.upload_dir, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                key = (st.st_size, st.st_mtime_ns)
+                cached = self._hashes.get(name)
+                if cached is None or cached[0] != key:
+                    cached = (key, file_sha256(path))
+                current[name] = cached
+            self._hashes = current
+
+        corpus = {}
+        for name, (_, doc_hash) in current.items():
+            corpus.setdefault(doc_hash, os.path.join(self.upload_dir, name))
+        return corpus
+
+    async def save(self, chunks, filename, max_bytes):
+        """Stream ``chunks`` (async iterable of bytes) into the upload dir.
+
+        Returns ``(doc_hash, path, duplicate)``; for a duplicate ``path`` is
+        the file that already holds the same content.
+        """
+
+        name = safe_filename(filename)
+        tmp, doc_hash = await self._receive(chunks, max_bytes)
+
+        try:
+            path, duplicate = await asyncio.to_thread(self._place, tmp, name, doc_hash)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+        return doc_hash, path, duplicate
+
+    def _place(self, tmp, name, doc_hash):
+        """Store ``tmp`` as ``name`` unless its content is in the upload dir already."""
+
+        # Concurrent uploads of the same content must not both be stored
+        with self._place_lock:
+            existing = self.corpus()
+            if doc_hash in existing:
+                return existing[doc_hash], True
+
+            # Same name, different content: keep both. os.link fails instead
+            # of replacing a file, so a name taken meanwhile (by another
+            # worker process) is never overwritten
+            stem = name[:-len(".pdf")]
+            candidates = itertools.chain(
+                [name, f"{stem}-{doc_hash[:8]}.pdf"],
+                (f"{stem}-{doc_hash[:8]}-{n}.pdf" for n in itertools.count(2)),
+            )
+            for candidate in candidates:
+                path = os.path.join(self.upload_dir, candidate)
+                try:
+                    os.link(tmp, path)
+                    break
+                except FileExistsError:
+                    continue
+
+            st = os.stat(path)
+            with self._lock:
+                self._hashes[candidate] = ((st.st_size, st.st_mtime_ns), doc_hash)
+
+        return path, False
+
+    async def _receive(self, chunks, max_bytes):
+        os.makedirs(self.upload_dir, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=self.upload_dir, prefix=PART_PREFIX, suffix=".part")
+
+        digest = hashlib.sha256()
+        head = b""
+        size = 0
+
+        def write(out, chunk):
+            # hashlib and file writes release the GIL on large buffers
+            digest.update(chunk)
+            out.write(chunk)
+
+        try:
+            with os.fdopen(fd, "wb") as out:
+                async for chunk in chunks:
+                    if not chunk:
+                        continue
+                    size += len(chunk)
+                    if size > max_bytes:
+                        raise UploadTooLarge(f"File exceeds {max_bytes // (1024 * 1024)} MB")
+                    if len(head) < len(PDF_MAGIC):
+                        head += chunk[:len(PDF_MAGIC)]
+                        if not PDF_MAGIC.startswith(head[:len(PDF_MAGIC)]):
+                            raise NotAPdf("PDF only")
+                    await asyncio.to_thread(write, out, chunk)
+
+            if len(head) < len(PDF_MAGIC):
+                raise NotAPdf("PDF only")
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+        return tmp, digest.hexdigest()
+
+
+async def read_upload_file(file, chunk_size):
+    """Async iterator over an ``UploadFile`` in ``chunk_size`` pieces."""
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,484 @@
+"""Vector store backends: FAISS (default) and persistent Chroma.
+
+``VECTOR_BACKEND`` picks one. Both offer the same operations, so builds,
+per-document updates and queries don't care which one is in use:
+
+* build: ``open_for_update`` (a writable copy of the published index),
+  ``builder`` (an ``insert`` callable for ``IngestionPipeline``), ``delete``
+  and ``save``
+* serving: ``open``, ``search`` (many query vectors at once, with an optional
+  metadata filter), ``count``, ``iter_chunks`` (for the BM25 index) and
+  ``close`` (once an opened index is evicted or replaced)
+
+Metadata filters use the Chroma/Mongo-style subset both stores understand::
+
+    {"filename": "policy.pdf"}
+    {"page": {"$gte": 3}, "doc_hash": {"$in": ["ab12...", "cd34..."]}}
+    {"$or": [{"page": 0}, {"page": 1}]}
+
+Chroma evaluates them inside the index. FAISS has no metadata, so it
+searches ``FILTER_FETCH_MULTIPLIER`` times deeper and filters the results.
+"""
+
+import os
+import re
+import shutil
+import asyncio
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+from langchain_core.documents import Document
+
+import index_store
+from index_specs import IndexSpec, SpecIndexBuilder, delete_ids, rebuild
+
+# FAISS: candidates searched per requested result when a filter is given
+FILTER_FETCH_MULTIPLIER = 10
+
+_COMPARISONS = {
+    "$eq": lambda a, b: a == b,
+    "$ne": lambda a, b: a != b,
+    "$gt": lambda a, b: a is not None and a > b,
+    "$gte": lambda a, b: a is not None and a >= b,
+    "$lt": lambda a, b: a is not None and a < b,
+    "$lte": lambda a, b: a is not None and a <= b,
+    "$in": lambda a, b: a in b,
+    "$nin": lambda a, b: a not in b,
+}
+
+
+# -------------------- METADATA FILTERS --------------------
+def validate_filter(filter):
+    """Raise ``ValueError`` for filters outside the supported subset."""
+
+    if not isinstance(filter, dict) or not filter:
+        raise ValueError("A filter is a non-empty object")
+
+    for key, value in filter.items():
+        if key in ("$and", "$or"):
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"{key} takes a non-empty list of filters")
+            for item in value:
+                validate_filter(item)
+        elif key.startswith("$"):
+            raise ValueError(f"Unknown operator {key}")
+        elif isinstance(value, dict):
+            if len(value) != 1 or next(iter(value)) not in _COMPARISONS:
+                raise ValueError(
+                    f"Conditions on {key!r} take one of {', '.join(_COMPARISONS)}"
+                )
+            op, operand = next(iter(value.items()))
+            if op in ("$in", "$nin") and not isinstance(operand, list):
+                raise ValueError(f"{op} takes a list")
+
+
+def matches(metadata, filter):
+    """Evaluate ``filter`` against one chunk's metadata."""
+
+    for key, value in filter.items():
+        if key == "$and":
+            if not all(matches(metadata, item) for item in value):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, item) for item in value):
+                return False
+        elif isinstance(value, dict):
+            op, operand = next(iter(value.items()))
+            try:
+                if not _COMPARISONS[op](metadata.get(key), operand):
+                    return False
+            except TypeError:
+                return False
+        elif metadata.get(key) != value:
+            return False
+    return True
+
+
+def chroma_where(filter):
+    """Chroma wants several conditions wrapped in ``$and``."""
+
+    if filter is None:
+        return None
+
+    clauses = []
+    for key, value in filter.items():
+        if key in ("$and", "$or"):
+            clauses.append({key: [chroma_where(item) for item in value]})
+        elif isinstance(value, dict):
+            clauses.append({key: value})
+        else:
+            clauses.append({key: {"$eq": value}})
+
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+# -------------------- FAISS --------------------
+class FaissBackend:
+
+    name = "faiss"
+
+    def __init__(self, spec=None):
+        self.spec = spec or IndexSpec("flat")
+
+    def exists(self, index_dir):
+        return index_store.has_index(index_dir)
+
+    def open(self, index_dir, embeddings):
+        vectors = index_store.load_index(index_dir, embeddings)
+        if vectors is not None:
+            self.spec.tune(vectors.index)
+        return vectors
+
+    def open_for_update(self, index_dir, work_dir, embeddings):
+        vectors = index_store.load_for_update(index_dir, work_dir, embeddings)
+
+        # A changed INDEX_SPEC re-indexes the stored vectors; nothing is re-embedded
+        if vectors is not None and IndexSpec.load(index_dir).structure() != self.spec.structure():
+            rebuild(vectors, self.spec)
+
+        return vectors
+
+    def builder(self, embeddings, work_dir):
+        return SpecIndexBuilder(self.spec, embeddings)
+
+    def delete(self, vectors, ids):
+        delete_ids(vectors, ids, self.spec)
+
+    def save(self, vectors, index_dir):
+        index_store.save_index(vectors, index_dir)
+        self.spec.save(index_dir)
+
+    def count(self, vectors):
+        return vectors.index.ntotal
+
+    def close(self, vectors):
+        # The mmap'd index and the docstore connection are freed with the
+        # store, once the last query holding it is done
+        pass
+
+    def search(self, vectors, queries, k, filter=None):
+        """One ``index.search`` for many query vectors; a list of docs per query."""
+
+        from batcher import search_many
+
+        if filter is None:
+            return search_many(vectors, queries, k)
+
+        fetch_k = min(k * FILTER_FETCH_MULTIPLIER, max(vectors.index.ntotal, 1))
+        return [
+            [doc for doc in docs if matches(doc.metadata, filter)][:k]
+            for docs in search_many(vectors, queries, fetch_k)
+        ]
+
+    def iter_chunks(self, index_dir):
+        docstore = index_store.SqliteDocstore(
+            os.path.join(index_dir, index_store.DOCSTORE_NAME)
+        )
+        try:
+            yield from docstore.iter_chunks()
+        finally:
+            docstore.close()
+
+    def resident_bytes(self, index_dir):
+        path = os.path.join(index_dir, index_store.INDEX_NAME)
+        return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+# -------------------- CHROMA --------------------
+CHROMA_DB_NAME = "chroma.sqlite3"
+# langchain's Chroma default, which the shipped chroma_openai_1536 store uses
+CHROMA_COLLECTION = "langchain"
+# Chroma keeps one directory of HNSW files per segment, named by its UUID
+SEGMENT_DIR_RE = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+
+
+def _chroma_metadata(metadata):
+    # Chroma only stores str/int/float/bool values
+    clean = {}
+    for key, value in metadata.items():
+        if value is None:
+            continue
+        clean[key] = value if isinstance(value, (str, int, float, bool)) else str(value)
+    return clean or None
+
+
+# Chroma shares one system (SQLite connections, HNSW segments) between all
+# clients of a directory and caches it for the life of the process; it is
+# stopped when the last store using the directory lets go of it
+_SYSTEMS_LOCK = threading.Lock()
+_SYSTEM_USERS = {}
+
+
+def _forget_client(path):
+    from chromadb.api.shared_system_client import SharedSystemClient
+
+    with _SYSTEMS_LOCK:
+        _SYSTEM_USERS.pop(path, None)
+        system = SharedSystemClient._identifier_to_system.pop(path, None)
+        if system is not None:
+            system.stop()
+
+
+class ChromaStore:
+    """A persistent Chroma collection with the store surface the app uses.
+
+    It doubles as its own ``docstore`` (``search(id)``), like the FAISS
+    store's lazy SQLite docstore, so ``HybridRetriever`` works unchanged.
+
+    ``release`` closes the client once no call is using it; a query that
+    still holds a released store reopens it.
+    """
+
+    def __init__(self, path, embeddings, create=False):
+        if create:
+            # A build that failed may have left a client cached for this path
+            _forget_client(path)
+
+        self.path = path
+        self.embeddings = embeddings
+        self.client = self.collection = None
+
+        self._lock = threading.Lock()
+        self._active = 0
+        self._released = False
+        self._connect(create)
+
+    def _connect(self, create=False):
+        import chromadb
+
+        with _SYSTEMS_LOCK:
+            client = chromadb.PersistentClient(
+                path=self.path, settings=chromadb.Settings(anonymized_telemetry=False)
+            )
+            _SYSTEM_USERS[client._identifier] = _SYSTEM_USERS.get(client._identifier, 0) + 1
+        self.client = client
+
+        try:
+            if create:
+                self.collection = client.get_or_create_collection(
+                    CHROMA_COLLECTION, embedding_function=None
+                )
+            else:
+                self.collection = client.get_collection(
+                    CHROMA_COLLECTION, embedding_function=None
+                )
+        except Exception:
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        # chromadb has no public close; stop the system and drop it from the
+        # per-path cache so the directory can be renamed and reopened
+        from chromadb.api.shared_system_client import SharedSystemClient
+
+        identifier = self.client._identifier
+        self.client = self.collection = None
+
+        with _SYSTEMS_LOCK:
+            users = _SYSTEM_USERS.get(identifier, 0) - 1
+            if users > 0:
+                _SYSTEM_USERS[identifier] = users
+                return
+            _SYSTEM_USERS.pop(identifier, None)
+            system = SharedSystemClient._identifier_to_system.pop(identifier, None)
+            if system is not None:
+                system.stop()
+
+    @contextmanager
+    def _use(self):
+        with self._lock:
+            if self.client is None:
+                self._connect()
+            self._active += 1
+        try:
+            yield self.collection
+        finally:
+            with self._lock:
+                self._active -= 1
+                if self._released and not self._active and self.client is not None:
+                    self._disconnect()
+
+    def release(self):
+        """Close the client as soon as no call is using it."""
+
+        with self._lock:
+            self._released = True
+            if not self._active and self.client is not None:
+                self._disconnect()
+
+    def close(self):
+        with self._lock:
+            if self.client is not None:
+                self._disconnect()
+
+    @property
+    def docstore(self):
+        return self
+
+    # -------------------- DOCSTORE --------------------
+    def search(self, search):
+        with self._use() as collection:
+            found = collection.get(ids=[search], include=["documents", "metadatas"])
+        if not found["ids"]:
+            return f"ID {search} not found."
+        return Document(
+            id=search,
+            page_content=found["documents"][0],
+            metadata=found["metadatas"][0] or {},
+        )
+
+    def iter_chunks(self, batch_size=1000):
+        offset = 0
+        with self._use() as collection:
+            while True:
+                found = collection.get(limit=batch_size, offset=offset, include=["documents"])
+                if not found["ids"]:
+                    return
+                yield from zip(found["ids"], found["documents"])
+                offset += len(found["ids"])
+
+    # -------------------- WRITES --------------------
+    def add_embeddings(self, text_embeddings, metadatas=None, ids=None):
+        metadatas = metadatas or [{}] * len(text_embeddings)
+        with self._use() as collection:
+            step = self.client.get_max_batch_size()
+            for start in range(0, len(text_embeddings), step):
+                batch = text_embeddings[start:start + step]
+                collection.add(
+                    ids=list(ids[start:start + step]),
+                    documents=[text for text, _ in batch],
+                    embeddings=np.asarray([vec for _, vec in batch], dtype=np.float32),
+                    metadatas=[_chroma_metadata(m) for m in metadatas[start:start + step]],
+                )
+        return list(ids)
+
+    def delete(self, ids):
+        with self._use() as collection:
+            step = self.client.get_max_batch_size()
+            for start in range(0, len(ids), step):
+                collection.delete(ids=list(ids[start:start + step]))
+
+    # -------------------- SEARCH --------------------
+    def count(self):
+        with self._use() as collection:
+            return collection.count()
+
+    def search_vectors(self, queries, k, filter=None):
+        with self._use() as collection:
+            count = collection.count()
+            if not count:
+                return [[] for _ in queries]
+
+            found = collection.query(
+                query_embeddings=np.asarray(queries, dtype=np.float32),
+                n_results=min(k, count),
+                where=chroma_where(filter),
+                include=["documents", "metadatas"],
+            )
+        return [
+            [
+                Document(id=id_, page_content=text, metadata=metadata or {})
+                for id_, text, metadata in zip(ids, texts, metadatas)
+            ]
+            for ids, texts, metadatas in zip(
+                found["ids"], found["documents"], found["metadatas"]
+            )
+        ]
+
+    def similarity_search(self, query, k=4, filter=None, **kwargs):
+        return self.search_vectors([self.embeddings.embed_query(query)], k, filter)[0]
+
+    async def asimilarity_search(self, query, k=4, filter=None, **kwargs):
+        vector = await self.embeddings.aembed_query(query)
+        return await asyncio.to_thread(self.search_vectors, [vector], k, filter)
+
+
+class ChromaBackend:
+
+    name = "chroma"
+
+    def exists(self, index_dir):
+        return os.path.exists(os.path.join(index_dir, CHROMA_DB_NAME))
+
+    def open(self, index_dir, embeddings):
+        if not self.exists(index_dir):
+            return None
+        return ChromaStore(index_dir, embeddings)
+
+    def open_for_update(self, index_dir, work_dir, embeddings):
+        if not self.exists(index_dir):
+            return None
+
+        os.makedirs(work_dir, exist_ok=True)
+        shutil.copyfile(
+            os.path.join(index_dir, CHROMA_DB_NAME), os.path.join(work_dir, CHROMA_DB_NAME)
+        )
+        for entry in os.scandir(index_dir):
+            if entry.is_dir() and SEGMENT_DIR_RE.match(entry.name):
+                shutil.copytree(entry.path, os.path.join(work_dir, entry.name))
+
+        return ChromaStore(work_dir, embeddings, create=True)
+
+    def builder(self, embeddings, work_dir):
+        return ChromaBuilder(embeddings, work_dir)
+
+    def delete(self, store, ids):
+        store.delete(ids)
+
+    def save(self, store, index_dir):
+        if os.path.abspath(store.path) != os.path.abspath(index_dir):
+            raise ValueError("A Chroma store is saved where it was built")
+        store.close()
+
+    def count(self, store):
+        return store.count()
+
+    def close(self, store):
+        # Queries may still be searching an evicted store; it closes after them
+        store.release()
+
+    def search(self, store, queries, k, filter=None):
+        return store.search_vectors(queries, k, filter)
+
+    def iter_chunks(self, index_dir):
+        store = ChromaStore(index_dir, None)
+        try:
+            yield from store.iter_chunks()
+        finally:
+            store.close()
+
+    def resident_bytes(self, index_dir):
+        # The HNSW segments are loaded into memory; the SQLite file is not
+        total = 0
+        for entry in os.scandir(index_dir):
+            if entry.is_dir() and SEGMENT_DIR_RE.match(entry.name):
+                total += sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file())
+        return total
+
+
+class ChromaBuilder:
+    """``insert`` callable that creates the Chroma store on its first batch."""
+
+    def __init__(self, embeddings, work_dir):
+        self.embeddings = embeddings
+        self.work_dir = work_dir
+
+    def insert(self, store, text_embeddings, metadatas, ids):
+        if store is None:
+            os.makedirs(self.work_dir, exist_ok=True)
+            store = ChromaStore(self.work_dir, self.embeddings, create=True)
+        store.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        return store
+
+    def finish(self, store):
+        return store
+
+
+BACKENDS = {"faiss": FaissBackend, "chroma": ChromaBackend}
+
+
+def get_backend(name, spec=None):
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown vector backend {name!r}; choose from {', '.join(BACKENDS)}")
+    return FaissBackend(spec) if name == "faiss" else ChromaBackend()
@@ -0,0 +1,19 @@
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from langchain_community.document_loaders import PyPDFLoader
+from streaming_splitter import StreamingSplitter
+
+loader = PyPDFLoader('14.AI Project Proposal/Bible.pdf')
+
+splitter = RecursiveCharacterTextSplitter(
+    chunk_size=500,
+    chunk_overlap=50,
+)
+
+# Pages are read one at a time and chunks may run across page boundaries
+streaming = StreamingSplitter(splitter, across_pages=True)
+
+for i, chunk in enumerate(streaming.lazy_split_documents(loader.lazy_load())):
+    if i == 100:
+        print(chunk.metadata)
+        print(chunk.page_content)
+        break
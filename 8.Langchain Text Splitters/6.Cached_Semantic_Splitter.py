@@ -0,0 +1,31 @@
+from dotenv import load_dotenv
+from langchain_huggingface import HuggingFaceEmbeddings
+from langchain_community.vectorstores import Chroma
+from semantic_chunker import BatchedSemanticChunker
+
+load_dotenv()
+embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
+
+# Same chunks as SemanticChunker, but every sentence window is embedded once
+text_splitter = BatchedSemanticChunker(
+    embeddings,
+    breakpoint_threshold_type="standard_deviation",
+    breakpoint_threshold_amount=3
+)
+
+
+sample = """
+Farmers were working hard in the fields, preparing the soil and planting seeds for the next season. The sun was bright, and the air smelled of earth and fresh grass. The Indian Premier League (IPL) is the biggest cricket league in the world. People all over the world watch the matches and cheer for their favourite teams.
+
+
+Terrorism is a big danger to peace and safety. It causes harm to people and creates fear in cities and villages. When such attacks happen, they leave behind pain and sadness. To fight terrorism, we need strong laws, alert security forces, and support from people who care about peace and safety.
+"""
+
+docs = text_splitter.create_documents([sample])
+print(len(docs))
+print(docs)
+
+# The chunks are stored with vectors pooled from their sentences, not embedded again
+vectorstore = Chroma.from_documents(docs, text_splitter.pooled_embeddings())
+print(vectorstore.similarity_search("Who watches cricket?", k=1))
+print(text_splitter.stats)
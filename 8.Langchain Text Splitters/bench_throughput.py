@@ -0,0 +1,466 @@
+"""Throughput report for the document loaders and text splitters.
+
+Every (configuration, corpus) pair runs in a fresh Python process, so the
+peak memory of one doesn't hide in another's. Each reports seconds (best of
+``--repeat``), pages/sec (loaders), MB/sec of input, chunks/sec, peak RSS
+and how far the run pushed it above the RSS it started from, and the
+distribution of chunk lengths in characters.
+
+Corpora:
+
+* ``pdf``: the bundled ``cg-internal-docs.pdf`` and ``Bible.pdf``, plus
+  copies of Bible.pdf with its pages repeated ``--pdf-scales`` times;
+* ``prose`` / ``code``: generated paragraphs and Python modules of
+  ``--sizes`` MB each (same seed, same text every run);
+* ``text``: the bundled ``cricket.txt``.
+
+The semantic chunkers need an embedding model (``--embeddings hf`` for
+all-MiniLM-L6-v2 through HuggingFaceEmbeddings, ``onnx`` for OnnxEmbeddings
+from 1.Langchain Models/3.EmbeddedModels) and run on ``--semantic-sizes``.
+
+    python bench_throughput.py --sizes 1,4,16 --out splitters.json
+    python bench_throughput.py --only recursive --only streaming --baseline splitters.json
+    python bench_throughput.py --compare before.json after.json
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+
+import numpy as np
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BASE_DIR)
+EMBEDDINGS_DIR = os.path.join(REPO_DIR, "1.Langchain Models", "3.EmbeddedModels")
+
+BUNDLED_PDFS = [
+    os.path.join(REPO_DIR, "7.Langchain Document Loader", "cg-internal-docs.pdf"),
+    os.path.join(REPO_DIR, "14.AI Project Proposal", "Bible.pdf"),
+]
+BUNDLED_TEXT = os.path.join(REPO_DIR, "7.Langchain Document Loader", "cricket.txt")
+READ_BLOCK = 1 << 16
+
+WORDS = (
+    "space exploration has led to incredible scientific discoveries from landing on the moon "
+    "to exploring mars humanity continues to push the boundaries of what is possible these "
+    "missions expanded our knowledge of the universe and contributed to advancements in "
+    "technology satellite communications gps and medical imaging trace their roots back to "
+    "innovations driven by space programs farmers cricket league terrorism peace safety"
+).split()
+
+
+# -------------------- CORPORA --------------------
+def write_prose(path, size_mb, seed=0):
+    rng = random.Random(seed)
+    target = int(size_mb * 1e6)
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            sentences = [
+                " ".join(rng.choice(WORDS) for _ in range(rng.randint(6, 24))).capitalize() + rng.choice(".!?")
+                for _ in range(rng.randint(2, 8))
+            ]
+            paragraph = " ".join(sentences) + "\n\n"
+            f.write(paragraph)
+            written += len(paragraph)
+
+
+def write_code(path, size_mb, seed=0):
+    rng = random.Random(seed)
+    target = int(size_mb * 1e6)
+    written = 0
+    with open(path, "w", encoding="utf-8") as f:
+        while written < target:
+            name = "".join(rng.choice(WORDS).title() for _ in range(2))
+            methods = "".join(
+                f"\n    def {rng.choice(WORDS)}_{i}(self, {rng.choice(WORDS)}):\n"
+                + "".join(
+                    f"        {rng.choice(WORDS)} = self.{rng.choice(WORDS)} + {rng.randint(0, 99)}\n"
+                    for _ in range(rng.randint(1, 6))
+                )
+                + f"        return {rng.choice(WORDS)}\n"
+                for i in range(rng.randint(1, 5))
+            )
+            block = f"\n\nclass {name}:\n    \"\"\"{rng.choice(WORDS)} {rng.choice(WORDS)}.\"\"\"\n{methods}"
+            f.write(block)
+            written += len(block)
+
+
+def write_scaled_pdf(source, path, scale):
+    from pypdf import PdfReader, PdfWriter
+
+    reader = PdfReader(source)
+    writer = PdfWriter()
+    for _ in range(scale):
+        for page in reader.pages:
+            writer.add_page(page)
+    with open(path, "wb") as f:
+        writer.write(f)
+
+
+def build_corpora(args, scratch):
+    """``{kind: [(name, path, mb)]}``"""
+
+    corpora = {"pdf": [], "prose": [], "code": [], "text": []}
+    for path in BUNDLED_PDFS:
+        corpora["pdf"].append((os.path.basename(path), path))
+    for scale in args.pdf_scales:
+        if scale > 1:
+            path = os.path.join(scratch, f"Bible_x{scale}.pdf")
+            write_scaled_pdf(BUNDLED_PDFS[1], path, scale)
+            corpora["pdf"].append((os.path.basename(path), path))
+
+    for size in sorted(set(args.sizes) | set(args.semantic_sizes)):
+        for kind, write in (("prose", write_prose), ("code", write_code)):
+            path = os.path.join(scratch, f"{kind}_{size:g}mb.{'py' if kind == 'code' else 'txt'}")
+            write(path, size)
+            corpora[kind].append((os.path.basename(path), path))
+    corpora["text"].append((os.path.basename(BUNDLED_TEXT), BUNDLED_TEXT))
+
+    return {
+        kind: [(name, path, os.path.getsize(path) / 1e6) for name, path in items]
+        for kind, items in corpora.items()
+    }
+
+
+# -------------------- CONFIGURATIONS --------------------
+def create_embeddings(args):
+    if args.embeddings == "onnx":
+        sys.path.insert(0, EMBEDDINGS_DIR)
+        from onnx_embeddings import OnnxEmbeddings
+
+        return OnnxEmbeddings(model_dir=args.model_dir)
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    return HuggingFaceEmbeddings(model_name=args.model_dir or "sentence-transformers/all-MiniLM-L6-v2")
+
+
+def read_text(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def read_blocks(path):
+    with open(path, "r", encoding="utf-8") as f:
+        while True:
+            block = f.read(READ_BLOCK)
+            if not block:
+                return
+            yield block
+
+
+def character(**kwargs):
+    def make(args):
+        from langchain_text_splitters import CharacterTextSplitter
+
+        return CharacterTextSplitter(**kwargs).split_text
+    return make
+
+
+def recursive(language=None, **kwargs):
+    def make(args):
+        from langchain_text_splitters import Language, RecursiveCharacterTextSplitter
+
+        if language:
+            return RecursiveCharacterTextSplitter.from_language(Language(language), **kwargs).split_text
+        return RecursiveCharacterTextSplitter(**kwargs).split_text
+    return make
+
+
+def streaming(**kwargs):
+    def make(args):
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        from streaming_splitter import StreamingSplitter
+
+        splitter = StreamingSplitter(
+            RecursiveCharacterTextSplitter(**kwargs), across_pages=True, page_separator=""
+        )
+        return lambda blocks: [doc.page_content for doc in splitter.lazy_split_documents(blocks)]
+    return make
+
+
+def semantic(batched, **kwargs):
+    def make(args):
+        embeddings = create_embeddings(args)
+        if batched:
+            from semantic_chunker import BatchedSemanticChunker
+
+            return BatchedSemanticChunker(embeddings, **kwargs).split_text
+
+        from langchain_experimental.text_splitter import SemanticChunker
+
+        return SemanticChunker(embeddings, **kwargs).split_text
+    return make
+
+
+def pdf_loader(lazy):
+    def make(args):
+        from langchain_community.document_loaders import PyPDFLoader
+
+        if lazy:
+            return lambda path: [doc for doc in PyPDFLoader(path).lazy_load()]
+        return lambda path: PyPDFLoader(path).load()
+    return make
+
+
+def text_loader(args):
+    from langchain_community.document_loaders import TextLoader
+
+    return lambda path: TextLoader(path, encoding="utf-8").load()
+
+
+# name: (kind, corpus, factory, input, chunk_size)
+# input is "path" (loaders), "text" (read first) or "blocks" (streamed)
+CONFIGS = {
+    "PyPDFLoader.load": ("loader", "pdf", pdf_loader(lazy=False), "path", None),
+    "PyPDFLoader.lazy_load": ("loader", "pdf", pdf_loader(lazy=True), "path", None),
+    "TextLoader": ("loader", "prose", text_loader, "path", None),
+    "TextLoader.cricket": ("loader", "text", text_loader, "path", None),
+    "character_200_no_separator": (
+        "splitter", "prose", character(chunk_size=200, chunk_overlap=0, separator=""), "text", 200,
+    ),
+    "character_1000_200": ("splitter", "prose", character(chunk_size=1000, chunk_overlap=200), "text", 1000),
+    "recursive_500_0": ("splitter", "prose", recursive(chunk_size=500, chunk_overlap=0), "text", 500),
+    "recursive_1000_200": ("splitter", "prose", recursive(chunk_size=1000, chunk_overlap=200), "text", 1000),
+    "recursive_python_300_0": (
+        "splitter", "code", recursive(language="python", chunk_size=300, chunk_overlap=0), "text", 300,
+    ),
+    "streaming_recursive_1000_200": (
+        "splitter", "prose", streaming(chunk_size=1000, chunk_overlap=200), "blocks", 1000,
+    ),
+    "semantic_percentile": ("semantic", "prose", semantic(batched=False), "text", None),
+    "batched_semantic_percentile": ("semantic", "prose", semantic(batched=True), "text", None),
+}
+
+
+# -------------------- ONE RUN --------------------
+def rss_mb():
+    import psutil
+
+    return psutil.Process().memory_info().rss / 1e6
+
+
+def peak_rss_mb():
+    if resource is None:
+        import psutil
+
+        # Windows keeps the peak working set instead
+        return psutil.Process().memory_info().peak_wset / 1e6
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 1e6 if sys.platform == "darwin" else peak / 1e3
+
+
+def chunk_stats(lengths, chunk_size):
+    if not lengths:
+        return {"count": 0}
+    lengths = np.asarray(lengths)
+    stats = {
+        "count": int(len(lengths)),
+        "mean": round(float(lengths.mean()), 1),
+        "min": int(lengths.min()),
+        "p50": int(np.percentile(lengths, 50)),
+        "p90": int(np.percentile(lengths, 90)),
+        "p99": int(np.percentile(lengths, 99)),
+        "max": int(lengths.max()),
+    }
+    if chunk_size:
+        stats["over_chunk_size"] = int((lengths > chunk_size).sum())
+    return stats
+
+
+def run_child(args):
+    kind, _, factory, source, chunk_size = CONFIGS[args.child]
+    path = args.corpus
+    run = factory(args)
+
+    text = read_text(path) if source == "text" else None
+    rss_before = rss_mb()
+
+    best, result = None, None
+    for _ in range(args.repeat):
+        # The previous repeat's chunks must not count towards this one's peak
+        result = None
+        start = time.perf_counter()
+        if source == "path":
+            result = run(path)
+        elif source == "blocks":
+            result = run(read_blocks(path))
+        else:
+            result = run(text)
+        seconds = time.perf_counter() - start
+        best = seconds if best is None else min(best, seconds)
+
+    mb = os.path.getsize(path) / 1e6
+    report = {
+        "seconds": round(best, 4),
+        "mb_per_second": round(mb / best, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+        "peak_over_start_mb": round(max(peak_rss_mb() - rss_before, 0), 1),
+    }
+    if kind == "loader":
+        report["pages"] = len(result)
+        report["pages_per_second"] = round(len(result) / best, 2)
+        report["chars"] = sum(len(doc.page_content) for doc in result)
+    else:
+        report["chunks_per_second"] = round(len(result) / best, 1)
+        report["chunk_chars"] = chunk_stats([len(chunk) for chunk in result], chunk_size)
+    print(json.dumps(report))
+
+
+def run_one(args, name, corpus, path):
+    command = [
+        sys.executable, os.path.abspath(__file__), "--child", name, "--corpus", path,
+        "--repeat", str(args.repeat), "--embeddings", args.embeddings,
+    ]
+    if args.model_dir:
+        command += ["--model-dir", args.model_dir]
+
+    result = subprocess.run(command, cwd=BASE_DIR, capture_output=True, text=True, timeout=args.timeout)
+    if result.returncode != 0:
+        lines = result.stderr.strip().splitlines()
+        return {"error": lines[-1] if lines else f"exit code {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+# -------------------- REPORT --------------------
+def print_row(row):
+    if "error" in row:
+        print(f"{row['config']:<30} {row['corpus']:<24} {row['error']}")
+        return
+    rate = (
+        f"{row['pages_per_second']:>9.1f} pg/s" if "pages_per_second" in row
+        else f"{row['chunks_per_second']:>9.0f} ch/s"
+    )
+    chunks = row.get("chunk_chars", {})
+    sizes = f"chunks {chunks['count']:>8} p50 {chunks.get('p50', 0):>5} p99 {chunks.get('p99', 0):>5}" if chunks else ""
+    print(
+        f"{row['config']:<30} {row['corpus']:<24} {row['seconds']:>9.3f}s {row['mb_per_second']:>8.2f} MB/s "
+        f"{rate} {row['peak_rss_mb']:>8.1f} MB peak (+{row['peak_over_start_mb']:.1f})  {sizes}"
+    )
+
+
+def compare(report, baseline):
+    print(f"\nvs {baseline.get('revision') or 'baseline'}")
+    before = {(r["config"], r["corpus"]): r for r in baseline.get("results", []) if "error" not in r}
+    print(f"{'config':<30} {'corpus':<24} {'MB/s':>17} {'change':>8} {'peak over start MB':>22}")
+    for row in report.get("results", []):
+        old = before.get((row["config"], row["corpus"]))
+        if old is None or "error" in row:
+            continue
+        change = (row["mb_per_second"] - old["mb_per_second"]) / old["mb_per_second"] * 100
+        print(
+            f"{row['config']:<30} {row['corpus']:<24} {old['mb_per_second']:>8.2f} {row['mb_per_second']:>8.2f} "
+            f"{change:>+7.1f}% {old['peak_over_start_mb']:>10.1f} {row['peak_over_start_mb']:>10.1f}"
+        )
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True
+        ).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1,4", help="MB of generated prose/code per corpus")
+    parser.add_argument("--semantic-sizes", default="0.05", help="MB for the semantic chunkers")
+    parser.add_argument("--pdf-scales", default="1", help="Bible.pdf page repeats, e.g. 1,2,4")
+    parser.add_argument("--max-character-mb", type=float, default=4.0,
+                        help="largest corpus for the per-character splitter")
+    parser.add_argument("--only", action="append", help="run configs whose name contains this (repeatable)")
+    parser.add_argument("--embeddings", choices=("hf", "onnx", "none"), default="hf")
+    parser.add_argument("--model-dir", help="local model for the semantic chunkers")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--out", default="throughput_report.json")
+    parser.add_argument("--baseline", help="earlier report to compare with")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two reports and exit")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    if args.compare:
+        reports = []
+        for path in args.compare:
+            with open(path, "r", encoding="utf-8") as f:
+                reports.append(json.load(f))
+        compare(reports[1], reports[0])
+        return
+
+    args.sizes = [float(s) for s in args.sizes.split(",") if s]
+    args.semantic_sizes = [float(s) for s in args.semantic_sizes.split(",") if s] if args.embeddings != "none" else []
+    args.pdf_scales = [int(s) for s in args.pdf_scales.split(",") if s]
+
+    scratch = tempfile.mkdtemp(prefix="throughput-bench-")
+    results = []
+    try:
+        corpora = build_corpora(args, scratch)
+        for name, (kind, corpus, _, _, _) in CONFIGS.items():
+            if args.only and not any(part in name for part in args.only):
+                continue
+            if kind == "semantic" and args.embeddings == "none":
+                continue
+            for corpus_name, path, mb in corpora[corpus]:
+                if corpus in ("prose", "code"):
+                    sizes = args.semantic_sizes if kind == "semantic" else args.sizes
+                    if not any(abs(mb - size) < size * 0.01 + 1e-3 for size in sizes):
+                        continue
+                if name.startswith("character_200_no_separator") and mb > args.max_character_mb:
+                    continue
+                row = {"config": name, "kind": kind, "corpus": corpus_name, "input_mb": round(mb, 3)}
+                row.update(run_one(args, name, corpus, path))
+                results.append(row)
+                print_row(row)
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    from importlib.metadata import PackageNotFoundError, version
+
+    versions = {}
+    for package in ("langchain-text-splitters", "langchain-community", "langchain-experimental", "pypdf"):
+        try:
+            versions[package] = version(package)
+        except PackageNotFoundError:
+            versions[package] = None
+
+    report = {
+        "revision": git_revision(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "versions": versions,
+        "repeat": args.repeat,
+        "results": results,
+    }
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
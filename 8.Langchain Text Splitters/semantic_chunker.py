@@ -0,0 +1,265 @@
+"""Semantic chunking that embeds each sentence window once and reuses it.
+
+    from semantic_chunker import BatchedSemanticChunker
+
+    chunker = BatchedSemanticChunker(embeddings, breakpoint_threshold_type="gradient",
+                                     breakpoint_threshold_amount=0.3)
+    chunks = chunker.create_documents([transcript])
+    vectorstore = Chroma.from_documents(chunks, chunker.pooled_embeddings())
+
+The chunks are the ones ``langchain_experimental``'s ``SemanticChunker``
+makes with the same settings; what changes is how often the model runs:
+
+* sentence windows are embedded ``batch_size`` at a time through an LRU
+  cache (``cache_size`` windows), so repeated windows, re-runs with another
+  threshold and the sentences carried between stream segments are free;
+* distances between neighbouring windows and the percentile /
+  standard_deviation / interquartile / gradient thresholds are NumPy array
+  operations instead of a Python loop of 1x1 ``cosine_similarity`` calls;
+* every chunk gets a vector pooled from its sentences' window embeddings
+  (mean, L2-normalised). ``pooled_embeddings()`` hands those to a vector
+  store in place of the model, so chunks are not embedded a second time.
+  Only the latest ``pooled_size`` chunk vectors are kept, so a long stream
+  does not grow memory; an older chunk is embedded by the model again.
+  Queries still go through the model.
+
+``lazy_split_text`` takes text as an iterator of blocks (transcript
+pieces, pages, ...) and chunks it ``segment_sentences`` sentences at a time.
+Thresholds are computed per segment and the last, unfinished chunk of a
+segment is carried into the next one, so a text shorter than one segment
+is chunked exactly like ``split_text``.
+"""
+
+import re
+import copy
+from collections import OrderedDict
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+BREAKPOINT_DEFAULTS = {
+    "percentile": 95,
+    "standard_deviation": 3,
+    "interquartile": 1.5,
+    "gradient": 95,
+}
+
+
+def combine_sentences(sentences, buffer_size=1):
+    """Each sentence with ``buffer_size`` neighbours on both sides, as SemanticChunker embeds it."""
+
+    return [
+        " ".join(sentences[max(0, i - buffer_size):i + buffer_size + 1])
+        for i in range(len(sentences))
+    ]
+
+
+def cosine_distances(vectors):
+    """``1 - cos`` between every row and the next one."""
+
+    norms = np.linalg.norm(vectors, axis=1)
+    similarity = (vectors[:-1] * vectors[1:]).sum(axis=1) / np.maximum(norms[:-1] * norms[1:], 1e-12)
+    return 1 - similarity
+
+
+class PooledEmbeddings(Embeddings):
+    """Embeddings that answer with precomputed chunk vectors where it has them."""
+
+    def __init__(self, inner, vectors):
+        self.inner = inner
+        self.vectors = vectors
+
+    def embed_documents(self, texts):
+        out = [self.vectors.get(text) for text in texts]
+        missing = [i for i, vector in enumerate(out) if vector is None]
+        if missing:
+            for i, vector in zip(missing, self.inner.embed_documents([texts[i] for i in missing])):
+                out[i] = vector
+        return [np.asarray(vector, dtype=np.float32).tolist() for vector in out]
+
+    def embed_query(self, text):
+        return self.inner.embed_query(text)
+
+
+class BatchedSemanticChunker:
+
+    def __init__(self, embeddings, buffer_size=1, add_start_index=False,
+                 breakpoint_threshold_type="percentile", breakpoint_threshold_amount=None,
+                 number_of_chunks=None, sentence_split_regex=r"(?<=[.?!])\s+", min_chunk_size=None,
+                 batch_size=256, cache_size=20_000, segment_sentences=2000, pooled_size=20_000):
+        if breakpoint_threshold_type not in BREAKPOINT_DEFAULTS:
+            raise ValueError(f"Got unexpected `breakpoint_threshold_type`: {breakpoint_threshold_type}")
+
+        self.embeddings = embeddings
+        self.buffer_size = buffer_size
+        self.add_start_index = add_start_index
+        self.breakpoint_threshold_type = breakpoint_threshold_type
+        self.breakpoint_threshold_amount = (
+            BREAKPOINT_DEFAULTS[breakpoint_threshold_type]
+            if breakpoint_threshold_amount is None else breakpoint_threshold_amount
+        )
+        self.number_of_chunks = number_of_chunks
+        self.sentence_split_regex = sentence_split_regex
+        self.min_chunk_size = min_chunk_size
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.segment_sentences = segment_sentences
+        self.pooled_size = pooled_size
+
+        self._cache = OrderedDict()
+        # Chunk text -> pooled vector, for pooled_embeddings(); latest pooled_size
+        self.pooled = OrderedDict()
+        self.stats = {"windows": 0, "cache_hits": 0, "embedded": 0, "batches": 0}
+
+    # -------------------- SPLITTING --------------------
+    def split_text(self, text):
+        sentences = re.split(self.sentence_split_regex, text)
+        return [" ".join(group) for group in self._chunk(sentences, final=True)[0]]
+
+    def create_documents(self, texts, metadatas=None):
+        metadatas = metadatas or [{}] * len(texts)
+        documents = []
+        for text, metadata in zip(texts, metadatas):
+            start_index = 0
+            for chunk in self.split_text(text):
+                chunk_metadata = copy.deepcopy(metadata)
+                if self.add_start_index:
+                    chunk_metadata["start_index"] = start_index
+                documents.append(Document(page_content=chunk, metadata=chunk_metadata))
+                start_index += len(chunk)
+        return documents
+
+    def split_documents(self, documents):
+        documents = list(documents)
+        return self.create_documents(
+            [doc.page_content for doc in documents], [doc.metadata for doc in documents]
+        )
+
+    def lazy_split_text(self, blocks):
+        """Chunks of the text ``blocks`` make up when concatenated, one at a time."""
+
+        regex = re.compile(self.sentence_split_regex)
+        buffer, sentences = "", []
+        for block in blocks:
+            buffer += block
+            start = 0
+            # A match touching the end of the buffer may still grow
+            for match in regex.finditer(buffer):
+                if match.end() >= len(buffer):
+                    break
+                sentences.append(buffer[start:match.start()])
+                start = match.end()
+            buffer = buffer[start:]
+
+            if len(sentences) >= self.segment_sentences:
+                groups, sentences = self._chunk(sentences, final=False)
+                for group in groups:
+                    yield " ".join(group)
+
+        sentences += regex.split(buffer)
+        for group in self._chunk(sentences, final=True)[0]:
+            yield " ".join(group)
+
+    def pooled_embeddings(self):
+        """An ``Embeddings`` for a vector store that reuses the pooled chunk vectors."""
+
+        return PooledEmbeddings(self.embeddings, self.pooled)
+
+    # -------------------- BREAKPOINTS --------------------
+    def _chunk(self, sentences, final):
+        """Sentence groups, and the sentences of the last group if it is not final."""
+
+        # As SemanticChunker: too few sentences for the statistics below,
+        # so every sentence is a chunk (and is embedded by the store)
+        if len(sentences) == 1 or (self.breakpoint_threshold_type == "gradient" and len(sentences) == 2):
+            if final:
+                return [[sentence] for sentence in sentences], []
+            return [], sentences
+
+        vectors = self._embed_windows(combine_sentences(sentences, self.buffer_size))
+        distances = cosine_distances(vectors)
+        threshold, scores = self._threshold(distances)
+
+        groups, bounds, start = [], [], 0
+        for index in np.flatnonzero(scores > threshold):
+            group = sentences[start:index + 1]
+            if self.min_chunk_size is not None and len(" ".join(group)) < self.min_chunk_size:
+                continue
+            groups.append(group)
+            bounds.append((start, index + 1))
+            start = index + 1
+
+        rest = sentences[start:]
+        # The open group is carried over, unless it is already a segment long
+        if not final and len(rest) < self.segment_sentences:
+            self._pool(groups, bounds, vectors)
+            return groups, rest
+
+        if rest:
+            groups.append(rest)
+            bounds.append((start, len(sentences)))
+        self._pool(groups, bounds, vectors)
+        return groups, []
+
+    def _threshold(self, distances):
+        """``(threshold, scores)``: a breakpoint follows every score above the threshold."""
+
+        if self.number_of_chunks is not None:
+            # Inverse of the percentile method, as SemanticChunker does it
+            x1, x2 = len(distances), 1.0
+            x = max(min(self.number_of_chunks, x1), x2)
+            y = 100.0 if x2 == x1 else (100.0 / (x2 - x1)) * (x - x1)
+            return np.percentile(distances, min(max(y, 0), 100)), distances
+
+        amount = self.breakpoint_threshold_amount
+        if self.breakpoint_threshold_type == "percentile":
+            return np.percentile(distances, amount), distances
+        if self.breakpoint_threshold_type == "standard_deviation":
+            return np.mean(distances) + amount * np.std(distances), distances
+        if self.breakpoint_threshold_type == "interquartile":
+            q1, q3 = np.percentile(distances, [25, 75])
+            return np.mean(distances) + amount * (q3 - q1), distances
+        gradient = np.gradient(distances, np.arange(len(distances)))
+        return np.percentile(gradient, amount), gradient
+
+    def _pool(self, groups, bounds, vectors):
+        for group, (start, end) in zip(groups, bounds):
+            pooled = vectors[start:end].mean(axis=0)
+            text = " ".join(group)
+            self.pooled[text] = pooled / max(np.linalg.norm(pooled), 1e-12)
+            self.pooled.move_to_end(text)
+
+        while len(self.pooled) > self.pooled_size:
+            self.pooled.popitem(last=False)
+
+    # -------------------- EMBEDDINGS --------------------
+    def _embed_windows(self, windows):
+        """One row per window; only windows missing from the cache reach the model."""
+
+        self.stats["windows"] += len(windows)
+        missing = list(dict.fromkeys(w for w in windows if w not in self._cache))
+        self.stats["cache_hits"] += len(windows) - len(missing)
+
+        found = {}
+        for start in range(0, len(missing), self.batch_size):
+            batch = missing[start:start + self.batch_size]
+            # float64 like SemanticChunker, so near-ties break the same way
+            vectors = np.asarray(self.embeddings.embed_documents(batch), dtype=np.float64)
+            found.update(zip(batch, vectors))
+            self.stats["embedded"] += len(batch)
+            self.stats["batches"] += 1
+
+        rows = []
+        for window in windows:
+            vector = found.get(window)
+            if vector is None:
+                vector = self._cache[window]
+                self._cache.move_to_end(window)
+            else:
+                self._cache[window] = vector
+            rows.append(vector)
+
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return np.vstack(rows)
@@ -0,0 +1,318 @@
+"""Lazy, bounded-memory version of the character text splitters, with offsets.
+
+    from langchain_community.document_loaders import PyPDFLoader
+    from langchain_text_splitters import RecursiveCharacterTextSplitter
+    from streaming_splitter import StreamingSplitter
+
+    splitter = StreamingSplitter(RecursiveCharacterTextSplitter(chunk_size=500, chunk_overlap=50))
+    for chunk in splitter.lazy_split_documents(PyPDFLoader("Bible.pdf").lazy_load()):
+        ...
+
+``StreamingSplitter`` wraps a ``CharacterTextSplitter`` or
+``RecursiveCharacterTextSplitter`` (``from_language`` included) and runs the
+same split-then-merge algorithm one piece at a time, so the chunks are
+exactly the ones the wrapped splitter returns:
+
+* ``across_pages=False`` (default): every page is split on its own, like
+  ``splitter.split_documents(pages)``. Memory is bounded by the largest page.
+* ``across_pages=True``: the pages are read as one text joined with
+  ``page_separator``, like ``splitter.split_text(page_separator.join(texts))``,
+  so chunks and their overlap run across page boundaries. Only the text of
+  the chunk being built is kept, plus whatever has no separator in it yet:
+  a recursive splitter has to read until its first separator (``"\\n\\n"``
+  by default, which the page separator provides) shows up, since a
+  separator that never appears changes how the whole text is split.
+
+Every chunk gets the metadata of the page it starts on plus the span of
+source text it covers: ``start_page``/``start_offset`` and
+``end_page``/``end_offset`` (exclusive), pages counted from 0 in the order
+they were read and offsets in characters from the start of that page's
+text. A position inside the page separator counts past the end of the page
+before it. The span is the chunk text itself unless ``keep_separator=False``,
+where the splitter drops empty splits and re-joins the rest with a single
+separator.
+
+Separator matches are assumed to be shorter than ``HOLD_CHARS``: text that
+close to the end of what has been read is not split until more arrives.
+"""
+
+import re
+import copy
+import bisect
+from collections import deque
+
+from langchain_core.documents import Document
+from langchain_text_splitters import CharacterTextSplitter, RecursiveCharacterTextSplitter
+
+HOLD_CHARS = 256
+LOOKAROUND_PREFIXES = ("(?=", "(?<!", "(?<=", "(?!")
+
+
+# -------------------- SPLITS --------------------
+def _cut(match, keep_separator):
+    """Where the piece before ``match`` ends and the next one starts."""
+
+    if not keep_separator:
+        return match.start(), match.end()
+    if keep_separator == "end":
+        return match.end(), match.end()
+    return match.start(), match.start()
+
+
+def _pieces(blocks, pattern, keep_separator, base=0):
+    """``(piece, start)`` pairs of ``_split_text_with_regex`` over the joined blocks."""
+
+    if not pattern:
+        pos = base
+        for block in blocks:
+            for char in block:
+                yield char, pos
+                pos += 1
+        return
+
+    regex = re.compile(pattern)
+    blocks = iter(blocks)
+    buf, buf_start = "", base
+    # cur: start of the piece being read; scan: where the next match may start
+    cur = scan = 0
+    skip_empty = None
+    final = False
+
+    while not final:
+        block = next(blocks, None)
+        if block is None:
+            final = True
+        else:
+            buf += block
+
+        safe_end = len(buf) if final else len(buf) - HOLD_CHARS
+        for match in regex.finditer(buf, scan):
+            if match.end() > safe_end:
+                break
+            if match.start() == match.end() == skip_empty:
+                continue
+            end, cur_next = _cut(match, keep_separator)
+            if end > cur:
+                yield buf[cur:end], buf_start + cur
+            cur, scan = cur_next, match.end()
+            skip_empty = scan if match.start() == match.end() else None
+
+        # Drop what has been emitted, keeping a little for lookbehinds
+        drop = max(0, min(cur, scan) - HOLD_CHARS)
+        if drop:
+            buf, buf_start = buf[drop:], buf_start + drop
+            cur, scan = cur - drop, scan - drop
+            if skip_empty is not None:
+                skip_empty -= drop
+
+    if cur < len(buf):
+        yield buf[cur:], buf_start + cur
+
+
+class _Merger:
+    """``TextSplitter._merge_splits`` fed one split at a time."""
+
+    def __init__(self, splitter, separator):
+        self.splitter = splitter
+        self.separator = separator
+        self.separator_len = splitter._length_function(separator)
+        self.current = deque()
+        self.total = 0
+
+    def add(self, piece, start):
+        s = self.splitter
+        length = s._length_function(piece)
+        if self.total + length + (self.separator_len if self.current else 0) > s._chunk_size:
+            if self.current:
+                chunk = self._join()
+                if chunk is not None:
+                    yield chunk
+                while self.total > s._chunk_overlap or (
+                    self.total + length + (self.separator_len if self.current else 0) > s._chunk_size
+                    and self.total > 0
+                ):
+                    _, _, first = self.current.popleft()
+                    self.total -= first + (self.separator_len if self.current else 0)
+        self.current.append((piece, start, length))
+        self.total += length + (self.separator_len if len(self.current) > 1 else 0)
+
+    def flush(self):
+        chunk = self._join()
+        self.current.clear()
+        self.total = 0
+        if chunk is not None:
+            yield chunk
+
+    def _join(self):
+        if not self.current:
+            return None
+        text = self.separator.join(piece for piece, _, _ in self.current)
+        last, last_start, _ = self.current[-1]
+        start, end = self.current[0][1], last_start + len(last)
+        if self.splitter._strip_whitespace:
+            stripped = text.lstrip()
+            start += len(text) - len(stripped)
+            text = stripped.rstrip()
+            end = max(start, end - (len(stripped) - len(text)))
+        return (text, start, end) if text else None
+
+
+# -------------------- PAGES --------------------
+class _Pages:
+    """Where each page starts in the joined text, for pages still needed."""
+
+    def __init__(self):
+        self.starts = deque()
+        self.pages = deque()
+
+    def add(self, start, index, metadata):
+        self.starts.append(start)
+        self.pages.append((index, metadata))
+
+    def locate(self, pos):
+        i = bisect.bisect_right(self.starts, pos) - 1
+        index, metadata = self.pages[i]
+        return index, pos - self.starts[i], metadata
+
+    def forget_before(self, pos):
+        # Chunks come in order, so pages before the last chunk's start are done
+        while len(self.starts) > 1 and self.starts[1] <= pos:
+            self.starts.popleft()
+            self.pages.popleft()
+
+
+def _as_document(page):
+    return page if isinstance(page, Document) else Document(page_content=page)
+
+
+class StreamingSplitter:
+
+    def __init__(self, splitter, across_pages=False, page_separator="\n\n"):
+        if not isinstance(splitter, (CharacterTextSplitter, RecursiveCharacterTextSplitter)):
+            raise TypeError(
+                f"StreamingSplitter wraps CharacterTextSplitter or RecursiveCharacterTextSplitter, "
+                f"not {type(splitter).__name__}"
+            )
+        self.splitter = splitter
+        self.across_pages = across_pages
+        self.page_separator = page_separator
+
+    def lazy_split_documents(self, pages):
+        """Chunks of ``pages`` (Documents or strings) as Documents, one at a time."""
+
+        if self.across_pages:
+            yield from self._split_across(pages)
+            return
+
+        for index, page in enumerate(pages):
+            page = _as_document(page)
+            index_hint, previous_len = 0, 0
+            for text, start, end in self.chunks([page.page_content]):
+                metadata = copy.deepcopy(page.metadata)
+                if self.splitter._add_start_index:
+                    # Same search as TextSplitter.create_documents
+                    offset = index_hint + previous_len - self.splitter._chunk_overlap
+                    index_hint = page.page_content.find(text, max(0, offset))
+                    metadata["start_index"] = index_hint
+                    previous_len = len(text)
+                metadata.update(start_page=index, start_offset=start, end_page=index, end_offset=end)
+                yield Document(page_content=text, metadata=metadata)
+
+    def chunks(self, blocks, base=0):
+        """``(text, start, end)`` of every chunk of the concatenated ``blocks``."""
+
+        if isinstance(self.splitter, RecursiveCharacterTextSplitter):
+            return self._recursive(blocks, base, self.splitter._separators)
+        return self._character(blocks, base)
+
+    def _split_across(self, pages):
+        located = _Pages()
+
+        def blocks():
+            pos = 0
+            for index, page in enumerate(pages):
+                page = _as_document(page)
+                if index:
+                    yield self.page_separator
+                    pos += len(self.page_separator)
+                located.add(pos, index, page.metadata)
+                yield page.page_content
+                pos += len(page.page_content)
+
+        for text, start, end in self.chunks(blocks()):
+            start_page, start_offset, metadata = located.locate(start)
+            end_page, end_offset, _ = located.locate(end)
+            metadata = copy.deepcopy(metadata)
+            if self.splitter._add_start_index:
+                metadata["start_index"] = start
+            metadata.update(
+                start_page=start_page, start_offset=start_offset, end_page=end_page, end_offset=end_offset
+            )
+            located.forget_before(start)
+            yield Document(page_content=text, metadata=metadata)
+
+    # -------------------- ALGORITHMS --------------------
+    def _character(self, blocks, base):
+        s = self.splitter
+        pattern = s._separator if s._is_separator_regex else re.escape(s._separator)
+        is_lookaround = s._is_separator_regex and s._separator.startswith(LOOKAROUND_PREFIXES)
+        merger = _Merger(s, "" if s._keep_separator or is_lookaround else s._separator)
+
+        for piece, start in _pieces(blocks, pattern, s._keep_separator, base):
+            yield from merger.add(piece, start)
+        yield from merger.flush()
+
+    def _recursive(self, blocks, base, separators):
+        s = self.splitter
+        separator, new_separators, blocks = self._choose_separator(blocks, separators)
+        pattern = separator if s._is_separator_regex else re.escape(separator)
+        merger = _Merger(s, "" if s._keep_separator else separator)
+
+        for piece, start in _pieces(blocks, pattern, s._keep_separator, base):
+            if s._length_function(piece) < s._chunk_size:
+                yield from merger.add(piece, start)
+                continue
+            yield from merger.flush()
+            if not new_separators:
+                yield piece, start, start + len(piece)
+            else:
+                yield from self._recursive([piece], start, new_separators)
+        yield from merger.flush()
+
+    def _choose_separator(self, blocks, separators):
+        """The separator ``_split_text`` would pick for the whole text.
+
+        Returns it, the separators left for the recursion and the blocks,
+        including those read to decide. Reading stops as soon as the first
+        separator is found; otherwise the whole text has to be read.
+        """
+
+        if not separators[0]:
+            return separators[0], [], blocks
+
+        patterns = [sep if self.splitter._is_separator_regex else re.escape(sep) for sep in separators]
+        blocks = iter(blocks)
+        read, found, tail = [], set(), ""
+        for block in blocks:
+            read.append(block)
+            # The tail catches separators cut in two by a block boundary
+            window = tail + block
+            for i, pattern in enumerate(patterns):
+                if separators[i] and i not in found and re.search(pattern, window):
+                    found.add(i)
+            if 0 in found:
+                return separators[0], separators[1:], self._chain(read, blocks)
+            tail = window[-HOLD_CHARS:]
+
+        for i, sep in enumerate(separators):
+            if not sep:
+                return sep, [], read
+            if i in found:
+                return sep, separators[i + 1:], read
+        return separators[-1], [], read
+
+    @staticmethod
+    def _chain(read, blocks):
+        yield from read
+        read.clear()
+        yield from blocks